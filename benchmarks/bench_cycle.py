@@ -0,0 +1,360 @@
+# Drives complete queueCleaner cycles against the fake servers and reports the cost per job
+# Usage (from the repository root):
+#   python -m benchmarks.bench_cycle --queue-sizes 1000 10000 100000 --torrents 50000 --latency 2
+# Note: the fake servers run in-process, so their CPU time is included in the "cpu s" column
+# Note: the instances are cleaned one after another (rather than concurrently, as decluttarr does), so that the cost of each job can be told apart
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+
+# No config.conf / environment is needed: the instances are injected into settingsDict below
+os.environ.setdefault("IS_IN_PYTEST", "true")
+
+from benchmarks.fake_servers import Fake_Arr_Server, Fake_Qbit_Server
+
+JOBS = {
+    "failed": ("REMOVE_FAILED", "remove_failed"),
+    "failed_imports": ("REMOVE_FAILED_IMPORTS", "remove_failed_imports"),
+    "metadata_missing": ("REMOVE_METADATA_MISSING", "remove_metadata_missing"),
+    "missing_files": ("REMOVE_MISSING_FILES", "remove_missing_files"),
+    "orphans": ("REMOVE_ORPHANS", "remove_orphans"),
+    "slow": ("REMOVE_SLOW", "remove_slow"),
+    "stalled": ("REMOVE_STALLED", "remove_stalled"),
+    "unmonitored": ("REMOVE_UNMONITORED", "remove_unmonitored"),
+    "rescans": ("RUN_PERIODIC_RESCANS", "run_periodic_rescans"),
+}
+
+
+DELTA_KEYS = (
+    "wall",
+    "cpu",
+    "calls",
+    "bytes_sent",
+    "bytes_received",
+)  # Measured as the difference between before and after a job
+
+
+class Cycle_Metrics:
+    # Collects wall time, CPU time, HTTP traffic and peak RSS per job
+    def __init__(self, servers):
+        self.servers = servers
+        self.jobs = {}
+
+    def sample(self):
+        calls = bytes_in = bytes_out = 0
+        for server in self.servers:
+            traffic = server.counter.snapshot()
+            calls += traffic["calls"]
+            bytes_in += traffic["bytes_in"]
+            bytes_out += traffic["bytes_out"]
+        return {
+            "wall": time.perf_counter(),
+            "cpu": time.process_time(),
+            "calls": calls,
+            "bytes_sent": bytes_in,
+            "bytes_received": bytes_out,
+        }
+
+    def add(self, job, before, after):
+        entry = self.jobs.setdefault(job, {key: 0 for key in DELTA_KEYS})
+        for key in DELTA_KEYS:
+            entry[key] += after[key] - before[key]
+        entry["peak_rss_mb"] = max(entry.get("peak_rss_mb", 0), peak_rss_mb())
+
+    def measure(self, job, func):
+        # Wraps an async function so that its cost is attributed to the given job
+        async def wrapper(*args, **kwargs):
+            before = self.sample()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.add(job, before, self.sample())
+
+        return wrapper
+
+    def one_at_a_time(self, func):
+        # Wraps an async function so that only one call runs at a time
+        # The instances are cleaned concurrently, but the counters are shared; cleaning them one after another keeps the cost of one
+        # instance out of the jobs of the others
+        lock = asyncio.Lock()
+
+        async def wrapper(*args, **kwargs):
+            async with lock:
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in KB on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def commit_id():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except Exception:
+        return "n/a"
+
+
+def configure(settingsDict, args, arr_servers, qbit_server):
+    # Returns the settings pointing decluttarr at the fake servers
+    # Further servers of the same arr type become additional instances (SONARR_2, SONARR_3, ...)
+    changes = {"INSTANCES": []}
+    for arr_server in arr_servers:
+        arr_type = arr_server.arr_type
+        same_type = sum(
+            changes.get(instance + "_TYPE") == arr_type
+            for instance in changes["INSTANCES"]
+        )
+        instance = f"{arr_type}_{same_type + 1}" if same_type else arr_type
+        changes["INSTANCES"].append(instance)
+        changes[instance + "_URL"] = arr_server.api_url
+        changes[instance + "_KEY"] = "benchmark"
+        changes[instance + "_NAME"] = (
+            arr_server.app_name
+            if not same_type
+            else f"{arr_server.app_name} {same_type + 1}"
+        )
+        changes[instance + "_TYPE"] = arr_type
+    changes["QBITTORRENT_URL"] = qbit_server.api_url if qbit_server else ""
+    changes["QBITTORRENT_USERNAME"] = ""
+    changes["QBITTORRENT_PASSWORD"] = ""
+    changes["QBIT_VERSION"] = args.qbit_version.lstrip("v")
+    changes["TEST_RUN"] = args.test_run
+    changes["RECORD_TRAFFIC"] = args.record or ""
+    changes["LOG_LEVEL"] = args.log_level
+    changes["STREAM_RECORDS"] = args.stream
+    for job, (setting, _) in JOBS.items():
+        changes[setting] = job in args.jobs
+    changes["RUN_PERIODIC_RESCANS"] = (
+        {
+            arr_server.arr_type: {
+                "MISSING": True,
+                "CUTOFF_UNMET": True,
+                "MAX_CONCURRENT_SCANS": 3,
+                "MIN_DAYS_BEFORE_RESCAN": 7,
+            }
+            for arr_server in arr_servers
+        }
+        if "rescans" in args.jobs
+        else {}
+    )
+    return settingsDict.replace(**changes)
+
+
+async def run_benchmark(args, queue_size):
+    import main
+    import src.decluttarr
+    from config import definitions
+    from src.utils.trackers import Defective_Tracker, Download_Sizes_Tracker
+
+    arr_servers = [
+        Fake_Arr_Server(
+            arr_type, queue_size, args.wanted_size, args.latency / 1000, seed
+        )
+        for seed, arr_type in enumerate(args.apps)
+    ]
+    torrents = (
+        args.torrents if args.torrents is not None else queue_size * len(arr_servers)
+    )
+    qbit_server = (
+        Fake_Qbit_Server(
+            torrents,
+            args.latency / 1000,
+            version=args.qbit_version,
+            arr_servers=arr_servers,
+        )
+        if not args.no_qbit
+        else None
+    )
+    servers = arr_servers + ([qbit_server] if qbit_server else [])
+    for server in servers:
+        server.start()
+
+    logging.getLogger().setLevel(args.log_level)
+    metrics_per_cycle = []
+    try:
+        settingsDict = definitions.settingsDict = configure(
+            main.loadSettings(), args, arr_servers, qbit_server
+        )
+        defective_tracker = Defective_Tracker(
+            {settingsDict[t + "_URL"]: {} for t in settingsDict["INSTANCES"]}
+        )
+        download_sizes_tracker = Download_Sizes_Tracker({})
+        if args.record:
+            # Lets the replay driver find out which instances were recorded
+            for instance in settingsDict["INSTANCES"]:
+                settingsDict = await main.getArrInstanceName(settingsDict, instance)
+
+        for cycle in range(args.cycles):
+            if not args.no_reset:
+                for arr_server in arr_servers:
+                    arr_server.reset()
+                if qbit_server:
+                    qbit_server.reset()
+            for server in servers:
+                server.counter.reset()
+
+            metrics = Cycle_Metrics(servers)
+            patched = [
+                (src.decluttarr, function_name, job)
+                for job, (_, function_name) in JOBS.items()
+            ]
+            patched += [
+                (main, function_name, function_name)
+                for function_name in (
+                    "getQbitSnapshot",
+                    "getProtectedAndPrivateFromQbit",
+                )
+            ]
+            originals = [
+                (module, function_name, getattr(module, function_name))
+                for module, function_name, _ in patched
+            ]
+            originals.append((main, "queueCleaner", main.queueCleaner))
+            for module, function_name, job in patched:
+                setattr(
+                    module,
+                    function_name,
+                    metrics.measure(job, getattr(module, function_name)),
+                )
+            main.queueCleaner = metrics.one_at_a_time(main.queueCleaner)
+            try:
+                before = metrics.sample()
+                await main.run_cycle(
+                    settingsDict, defective_tracker, download_sizes_tracker
+                )
+                metrics.add("cycle total", before, metrics.sample())
+            finally:
+                for module, function_name, original in originals:
+                    setattr(module, function_name, original)
+
+            metrics_per_cycle.append(
+                {
+                    "cycle": cycle + 1,
+                    "jobs": metrics.jobs,
+                    "endpoints": {
+                        type(server).__name__: server.counter.snapshot()["endpoints"]
+                        for server in servers
+                    },
+                }
+            )
+    finally:
+        for server in servers:
+            server.stop()
+    return {"queue_size": queue_size, "torrents": torrents, "cycles": metrics_per_cycle}
+
+
+def print_report(result):
+    print()
+    print(
+        f"Queue size per instance: {result['queue_size']} / torrents: {result['torrents']}"
+    )
+    header = f"{'job':<32}{'wall s':>10}{'cpu s':>10}{'calls':>9}{'KB sent':>11}{'KB recv':>12}{'peak RSS MB':>13}"
+    for cycle in result["cycles"]:
+        print(f"-- cycle {cycle['cycle']}")
+        print(header)
+        for job, entry in cycle["jobs"].items():
+            print(
+                f"{job:<32}{entry['wall']:>10.3f}{entry['cpu']:>10.3f}{entry['calls']:>9}"
+                f"{entry['bytes_sent'] / 1024:>11.1f}{entry['bytes_received'] / 1024:>12.1f}{entry['peak_rss_mb']:>13.1f}"
+            )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark full decluttarr cycles against fake *arr/qBit servers"
+    )
+    parser.add_argument(
+        "--queue-sizes",
+        type=int,
+        nargs="+",
+        default=[1000],
+        help="queue items per instance",
+    )
+    parser.add_argument(
+        "--torrents",
+        type=int,
+        default=None,
+        help="torrents in qBit (defaults to the total queue size)",
+    )
+    parser.add_argument(
+        "--wanted-size", type=int, default=1000, help="records on each wanted/* list"
+    )
+    parser.add_argument(
+        "--apps",
+        nargs="+",
+        default=["SONARR"],
+        choices=["SONARR", "RADARR"],
+        help="repeat an app to run several instances of it",
+    )
+    parser.add_argument(
+        "--jobs",
+        nargs="+",
+        default=[job for job in JOBS if job != "unmonitored"],
+        choices=list(JOBS),
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="added latency per request in milliseconds",
+    )
+    parser.add_argument("--cycles", type=int, default=1)
+    parser.add_argument(
+        "--qbit-version",
+        default="v5.1.0",
+        help="versions below 5.1.0 fetch properties per torrent",
+    )
+    parser.add_argument(
+        "--no-qbit", action="store_true", help="run without a download client"
+    )
+    parser.add_argument(
+        "--no-reset", action="store_true", help="keep the server state between cycles"
+    )
+    parser.add_argument(
+        "--test-run", action="store_true", help="set TEST_RUN (no deletes are sent)"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="set STREAM_RECORDS (records are decoded while being read)",
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument(
+        "--json", help="write the results to this file (to compare commits)"
+    )
+    parser.add_argument(
+        "--record",
+        help="record the traffic into this trace file (see benchmarks/replay.py)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {"commit": commit_id(), "args": vars(args), "runs": []}
+    for queue_size in args.queue_sizes:
+        result = asyncio.run(run_benchmark(args, queue_size))
+        print_report(result)
+        results["runs"].append(result)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
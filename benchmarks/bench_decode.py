@@ -0,0 +1,98 @@
+# Compares the JSON decoders (see JSON_DECODER) on generated queue and torrent list payloads
+# Usage (from the repository root):
+#   python -m benchmarks.bench_decode --sizes 1000 10000 50000
+# For every payload and decoder, the median decode time and the peak memory allocated while decoding
+# (tracemalloc, measured in a separate untimed round) are reported. "queue+QueueItem" includes the
+# conversion that get_queue does right after decoding
+import argparse
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+os.environ.setdefault("IS_IN_PYTEST", "true")
+
+from benchmarks.queue_generator import generate_queue, generate_torrents
+from src.utils.json_decoder import available_backends, get_decoder
+from src.utils.queue_item import queue_page
+
+
+def payloads(size, seed):
+    records = generate_queue(size, seed=seed)
+    queue = json.dumps({"totalRecords": size, "records": records}).encode()
+    torrents = json.dumps(generate_torrents(records, padding=size, seed=seed)).encode()
+    return {
+        "queue": (queue, None),
+        "queue+QueueItem": (queue, queue_page),
+        "torrents/info": (torrents, None),
+    }
+
+
+def measure(decode, content, convert, rounds):
+    def run():
+        result = decode(content)
+        return convert(result) if convert else result
+
+    run()  # warm-up
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"median": statistics.median(timings), "peak": peak}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Decode time and allocations of the JSON decoders"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument(
+        "--decoders",
+        nargs="+",
+        default=available_backends(),
+        choices=["orjson", "msgspec", "json"],
+    )
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--json", help="write the results to this file (to compare commits)"
+    )
+    args = parser.parse_args(argv)
+
+    results = []
+    print(
+        f"{'payload':<18}{'items':>8}{'MB':>8}{'decoder':>10}{'median ms':>12}{'MB/s':>9}{'peak MB':>10}"
+    )
+    for size in args.sizes:
+        for payload_name, (content, convert) in payloads(size, args.seed).items():
+            for requested in args.decoders:
+                name, decode, _ = get_decoder(requested)
+                if name != requested:
+                    print(
+                        f"{payload_name:<18}{size:>8}{'':>8}{requested:>10}  (not installed)"
+                    )
+                    continue
+                result = measure(decode, content, convert, args.rounds)
+                result.update(
+                    payload=payload_name, size=size, bytes=len(content), decoder=name
+                )
+                results.append(result)
+                print(
+                    f"{payload_name:<18}{size:>8}{len(content) / 1e6:>8.2f}{name:>10}{result['median'] * 1000:>12.2f}"
+                    f"{len(content) / 1e6 / result['median']:>9.0f}{result['peak'] / 1e6:>10.2f}"
+                )
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
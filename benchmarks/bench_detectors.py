@@ -0,0 +1,268 @@
+# Microbenchmarks for the detection logic of the jobs and the shared queue helpers
+# Usage (from the repository root):
+#   python -m benchmarks.bench_detectors --sizes 1000 10000 100000
+# For every case and queue size, the median/min time over several rounds is reported, together with the
+# time per queue item and the growth exponent between consecutive sizes (1.0 = linear, 2.0 = quadratic)
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import statistics
+import time
+from contextlib import contextmanager
+from unittest.mock import patch
+
+os.environ.setdefault("IS_IN_PYTEST", "true")
+
+from benchmarks.queue_generator import generate_queue
+from src.utils.queue_item import QueueItem
+
+SETTINGS = {
+    "TEST_RUN": True,
+    "LOG_LEVEL": "INFO",
+    "IGNORE_PRIVATE_TRACKERS": True,
+    "PERMITTED_ATTEMPTS": 3,
+    "IGNORED_DOWNLOAD_CLIENTS": [],
+    "DETECTION_RULES": [],
+    "QBIT_STATE_DETECTION": False,
+    "FAILED_IMPORT_MESSAGE_PATTERNS": [
+        "Not a Custom Format upgrade for existing",
+        "Not an upgrade for existing",
+    ],
+}
+
+
+def benchmark(func, setup, rounds):
+    # Calls setup() before every round (untimed) and func(*setup_result) inside the timed section
+    func(*setup())  # warm-up
+    timings = []
+    for _ in range(rounds):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return {"min": min(timings), "median": statistics.median(timings)}
+
+
+def run_async(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+@contextmanager
+def detector_patches(module_name, queue):
+    # Isolates the detection loop of a job: no HTTP, no removals
+    async def get_queue(*args, **kwargs):
+        return list(queue)
+
+    async def qBitOffline(*args, **kwargs):
+        return False
+
+    async def execute_checks(*args, **kwargs):
+        return kwargs.get("affectedItems", args[1] if len(args) > 1 else [])
+
+    module = f"src.jobs.{module_name}"
+    with patch(f"{module}.get_queue", get_queue), patch(
+        f"{module}.execute_checks", execute_checks
+    ):
+        if hasattr(__import__(module, fromlist=["_"]), "qBitOffline"):
+            with patch(f"{module}.qBitOffline", qBitOffline):
+                yield
+        else:
+            yield
+
+
+def detector_case(module_name, unchanged=True):
+    # With unchanged, the queue is the same in each round (a quiet instance, see Verdict_Cache), else all items are decided again
+    def case(queue, rounds):
+        from src.utils.verdict_cache import verdict_cache
+
+        module = __import__(f"src.jobs.{module_name}", fromlist=[module_name])
+        job = getattr(module, module_name)
+        with detector_patches(module_name, queue):
+            return benchmark(
+                lambda: run_async(job(SETTINGS, "", "", "bench", None, None, [], [])),
+                lambda: () if unchanged else verdict_cache.verdicts.clear() or (),
+                rounds,
+            )
+
+    return case
+
+
+def affected_ids(queue, share):
+    download_ids = list(dict.fromkeys(item["downloadId"] for item in queue))
+    return download_ids[:: int(1 / share)]
+
+
+def execute_checks_case(queue, rounds):
+    from src.utils.shared import execute_checks
+    from src.utils.trackers import Defective_Tracker, Deleted_Downloads
+
+    stalled = [
+        item
+        for item in queue
+        if item.get("errorMessage") == "The download is stalled with no connections"
+    ]
+    protected = affected_ids(queue, 0.1)
+    private = affected_ids(queue, 0.2)
+
+    def setup():
+        return (
+            [dict(item) for item in stalled],
+            Defective_Tracker({"bench": {}}),
+            Deleted_Downloads([]),
+        )
+
+    def func(affectedItems, defective_tracker, deleted_downloads):
+        with patch("src.utils.shared.rest_delete"):
+            run_async(
+                execute_checks(
+                    SETTINGS,
+                    affectedItems,
+                    "stalled",
+                    "bench",
+                    "",
+                    "bench",
+                    deleted_downloads,
+                    defective_tracker,
+                    private,
+                    protected,
+                    addToBlocklist=True,
+                    doPrivateTrackerCheck=True,
+                    doProtectedDownloadCheck=True,
+                    doPermittedAttemptsCheck=True,
+                )
+            )
+
+    return benchmark(func, setup, rounds)
+
+
+def permitted_attempts_case(queue, rounds):
+    from src.utils.shared import permittedAttemptsCheck
+    from src.utils.trackers import Defective_Tracker
+
+    stalled = list(
+        {
+            item["downloadId"]: item for item in queue if item["status"] == "warning"
+        }.values()
+    )
+    # Half of the items were already caught in a previous cycle, a few others have recovered since
+    previously = {
+        item["downloadId"]: {"title": item["title"], "Attempts": 1}
+        for item in stalled[::2]
+    }
+    previously.update(
+        {
+            f"RECOVERED{n}": {"title": "recovered", "Attempts": 1}
+            for n in range(len(stalled) // 10)
+        }
+    )
+
+    def setup():
+        tracker = Defective_Tracker(
+            {
+                "bench": {
+                    "stalled": {key: dict(value) for key, value in previously.items()}
+                }
+            }
+        )
+        return list(stalled), tracker
+
+    def func(affectedItems, defective_tracker):
+        permittedAttemptsCheck(
+            SETTINGS, affectedItems, "stalled", "bench", defective_tracker
+        )
+
+    return benchmark(func, setup, rounds)
+
+
+def filter_delayed_case(queue, rounds):
+    from src.utils.shared import filterOutDelayedQueueItems
+
+    return benchmark(filterOutDelayedQueueItems, lambda: (queue,), rounds)
+
+
+def formatted_queue_info_case(queue, rounds):
+    from src.utils.shared import formattedQueueInfo
+
+    return benchmark(
+        lambda queue: str(formattedQueueInfo(queue)), lambda: (queue,), rounds
+    )
+
+
+CASES = {
+    "remove_failed": detector_case("remove_failed"),
+    "remove_failed_imports": detector_case("remove_failed_imports"),
+    "remove_metadata_missing": detector_case("remove_metadata_missing"),
+    "remove_missing_files": detector_case("remove_missing_files"),
+    "remove_stalled": detector_case("remove_stalled"),
+    "remove_failed_imports (changed)": detector_case(
+        "remove_failed_imports", unchanged=False
+    ),
+    "remove_missing_files (changed)": detector_case(
+        "remove_missing_files", unchanged=False
+    ),
+    "remove_stalled (changed)": detector_case("remove_stalled", unchanged=False),
+    "execute_checks": execute_checks_case,
+    "permittedAttemptsCheck": permitted_attempts_case,
+    "filterOutDelayedQueueItems": filter_delayed_case,
+    "formattedQueueInfo": formatted_queue_info_case,
+}
+
+
+def growth_exponent(previous, current):
+    # Slope of the scaling curve on a log-log scale between two measured sizes
+    if not previous or previous["median"] <= 0 or current["median"] <= 0:
+        return None
+    return math.log(current["median"] / previous["median"]) / math.log(
+        current["size"] / previous["size"]
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Microbenchmarks for decluttarr's detector functions"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--json", help="write the results to this file (to compare commits)"
+    )
+    args = parser.parse_args(argv)
+
+    # Keeps log output (and formatting of log messages) out of the measurement
+    logging.basicConfig(level=logging.WARNING)
+    # As returned by get_queue
+    queues = {
+        size: [QueueItem(record) for record in generate_queue(size, seed=args.seed)]
+        for size in args.sizes
+    }
+
+    results = {}
+    print(
+        f"{'case':<34}{'items':>9}{'median ms':>12}{'min ms':>11}{'us/item':>10}{'growth':>8}"
+    )
+    for case_name in args.cases:
+        previous = None
+        results[case_name] = []
+        for size in args.sizes:
+            result = CASES[case_name](queues[size], args.rounds)
+            result["size"] = size
+            exponent = growth_exponent(previous, result)
+            result["growth"] = exponent
+            results[case_name].append(result)
+            print(
+                f"{case_name:<34}{size:>9}{result['median'] * 1000:>12.3f}{result['min'] * 1000:>11.3f}"
+                f"{result['median'] / size * 1e6:>10.3f}{'' if exponent is None else f'{exponent:.2f}':>8}"
+            )
+            previous = result
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Measures the memory needed to hold a decoded queue, as full *arr record dicts and as QueueItems (decoded at once, streamed,
+# or streamed in pages of STREAM_PAGE_SIZE records as with STREAM_RECORDS)
+# Usage (from the repository root):
+#   python -m benchmarks.bench_memory --sizes 1000 10000
+# "peak" is the highest allocation while decoding (and converting) a queue page, "retained" what is left
+# once only the queue is kept, both as reported by tracemalloc
+# Exits with 1 if decoding in pages needs more than one page on top of the queue that is kept ("overhead" above the largest page)
+import sys
+import argparse
+import gc
+import json
+import os
+import tracemalloc
+
+os.environ.setdefault("IS_IN_PYTEST", "true")
+
+from benchmarks.queue_generator import generate_queue
+from src.utils.json_stream import Json_Stream
+from src.utils.queue_item import QueueItem, queue_page
+from src.utils.rest import STREAM_CHUNK_SIZE
+from src.utils.shared import STREAM_PAGE_SIZE
+
+
+def decode_dicts(payload, pages):
+    return json.loads(payload)["records"]
+
+
+def decode_queue_items(payload, pages):
+    return queue_page(json.loads(payload))["records"]
+
+
+def chunked(payload):
+    # The body arrives in chunks of STREAM_CHUNK_SIZE bytes
+    return (
+        payload[start : start + STREAM_CHUNK_SIZE]
+        for start in range(0, len(payload), STREAM_CHUNK_SIZE)
+    )
+
+
+def decode_queue_items_streamed(payload, pages):
+    # Every record is converted as soon as it is decoded
+    return [QueueItem(record) for record in Json_Stream(chunked(payload)).records({})]
+
+
+def decode_queue_items_paged(payload, pages):
+    # As with STREAM_RECORDS: one page of STREAM_PAGE_SIZE records after the other, each streamed
+    queue = []
+    for page in pages:
+        queue += [
+            QueueItem(record) for record in Json_Stream(chunked(page)).records({})
+        ]
+    return queue
+
+
+CASES = {
+    "dicts": decode_dicts,
+    "QueueItem": decode_queue_items,
+    "streamed": decode_queue_items_streamed,
+    "paged": decode_queue_items_paged,
+}
+
+
+def encode_pages(records):
+    return [
+        json.dumps(
+            {
+                "page": start // STREAM_PAGE_SIZE + 1,
+                "pageSize": STREAM_PAGE_SIZE,
+                "totalRecords": len(records),
+                "records": records[start : start + STREAM_PAGE_SIZE],
+            }
+        ).encode()
+        for start in range(0, len(records), STREAM_PAGE_SIZE)
+    ]
+
+
+def measure(decode, payload, pages):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        queue = decode(payload, pages)
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del queue
+    return {"peak": peak, "retained": retained}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory needed to hold decoded queues")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--json", help="write the results to this file (to compare commits)"
+    )
+    args = parser.parse_args(argv)
+
+    results = {}
+    unbounded = []
+    print(
+        f"{'case':<12}{'items':>9}{'payload MB':>12}{'peak MB':>10}{'retained MB':>13}{'overhead MB':>13}{'KB/item':>9}"
+    )
+    for size in args.sizes:
+        records = generate_queue(size, seed=args.seed)
+        payload = json.dumps({"totalRecords": size, "records": records}).encode()
+        pages = encode_pages(records)
+        del records
+        for case_name, decode in CASES.items():
+            result = measure(decode, payload, pages)
+            result["size"] = size
+            results.setdefault(case_name, []).append(result)
+            overhead = result["peak"] - result["retained"]
+            print(
+                f"{case_name:<12}{size:>9}{len(payload) / 1e6:>12.2f}{result['peak'] / 1e6:>10.2f}"
+                f"{result['retained'] / 1e6:>13.2f}{overhead / 1e6:>13.2f}{result['retained'] / size / 1e3:>9.2f}"
+            )
+            if case_name == "paged" and overhead > max(map(len, pages)):
+                unbounded.append(size)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+    if unbounded:
+        print(
+            f"Decoding in pages needed more than one page on top of the queue for sizes: {unbounded}"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Times a single run (RUN_ONCE) from the start of the process until it exits, as when decluttarr is scheduled by cron or a Kubernetes CronJob
+# Usage (from the repository root):
+#   python -m benchmarks.bench_once --queue-size 1000 --instances 3 --latency 2 --rounds 5
+# Each round starts `python main.py --once` against the fake servers, configured via the environment (as in docker); the time includes
+# starting the interpreter, the imports, the startup checks and the clean-up, and is compared against the time for importing alone
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_cycle import commit_id
+from benchmarks.fake_servers import Fake_Arr_Server, Fake_Qbit_Server
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def environment(args, arr_servers, qbit_server, state_file):
+    # The first server is the SONARR instance, the others are additional instances
+    env = {key: value for key, value in os.environ.items() if key != "IS_IN_PYTEST"}
+    env.update(
+        IS_IN_DOCKER="true",
+        PYTHONDONTWRITEBYTECODE="1",
+        LOG_LEVEL=args.log_level,
+        SONARR_URL=arr_servers[0].url,
+        SONARR_KEY="benchmark",
+        SONARR_INSTANCES=json.dumps(
+            {
+                str(index): {"URL": server.url, "KEY": "benchmark"}
+                for index, server in enumerate(arr_servers[1:], 2)
+            }
+        ),
+        QBITTORRENT_URL=qbit_server.url,
+        TEST_RUN="true",
+        STARTUP_EXIT_DELAY="0",
+        TRACKER_STATE_FILE=state_file,
+        **{setting: "true" for setting in args.features},
+    )
+    return env
+
+
+def timed(command, env):
+    start = time.perf_counter()
+    result = subprocess.run(
+        command, cwd=REPOSITORY_ROOT, env=env, capture_output=True, text=True
+    )
+    return time.perf_counter() - start, result
+
+
+def summary(timings):
+    return {"min": min(timings), "median": statistics.median(timings)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time a single decluttarr run (--once) from start to exit"
+    )
+    parser.add_argument(
+        "--queue-size", type=int, default=1000, help="queue items per instance"
+    )
+    parser.add_argument("--instances", type=int, default=1, help="Sonarr instances")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="added latency per request in milliseconds",
+    )
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument(
+        "--features",
+        nargs="+",
+        default=[
+            "REMOVE_FAILED",
+            "REMOVE_METADATA_MISSING",
+            "REMOVE_MISSING_FILES",
+            "REMOVE_SLOW",
+            "REMOVE_STALLED",
+        ],
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument(
+        "--json", help="write the results to this file (to compare commits)"
+    )
+    args = parser.parse_args(argv)
+
+    arr_servers = [
+        Fake_Arr_Server("SONARR", args.queue_size, 0, args.latency / 1000, seed)
+        for seed in range(args.instances)
+    ]
+    qbit_server = Fake_Qbit_Server(
+        args.queue_size * args.instances, args.latency / 1000, 0, "v5.1.0", arr_servers
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for server in (*arr_servers, qbit_server):
+            server.start()
+        try:
+            env = environment(
+                args, arr_servers, qbit_server, os.path.join(directory, "trackers.json")
+            )
+            cases = {
+                "import only": [sys.executable, "-c", "import main"],
+                "run once": [sys.executable, "main.py", "--once"],
+            }
+            results = {}
+            for name, command in cases.items():
+                timings = []
+                for _ in range(args.rounds):
+                    elapsed, result = timed(command, env)
+                    if result.returncode != 0:
+                        print(result.stdout[-2000:], result.stderr[-2000:])
+                        raise SystemExit(
+                            f"{name} exited with status {result.returncode}"
+                        )
+                    timings.append(elapsed)
+                results[name] = summary(timings)
+        finally:
+            for server in (*arr_servers, qbit_server):
+                server.stop()
+
+    print(
+        f"{args.instances} instance(s) x {args.queue_size} queue items, {args.latency} ms latency, {args.rounds} rounds"
+    )
+    print(f"{'case':<16}{'median s':>10}{'min s':>10}")
+    for name, result in results.items():
+        print(f"{name:<16}{result['median']:>10.3f}{result['min']:>10.3f}")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(
+                {"commit": commit_id(), "args": vars(args), "results": results},
+                file,
+                indent=2,
+            )
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
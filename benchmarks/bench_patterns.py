@@ -0,0 +1,106 @@
+# Microbenchmark for matching status messages against FAILED_IMPORT_MESSAGE_PATTERNS
+# Usage (from the repository root):
+#   python -m benchmarks.bench_patterns --patterns 100 --messages 10000
+# Compares testing each pattern one after the other (as before) with the compiled matcher, with and without pyahocorasick
+import argparse
+import random
+import statistics
+import time
+from unittest.mock import patch
+
+from src.utils import message_matcher
+from src.utils.message_matcher import Message_Matcher
+
+WORDS = (
+    "episode file import existing upgrade custom format release series movie season sample "
+    "matched grab history quality folder permission denied path found eligible download client "
+    "unable parse title language profile cutoff size larger smaller expected destination"
+).split()
+
+
+def generate(pattern_count, message_count, seed=0):
+    # Patterns of a few words; about one message in 50 contains one of them
+    rng = random.Random(seed)
+    patterns = sorted(
+        {" ".join(rng.choices(WORDS, k=4)) for _ in range(pattern_count * 2)}
+    )[:pattern_count]
+    messages = []
+    for index in range(message_count):
+        message = " ".join(rng.choices(WORDS, k=rng.randint(8, 20)))
+        if index % 50 == 0:
+            message += " " + rng.choice(patterns)
+        messages.append(message)
+    return patterns, messages
+
+
+def benchmark(func, rounds):
+    func()  # warm-up
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {"min": min(timings), "median": statistics.median(timings)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Microbenchmark for FAILED_IMPORT_MESSAGE_PATTERNS"
+    )
+    parser.add_argument("--patterns", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    patterns, messages = generate(args.patterns, args.messages, args.seed)
+    # A tenth of the patterns as regular expressions and globs instead
+    mixed = [
+        (
+            f"re:{pattern.replace(' ', ' +')}$"
+            if index % 20 == 0
+            else f"glob:*{pattern}" if index % 20 == 10 else pattern
+        )
+        for index, pattern in enumerate(patterns)
+    ]
+
+    def each_pattern():
+        return sum(
+            any(pattern in message for pattern in patterns) for message in messages
+        )
+
+    def compiled(matcher):
+        return lambda: sum(matcher.matches(message) for message in messages)
+
+    with patch.object(message_matcher, "load_aho_corasick", lambda: None):
+        cases = {
+            "each pattern (before)": each_pattern,
+            "matcher (regex)": compiled(Message_Matcher(patterns)),
+        }
+        mixed_regex = Message_Matcher(mixed)
+    if message_matcher.load_aho_corasick():
+        cases["matcher (aho-corasick)"] = compiled(Message_Matcher(patterns))
+        cases["mixed (aho-corasick + regex)"] = compiled(Message_Matcher(mixed))
+    else:
+        print("pyahocorasick is not installed, skipping the aho-corasick cases")
+    cases["mixed (regex)"] = compiled(mixed_regex)
+
+    start = time.perf_counter()
+    Message_Matcher(patterns)
+    print(
+        f"{args.patterns} patterns x {len(messages)} messages (compiling took {(time.perf_counter() - start) * 1000:.1f} ms)"
+    )
+    matches = {name: case() for name, case in cases.items()}
+    print(
+        f"{'case':<32}{'median ms':>12}{'min ms':>11}{'us/message':>12}{'matches':>9}"
+    )
+    for name, case in cases.items():
+        result = benchmark(case, args.rounds)
+        print(
+            f"{name:<32}{result['median'] * 1000:>12.3f}{result['min'] * 1000:>11.3f}"
+            f"{result['median'] / len(messages) * 1e6:>12.3f}{matches[name]:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+# In-process stand-ins for the *arr and download client APIs, used to benchmark decluttarr at scale (and by the tests of the download client adapters)
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.queue_generator import generate_queue, generate_torrents
+
+
+class Traffic_Counter:
+    # Counts calls and bytes going through a fake server (thread safe, since the server is threaded)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.endpoints = {}
+
+    def add(self, endpoint, bytes_in, bytes_out):
+        with self.lock:
+            self.calls += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "endpoints": dict(self.endpoints),
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the connection without reading the whole response (streamed reads stop once they have enough records)
+            pass
+
+    def log_message(self, format, *args):
+        # Keeps the benchmark output clean
+        return
+
+    def _dispatch(self, method):
+        parsed = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        status, payload, extra_headers = self.server.fake.handle(
+            method, parsed.path, params, body, self.headers
+        )
+        if isinstance(payload, (bytes, str)):
+            content = payload.encode() if isinstance(payload, str) else payload
+            content_type = "text/plain"
+        else:
+            content = json.dumps(payload).encode()
+            content_type = "application/json"
+
+        # GET responses carry an ETag, and are answered with a 304 if unchanged (unless etags is turned off)
+        if method == "GET" and status == 200 and self.server.fake.etags:
+            etag = f'"{hashlib.sha1(content).hexdigest()[:16]}"'
+            extra_headers = dict(extra_headers, ETag=etag)
+            if self.headers.get("If-None-Match") == etag:
+                status, content = 304, b""
+
+        # Counted before responding, so the client never observes a response that is not yet counted
+        self.server.counter.add(
+            f"{method} {self.server.fake.endpoint_class(parsed.path)}",
+            len(self.requestline) + len(str(self.headers)) + len(body),
+            len(content),
+        )
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        for key, value in extra_headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+class _Fake_Server:
+    # Runs the fake app on a local port in a background thread
+    api_prefix = ""
+    etags = True
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.counter = Traffic_Counter()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return self.url + self.api_prefix
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._httpd.latency = self.latency
+        self._httpd.counter = self.counter
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def endpoint_class(self, path):
+        # Groups paths such as /queue/123 into /queue/{id} for reporting
+        path = (
+            path[len(self.api_prefix) :] if path.startswith(self.api_prefix) else path
+        )
+        return "/".join("{id}" if part.isdigit() else part for part in path.split("/"))
+
+    def handle(self, method, path, params, body, headers):
+        raise NotImplementedError
+
+
+class Fake_Arr_Server(_Fake_Server):
+    # Serves the subset of the Sonarr/Radarr v3 API that decluttarr uses
+    api_prefix = "/api/v3"
+
+    def __init__(
+        self, arr_type="SONARR", queue_size=1000, wanted_size=1000, latency=0.0, seed=0
+    ):
+        super().__init__(latency)
+        self.arr_type = arr_type
+        self.queue_size = queue_size
+        self.wanted_size = wanted_size
+        self.seed = seed
+        self.app_name = arr_type.title()
+        self.version = "5.10.3.9171" if arr_type == "RADARR" else "4.0.9.2332"
+        self.reset()
+
+    def reset(self):
+        # Restores the initial dataset (so every benchmark cycle sees the same queue)
+        self.lock = threading.Lock()
+        self.queue = {
+            record["id"]: record
+            for record in generate_queue(self.queue_size, self.seed, self.arr_type)
+        }
+        self.wanted = [
+            {
+                "id": item_id,
+                "title": f"Wanted {item_id}",
+                "year": 2000,
+                "seriesId": item_id % 500 + 1,
+                "seasonNumber": 1,
+                "episodeNumber": item_id,
+                "lastSearchTime": "2020-01-01T00:00:00Z",
+            }
+            for item_id in range(1, self.wanted_size + 1)
+        ]
+        self.commands = {}
+
+    def _page(self, records, params):
+        page = int(params.get("page", 1))
+        page_size = int(params.get("pageSize", 10))
+        start = (page - 1) * page_size
+        return {
+            "page": page,
+            "pageSize": page_size,
+            "totalRecords": len(records),
+            "records": records[start : start + page_size],
+        }
+
+    def handle(self, method, path, params, body, headers):
+        path = path[len(self.api_prefix) :]
+        parts = path.strip("/").split("/")
+
+        if method == "GET" and path == "/system/status":
+            return (
+                200,
+                {
+                    "appName": self.app_name,
+                    "version": self.version,
+                    "instanceName": self.app_name,
+                },
+                {},
+            )
+        if method == "GET" and path == "/config/ui":
+            return 200, {"uiLanguage": 1}, {}
+        if parts[0] == "queue":
+            with self.lock:
+                if method == "GET" and len(parts) == 1:
+                    return 200, self._page(list(self.queue.values()), params), {}
+                if method == "DELETE" and len(parts) == 2:
+                    self.queue.pop(int(parts[1]), None)
+                    return 200, b"", {}
+        if parts[0] == "command":
+            with self.lock:
+                if method == "POST":
+                    command = json.loads(body or b"{}")
+                    command.update(
+                        {"id": len(self.commands) + 1, "status": "completed"}
+                    )
+                    self.commands[command["id"]] = command
+                    return 201, command, {}
+                if method == "GET" and len(parts) == 2:
+                    return 200, self.commands.get(int(parts[1]), {}), {}
+                if method == "GET":
+                    return 200, list(self.commands.values()), {}
+        if (
+            method == "GET"
+            and parts[0] in ("episode", "movie", "album", "book")
+            and len(parts) == 2
+        ):
+            item_id = int(parts[1])
+            return 200, {"id": item_id, "monitored": item_id % 10 != 0}, {}
+        if method == "GET" and parts[0] == "wanted" and len(parts) == 2:
+            return 200, self._page(self.wanted, params), {}
+        if method == "GET" and path == "/series":
+            return (
+                200,
+                [
+                    {"id": series_id, "title": f"Series {series_id}"}
+                    for series_id in range(1, 501)
+                ],
+                {},
+            )
+        return 404, {"message": "NotFound"}, {}
+
+
+class Fake_Qbit_Server(_Fake_Server):
+    # Serves the subset of the qBittorrent WebUI API v2 that decluttarr uses
+    api_prefix = "/api/v2"
+
+    def __init__(
+        self, torrents=1000, latency=0.0, seed=0, version="v4.6.7", arr_servers=()
+    ):
+        super().__init__(latency)
+        self.version = version
+        self.torrent_count = torrents
+        self.seed = seed
+        self.arr_servers = arr_servers
+        self.reset()
+
+    def reset(self):
+        # Torrents belonging to the queue items of the given arr servers come first, the rest is padding
+        self.tags = ["Don't Kill"]
+        queue_items = [
+            item for server in self.arr_servers for item in server.queue.values()
+        ]
+        torrents = generate_torrents(queue_items, seed=self.seed)
+        padding = max(0, self.torrent_count - len(torrents))
+        torrents += generate_torrents([], padding, seed=self.seed + 1)
+        self.torrents = {torrent["hash"]: torrent for torrent in torrents}
+
+    def handle(self, method, path, params, body, headers):
+        path = path[len(self.api_prefix) :]
+        if method == "POST" and path == "/auth/login":
+            return 200, "Ok.", {"Set-Cookie": "SID=benchmark; path=/"}
+        if method == "GET" and path == "/app/version":
+            return 200, self.version, {}
+        if method == "GET" and path == "/torrents/info":
+            if "hashes" in params:
+                hashes = params["hashes"].lower().split("|")
+                return 200, [self.torrents[h] for h in hashes if h in self.torrents], {}
+            return 200, list(self.torrents.values()), {}
+        if method == "GET" and path == "/torrents/properties":
+            torrent = self.torrents.get(params.get("hash", "").lower(), {})
+            return 200, {"is_private": torrent.get("private", False)}, {}
+        if method == "GET" and path == "/sync/maindata":
+            return 200, {"server_state": {"connection_status": "connected"}}, {}
+        if method == "GET" and path == "/torrents/tags":
+            return 200, self.tags, {}
+        if method == "POST" and path == "/torrents/createTags":
+            return 200, b"", {}
+        return 404, b"Not Found", {}
+
+
+class Fake_Transmission_Server(_Fake_Server):
+    # Serves the part of the Transmission RPC that decluttarr uses, including the session id handshake (409 until the current id is sent)
+    api_prefix = "/transmission/rpc"
+    etags = False
+
+    def __init__(self, torrents=(), latency=0.0, username="", password=""):
+        # torrents: (hash, size, downloaded) of each torrent
+        super().__init__(latency)
+        self.torrents = list(torrents)
+        self.username = username
+        self.password = password
+        self.sessions = 0
+        self.restart()
+
+    def restart(self):
+        # Hands out a new session id, as Transmission does after a restart
+        self.sessions += 1
+        self.session_id = f"session-{self.sessions}"
+
+    def handle(self, method, path, params, body, headers):
+        if method != "POST" or path != self.api_prefix:
+            return 404, b"Not Found", {}
+        if self.username:
+            expected = (
+                "Basic "
+                + base64.b64encode(f"{self.username}:{self.password}".encode()).decode()
+            )
+            if headers.get("Authorization") != expected:
+                return 401, b"Unauthorized", {}
+        if headers.get("X-Transmission-Session-Id") != self.session_id:
+            return 409, b"Conflict", {"X-Transmission-Session-Id": self.session_id}
+        request = json.loads(body)
+        if request["method"] != "torrent-get":
+            return 200, {"result": "method name not recognized", "arguments": {}}, {}
+        torrents = [
+            {
+                "hashString": torrent_hash,
+                "sizeWhenDone": size,
+                "leftUntilDone": size - downloaded,
+            }
+            for torrent_hash, size, downloaded in self.torrents
+        ]
+        return 200, {"result": "success", "arguments": {"torrents": torrents}}, {}
+
+
+class Fake_Deluge_Server(_Fake_Server):
+    # Serves the part of the Deluge Web UI JSON-RPC that decluttarr uses: login (session cookie), connecting to a daemon, and the torrent status
+    api_prefix = "/json"
+    etags = False
+
+    def __init__(self, torrents=(), latency=0.0, password="deluge", connected=False):
+        # torrents: (hash, size, downloaded) of each torrent
+        super().__init__(latency)
+        self.torrents = list(torrents)
+        self.password = password
+        self.connected = connected
+        self.logins = 0
+        self.sessions = set()
+
+    def restart(self):
+        # Forgets the sessions, as Deluge does after a restart
+        self.sessions.clear()
+
+    def handle(self, method, path, params, body, headers):
+        if method != "POST" or path != self.api_prefix:
+            return 404, b"Not Found", {}
+        request = json.loads(body)
+        result, error, extra_headers = self.call(
+            request["method"], request["params"], headers
+        )
+        return (
+            200,
+            {"result": result, "error": error, "id": request["id"]},
+            extra_headers,
+        )
+
+    def call(self, method, params, headers):
+        # Returns the result, the error and extra headers of the call
+        if method == "auth.login":
+            if params != [self.password]:
+                return False, None, {}
+            self.logins += 1
+            session = f"session-{self.logins}"
+            self.sessions.add(session)
+            return True, None, {"Set-Cookie": f"_session_id={session}; path=/json"}
+        cookies = dict(
+            part.strip().split("=", 1)
+            for part in (headers.get("Cookie") or "").split(";")
+            if "=" in part
+        )
+        if cookies.get("_session_id") not in self.sessions:
+            return None, {"message": "Not authenticated", "code": 1}, {}
+        if method == "web.connected":
+            return self.connected, None, {}
+        if method == "web.get_hosts":
+            return [["daemon", "127.0.0.1", 58846, "localclient"]], None, {}
+        if method == "web.connect":
+            self.connected = True
+            return [], None, {}
+        if method == "core.get_torrents_status":
+            if not self.connected:
+                return None, {"message": "Not connected to a daemon", "code": 3}, {}
+            return (
+                {
+                    torrent_hash: {"total_done": downloaded}
+                    for torrent_hash, _, downloaded in self.torrents
+                },
+                None,
+                {},
+            )
+        return None, {"message": "Unknown method", "code": 2}, {}
+
+
+class Fake_Sabnzbd_Server(_Fake_Server):
+    # Serves the part of the SABnzbd API that decluttarr uses: the history (errors are reported with HTTP 200, as SABnzbd does)
+    api_prefix = "/api"
+    etags = False
+
+    def __init__(self, history=(), latency=0.0, api_key="sabnzbd"):
+        # history: the slots of the history, newest first (dictionaries with at least nzo_id and status)
+        super().__init__(latency)
+        self.history = list(history)
+        self.api_key = api_key
+
+    def handle(self, method, path, params, body, headers):
+        if method != "GET" or path != self.api_prefix:
+            return 404, b"Not Found", {}
+        if params.get("apikey") != self.api_key:
+            return 200, {"status": False, "error": "API Key Incorrect"}, {}
+        if params.get("mode") != "history":
+            return 200, {"status": False, "error": "not implemented"}, {}
+        slots = self.history[: int(params.get("limit") or len(self.history))]
+        return 200, {"history": {"slots": slots, "noofslots": len(self.history)}}, {}
+
+
+class Fake_Nzbget_Server(_Fake_Server):
+    # Serves the part of the NZBGet JSON-RPC that decluttarr uses: the queue (listgroups) and the history
+    api_prefix = "/jsonrpc"
+    etags = False
+
+    def __init__(self, groups=(), history=(), latency=0.0, username="", password=""):
+        # groups, history: the entries as NZBGet reports them (dictionaries with at least NZBID and Status)
+        super().__init__(latency)
+        self.groups = list(groups)
+        self.history = list(history)
+        self.username = username
+        self.password = password
+
+    def handle(self, method, path, params, body, headers):
+        if method != "POST" or path != self.api_prefix:
+            return 404, b"Not Found", {}
+        if self.username:
+            expected = (
+                "Basic "
+                + base64.b64encode(f"{self.username}:{self.password}".encode()).decode()
+            )
+            if headers.get("Authorization") != expected:
+                return 401, b"Unauthorized", {}
+        request = json.loads(body)
+        results = {"listgroups": self.groups, "history": self.history}
+        if request["method"] not in results:
+            return (
+                200,
+                {
+                    "result": None,
+                    "error": {"message": "Method not found", "code": -32601},
+                    "id": request["id"],
+                },
+                {},
+            )
+        return (
+            200,
+            {"result": results[request["method"]], "error": None, "id": request["id"]},
+            {},
+        )
@@ -0,0 +1,211 @@
+# Seeded generator for realistic *arr queue items
+# The same seed always yields the same queue, so benchmark results can be compared between commits
+import random
+
+TORRENT_CLIENTS = [
+    "qBittorrent",
+    "qBittorrent",
+    "qBittorrent",
+    "Transmission",
+    "Deluge",
+]
+USENET_CLIENTS = ["SABnzbd", "SABnzbd", "NZBGet"]
+INDEXERS = ["Indexer A (Prowlarr)", "Indexer B (Prowlarr)", "Indexer C (Prowlarr)"]
+
+IMPORT_WARNINGS = [
+    "Not an upgrade for existing episode file(s). Existing quality: WEBDL-1080p. New Quality WEBDL-1080p.",
+    "Not a Custom Format upgrade for existing episode file(s). New: [] (0) do not improve on Existing: [] (0)",
+    "Episode {number} was not found in the grabbed release: {title}.mkv",
+    "Found matching series via grab history, but release was matched to series by ID. Automatic import is not possible.",
+    "Unable to determine if file is a sample",
+]
+
+# (share of items, status, trackedDownloadStatus, trackedDownloadState, errorMessage)
+STATES = [
+    (0.45, "downloading", "ok", "downloading", None),
+    (0.06, "queued", "ok", "downloading", None),
+    (0.04, "delay", "ok", "downloading", None),
+    (0.08, "completed", "ok", "importPending", None),
+    (0.10, "completed", "warning", "importPending", "import warnings"),
+    (0.03, "completed", "warning", "importBlocked", "no eligible files"),
+    (
+        0.10,
+        "warning",
+        "warning",
+        "downloading",
+        "The download is stalled with no connections",
+    ),
+    (0.05, "queued", "warning", "downloading", "qBittorrent is downloading metadata"),
+    (0.04, "failed", "warning", "downloading", "Download failed"),
+    (0.03, "warning", "warning", "downloading", "The download is missing files"),
+    (0.02, "paused", "ok", "downloading", None),
+]
+
+
+def _pick_state(rng):
+    roll = rng.random()
+    for share, *state in STATES:
+        if roll < share:
+            return state
+        roll -= share
+    return STATES[0][1:]
+
+
+def _download_id(rng, protocol, client):
+    if protocol == "torrent":
+        return f"{rng.getrandbits(160):040X}"
+    if client == "NZBGet":
+        return str(rng.randint(1, 10_000_000))
+    return f"SABnzbd_nzo_{rng.getrandbits(40):010x}"
+
+
+def _status_messages(rng, state, title, episode_number):
+    status, _, tracked_state, error = state
+    if error == "import warnings":
+        count = rng.randint(1, 3)
+        messages = [
+            rng.choice(IMPORT_WARNINGS).format(number=episode_number, title=title)
+            for _ in range(count)
+        ]
+        return [
+            {
+                "title": "One or more episodes expected in this release were not imported or missing from the release",
+                "messages": [],
+            },
+            {"title": f"{title}.mkv", "messages": messages},
+        ]
+    if error == "no eligible files":
+        return [
+            {
+                "title": title,
+                "messages": [
+                    f"No files found are eligible for import in /downloads/complete/{title}"
+                ],
+            }
+        ]
+    return []
+
+
+def generate_queue(
+    size,
+    seed=0,
+    arr_type="SONARR",
+    season_pack_ratio=0.3,
+    usenet_ratio=0.25,
+    start_id=1,
+):
+    # Returns `size` queue records as the *arr API would. Season packs (Sonarr only) produce several
+    # records that share a downloadId, title and state, one per episode
+    rng = random.Random(seed)
+    records = []
+    item_id = start_id
+    download_number = 0
+    while len(records) < size:
+        download_number += 1
+        protocol = "usenet" if rng.random() < usenet_ratio else "torrent"
+        client = rng.choice(USENET_CLIENTS if protocol == "usenet" else TORRENT_CLIENTS)
+        download_id = _download_id(rng, protocol, client)
+        state = _pick_state(rng)
+        status, tracked_status, tracked_state, error = state
+
+        episodes = 1
+        if arr_type == "SONARR" and rng.random() < season_pack_ratio:
+            episodes = rng.randint(6, 13)
+        episodes = min(episodes, size - len(records))
+        series_id = rng.randint(1, 2000)
+        season = rng.randint(1, 10)
+        title = (
+            f"Series.{series_id}.S{season:02d}.1080p.WEB-DL.x264-GROUP"
+            if episodes > 1
+            else f"Title.{download_number}.1080p.WEB-DL.x264-GROUP"
+        )
+        size_bytes = rng.randint(200, 4000) * 1_000_000 * episodes
+        sizeleft = 0 if status == "completed" else rng.randint(0, size_bytes)
+
+        for episode in range(1, episodes + 1):
+            record = {
+                "id": item_id,
+                "downloadId": download_id,
+                "title": title,
+                "status": status,
+                "trackedDownloadStatus": tracked_status,
+                "trackedDownloadState": tracked_state,
+                "statusMessages": _status_messages(rng, state, title, episode),
+                "protocol": protocol,
+                "downloadClient": client,
+                "downloadClientHasPostImportCategory": False,
+                "indexer": rng.choice(INDEXERS),
+                "outputPath": f"/downloads/complete/{title}",
+                "size": size_bytes,
+                "sizeleft": sizeleft,
+                "timeleft": "00:42:00",
+                "estimatedCompletionTime": "2024-01-01T00:42:00Z",
+                "added": "2024-01-01T00:00:00Z",
+                "quality": {
+                    "quality": {
+                        "id": 3,
+                        "name": "WEBDL-1080p",
+                        "source": "web",
+                        "resolution": 1080,
+                    },
+                    "revision": {"version": 1, "real": 0, "isRepack": False},
+                },
+                "languages": [{"id": 1, "name": "English"}],
+                "customFormats": [],
+                "customFormatScore": 0,
+            }
+            if error and error not in ("import warnings", "no eligible files"):
+                record["errorMessage"] = error
+            if arr_type == "RADARR":
+                record["movieId"] = item_id
+            else:
+                record["seriesId"] = series_id
+                record["episodeId"] = item_id
+                record["seasonNumber"] = season
+                record["episodeHasFile"] = False
+            records.append(record)
+            item_id += 1
+    return records
+
+
+def generate_torrents(records, padding=0, seed=0):
+    # Returns qBittorrent /torrents/info entries for the torrent downloads of the given queue records,
+    # followed by `padding` torrents that do not belong to any queue item
+    rng = random.Random(seed)
+    torrents = {}
+    for record in records:
+        if record["protocol"] != "torrent" or record["downloadClient"] != "qBittorrent":
+            continue
+        torrent_hash = record["downloadId"].lower()
+        if torrent_hash in torrents:
+            continue
+        torrents[torrent_hash] = _torrent(
+            rng,
+            torrent_hash,
+            record["title"],
+            record["size"],
+            record["size"] - record["sizeleft"],
+            len(torrents),
+        )
+    for index in range(padding):
+        torrent_hash = f"{rng.getrandbits(160):040x}"
+        size_bytes = rng.randint(200, 4000) * 1_000_000
+        torrents[torrent_hash] = _torrent(
+            rng, torrent_hash, f"Seeding.{index}", size_bytes, size_bytes, len(torrents)
+        )
+    return list(torrents.values())
+
+
+def _torrent(rng, torrent_hash, name, size_bytes, completed, index):
+    return {
+        "hash": torrent_hash,
+        "name": name,
+        "category": "tv-sonarr",
+        "tags": "Don't Kill" if index % 50 == 0 else "",
+        "private": rng.random() < 0.15,
+        "completed": completed,
+        "size": size_bytes,
+        "state": "uploading" if completed >= size_bytes else "downloading",
+        "num_seeds": rng.randint(0, 30),
+        "last_activity": 1_700_000_000,
+    }
@@ -0,0 +1,197 @@
+# Replays a trace recorded with RECORD_TRAFFIC against decluttarr, offline and as fast as possible
+# Usage (from the repository root):
+#   python -m benchmarks.replay traffic.jsonl.gz --cycles 5 --profile replay.prof
+import argparse
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+os.environ.setdefault("IS_IN_PYTEST", "true")
+
+from src.utils.recorder import load_trace, trace_key
+
+JOB_SETTINGS = [
+    "REMOVE_FAILED",
+    "REMOVE_FAILED_IMPORTS",
+    "REMOVE_METADATA_MISSING",
+    "REMOVE_MISSING_FILES",
+    "REMOVE_ORPHANS",
+    "REMOVE_SLOW",
+    "REMOVE_STALLED",
+    "REMOVE_UNMONITORED",
+]
+
+
+def player_key(method, url, params=None):
+    # The host is part of the key, since several instances of one arr type answer the same requests differently
+    return (urlsplit(url).netloc, *trace_key(method, url, params))
+
+
+class Trace_Player:
+    # Serves the recorded responses in the order they were recorded, per request (host, method, path, params).
+    # Once the recorded responses of a request are used up, the last one keeps being served
+    def __init__(self, entries):
+        self.lock = threading.Lock()
+        self.responses = defaultdict(deque)
+        self.last = {}
+        self.calls = 0
+        self.misses = defaultdict(int)
+        for entry in entries:
+            self.responses[
+                player_key(entry["method"], entry["url"], entry["params"])
+            ].append(entry)
+
+    def send(self, method, url, params=None, **kwargs):
+        key = player_key(method, url, params)
+        with self.lock:
+            self.calls += 1
+            if self.responses.get(key):
+                entry = self.responses[key].popleft()
+                self.last[key] = entry
+            else:
+                entry = self.last.get(key)
+            if entry is None and method.upper() == "GET":
+                self.misses[f"{key[1]} {key[0]}{key[2]}"] += 1
+        return build_response(entry, method, url)
+
+
+def build_response(entry, method, url):
+    response = requests.Response()
+    response.url = url
+    response.encoding = "utf-8"
+    # The body is served from memory, also for streamed reads
+    response._content_consumed = True
+    if entry is None:
+        # Unrecorded writes succeed silently, unrecorded reads are reported as misses
+        response.status_code = 200 if method.upper() != "GET" else 404
+        response._content = b""
+        return response
+    response.status_code = entry["status"]
+    response._content = entry["body"].encode("utf-8")
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    if "set-cookie" in response.headers:
+        response.cookies.set("SID", "REDACTED")
+    return response
+
+
+def instances_from_trace(entries):
+    # Derives the configured instances from the recorded traffic: {instance: {"URL": ..., "TYPE": ...}}
+    # Each base URL is an instance of its own; the first one of an arr type is named after the type (e.g. SONARR), the
+    # others like additional instances (SONARR_2, SONARR_3, ...)
+    arr_instances = {}
+    qbit_url = ""
+    qbit_version = "5.1.0"
+    for entry in entries:
+        url = entry["url"]
+        if url.endswith("/system/status") and entry["status"] == 200:
+            base_url = url[: -len("/system/status")]
+            if any(instance["URL"] == base_url for instance in arr_instances.values()):
+                continue
+            arr_type = json.loads(entry["body"])["appName"].upper()
+            count = sum(
+                instance["TYPE"] == arr_type for instance in arr_instances.values()
+            )
+            name = arr_type + (f"_{count + 1}" if count else "")
+            arr_instances[name] = {"URL": base_url, "TYPE": arr_type}
+        elif "/api/v2/" in url:
+            qbit_url = url.split("/api/v2/")[0] + "/api/v2"
+            if url.endswith("/app/version") and entry["status"] == 200:
+                qbit_version = entry["body"].lstrip("v")
+    return arr_instances, qbit_url, qbit_version
+
+
+async def replay(args, entries):
+    import main
+    from config import definitions
+    from src.utils import rest
+    from src.utils.trackers import Defective_Tracker, Download_Sizes_Tracker
+
+    logging.getLogger().setLevel(args.log_level)
+    player = Trace_Player(entries)
+    rest.transport = player.send
+
+    arr_instances, qbit_url, qbit_version = instances_from_trace(entries)
+    changes = {
+        "RECORD_TRAFFIC": "",
+        "TEST_RUN": False,
+        "LOG_LEVEL": args.log_level,
+        "INSTANCES": list(arr_instances),
+    }
+    for instance, instance_settings in arr_instances.items():
+        changes[instance + "_URL"] = instance_settings["URL"]
+        changes[instance + "_KEY"] = "replay"
+        changes[instance + "_NAME"] = instance.title()
+        changes[instance + "_TYPE"] = instance_settings["TYPE"]
+    changes["QBITTORRENT_URL"] = qbit_url
+    changes["QBIT_VERSION"] = qbit_version
+    for setting in JOB_SETTINGS:
+        changes[setting] = setting in args.jobs
+    if "RUN_PERIODIC_RESCANS" not in args.jobs:
+        changes["RUN_PERIODIC_RESCANS"] = {}
+    settingsDict = definitions.settingsDict = main.loadSettings().replace(**changes)
+
+    defective_tracker = Defective_Tracker(
+        {instance["URL"]: {} for instance in arr_instances.values()}
+    )
+    download_sizes_tracker = Download_Sizes_Tracker({})
+    timings = []
+    for _ in range(args.cycles):
+        start = time.perf_counter()
+        await main.run_cycle(settingsDict, defective_tracker, download_sizes_tracker)
+        timings.append(time.perf_counter() - start)
+    return player, arr_instances, timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay a RECORD_TRAFFIC trace offline"
+    )
+    parser.add_argument("trace", help="trace file written with RECORD_TRAFFIC")
+    parser.add_argument("--cycles", type=int, default=1)
+    parser.add_argument(
+        "--jobs",
+        nargs="+",
+        default=JOB_SETTINGS + ["RUN_PERIODIC_RESCANS"],
+        help="settings to turn on, e.g. REMOVE_STALLED",
+    )
+    parser.add_argument(
+        "--profile", help="write cProfile stats of the replayed cycles to this file"
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    entries = load_trace(args.trace)
+    recorded_time = sum(entry["elapsed"] or 0 for entry in entries)
+    print(
+        f"Loaded {len(entries)} recorded calls ({recorded_time:.2f}s spent waiting on the servers when recorded)"
+    )
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    player, arr_instances, timings = asyncio.run(replay(args, entries))
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+
+    print(f"Instances: {', '.join(arr_instances) or 'none'}")
+    for cycle, timing in enumerate(timings, 1):
+        print(f"Cycle {cycle}: {timing:.3f}s")
+    print(f"Calls served: {player.calls}")
+    for request, count in sorted(player.misses.items()):
+        print(f"Not in trace: {request} ({count}x)")
+    if profiler:
+        print(f"Profile written to {args.profile}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,130 +1,235 @@
 #### Turning off black formatting
 # fmt: off
-from config.parser import get_config_value
+from config.parser import Config_Reader, ConfigError, config_file_full_path
+from config.settings import Settings
 from config.env_vars import *
-# Define data types and default values for settingsDict variables
-# General   
-LOG_LEVEL                       = get_config_value('LOG_LEVEL',                     'general',      False,  str,    'INFO')
-TEST_RUN                        = get_config_value('TEST_RUN',                      'general',      False,  bool,   False)
-SSL_VERIFICATION                = get_config_value('SSL_VERIFICATION',              'general',      False,  bool,   True)
-
-# Features  
-REMOVE_TIMER                    = get_config_value('REMOVE_TIMER',                  'features',     False,  float,  10)
-REMOVE_FAILED                   = get_config_value('REMOVE_FAILED',                 'features',     False,  bool,   False)
-REMOVE_FAILED_IMPORTS           = get_config_value('REMOVE_FAILED_IMPORTS' ,        'features',     False,  bool,   False)
-REMOVE_METADATA_MISSING         = get_config_value('REMOVE_METADATA_MISSING',       'features',     False,  bool,   False)
-REMOVE_MISSING_FILES            = get_config_value('REMOVE_MISSING_FILES',          'features',     False,  bool,   False)
-REMOVE_NO_FORMAT_UPGRADE        = get_config_value('REMOVE_NO_FORMAT_UPGRADE',      'features',     False,  bool,   False) # OUTDATED - WILL RETURN WARNING
-REMOVE_ORPHANS                  = get_config_value('REMOVE_ORPHANS',                'features',     False,  bool,   False)
-REMOVE_SLOW                     = get_config_value('REMOVE_SLOW',                   'features',     False,  bool,   False)
-REMOVE_STALLED                  = get_config_value('REMOVE_STALLED',                'features',     False,  bool,   False)
-REMOVE_UNMONITORED              = get_config_value('REMOVE_UNMONITORED',            'features',     False,  bool,   False)
-RUN_PERIODIC_RESCANS            = get_config_value('RUN_PERIODIC_RESCANS',          'features',     False,  dict,   {})
-
-# Feature Settings
-MIN_DOWNLOAD_SPEED              = get_config_value('MIN_DOWNLOAD_SPEED',            'feature_settings',     False,  int,    0)
-PERMITTED_ATTEMPTS              = get_config_value('PERMITTED_ATTEMPTS',            'feature_settings',     False,  int,    3)
-NO_STALLED_REMOVAL_QBIT_TAG     = get_config_value('NO_STALLED_REMOVAL_QBIT_TAG',   'feature_settings',     False,  str,   'Don\'t Kill')
-IGNORE_PRIVATE_TRACKERS         = get_config_value('IGNORE_PRIVATE_TRACKERS',       'feature_settings',     False,  bool,   True)
-FAILED_IMPORT_MESSAGE_PATTERNS  = get_config_value('FAILED_IMPORT_MESSAGE_PATTERNS','feature_settings',     False,  list,   [])
-IGNORED_DOWNLOAD_CLIENTS        = get_config_value('IGNORED_DOWNLOAD_CLIENTS',      'feature_settings',     False,  list,   [])
-
-# Radarr
-RADARR_URL                      = get_config_value('RADARR_URL',                    'radarr',       False,  str)
-RADARR_KEY                      = None if RADARR_URL == None else \
-                                  get_config_value('RADARR_KEY',                    'radarr',       True,   str)
-
-# Sonarr        
-SONARR_URL                      = get_config_value('SONARR_URL',                    'sonarr',       False,  str)
-SONARR_KEY                      = None if SONARR_URL == None else \
-                                  get_config_value('SONARR_KEY',                    'sonarr',       True,   str)
-
-# Lidarr        
-LIDARR_URL                      = get_config_value('LIDARR_URL',                    'lidarr',       False,  str)
-LIDARR_KEY                      = None if LIDARR_URL == None else \
-                                  get_config_value('LIDARR_KEY',                    'lidarr',       True,   str)
-
-# Readarr       
-READARR_URL                     = get_config_value('READARR_URL',                   'readarr',       False,  str)
-READARR_KEY                     = None if READARR_URL == None else \
-                                  get_config_value('READARR_KEY',                   'readarr',       True,   str)
-
-# Whisparr    
-WHISPARR_URL                    = get_config_value('WHISPARR_URL',                  'whisparr',       False,  str)
-WHISPARR_KEY                    = None if WHISPARR_URL == None else \
-                                  get_config_value('WHISPARR_KEY',                  'whisparr',       True,   str)
-
-# qBittorrent   
-QBITTORRENT_URL                 = get_config_value('QBITTORRENT_URL',               'qbittorrent',  False,  str,    '')
-QBITTORRENT_USERNAME            = get_config_value('QBITTORRENT_USERNAME',          'qbittorrent',  False,  str,    '')
-QBITTORRENT_PASSWORD            = get_config_value('QBITTORRENT_PASSWORD',          'qbittorrent',  False,  str,    '')
-
-########################################################################################################################
-########### Validate settings
-if not (IS_IN_PYTEST or RADARR_URL or SONARR_URL or LIDARR_URL or READARR_URL or WHISPARR_URL):
-    print(f'[ ERROR ]: No Radarr/Sonarr/Lidarr/Readarr/Whisparr URLs specified (nothing to monitor)')
-    exit()
-
-
-#### Validate rescan settings
-PERIODIC_RESCANS = get_config_value("PERIODIC_RESCANS", "features", False, dict, {})
-
-rescan_supported_apps = ["SONARR", "RADARR"]
-rescan_default_values = {
-    "MISSING": (True, bool),
-    "CUTOFF_UNMET": (True, bool),
-    "MAX_CONCURRENT_SCANS": (3, int),
-    "MIN_DAYS_BEFORE_RESCAN": (7, int),
-}
-
-
-# Remove rescan apps that are not supported
-for key in list(RUN_PERIODIC_RESCANS.keys()):
-    if key not in rescan_supported_apps:
-        print(f"[ WARNING ]: Removed '{key}' from RUN_PERIODIC_RESCANS since only {rescan_supported_apps} are supported.")
-        RUN_PERIODIC_RESCANS.pop(key)
-
-# Ensure SONARR and RADARR have the required parameters with default values if they are present
-for app in rescan_supported_apps:
-    if app in RUN_PERIODIC_RESCANS:
-        for param, (default, expected_type) in rescan_default_values.items():
-            if param not in RUN_PERIODIC_RESCANS[app]:
-                print(f"[ INFO ]: Adding missing parameter '{param}' to '{app}' with default value '{default}'.")
-                RUN_PERIODIC_RESCANS[app][param] = default
-            else:
-                # Check the type and correct if necessary
-                current_value = RUN_PERIODIC_RESCANS[app][param]
-                if not isinstance(current_value, expected_type):
-                    print(
-                        f"[ INFO ]: Parameter '{param}' for '{app}' must be of type {expected_type.__name__} and found value '{current_value}' (type '{type(current_value).__name__}'). Defaulting to '{default}'."
-                    )
-                    RUN_PERIODIC_RESCANS[app][param] = default
 
-########### Enrich setting variables
-if RADARR_URL:      RADARR_URL =        RADARR_URL.rstrip('/')      + '/api/v3'
-if SONARR_URL:      SONARR_URL =        SONARR_URL.rstrip('/')      + '/api/v3'
-if LIDARR_URL:      LIDARR_URL =        LIDARR_URL.rstrip('/')      + '/api/v1'
-if READARR_URL:     READARR_URL =       READARR_URL.rstrip('/')     + '/api/v1'
-if WHISPARR_URL:    WHISPARR_URL =      WHISPARR_URL.rstrip('/')    + '/api/v3'
-if QBITTORRENT_URL: QBITTORRENT_URL =   QBITTORRENT_URL.rstrip('/') + '/api/v2'
-
-
-RADARR_MIN_VERSION = "5.3.6.8608"
-if "RADARR" in PERIODIC_RESCANS:
-    RADARR_MIN_VERSION = "5.10.3.9171"
-
-SONARR_MIN_VERSION = "4.0.1.1131"
-if "SONARR" in PERIODIC_RESCANS:
-    SONARR_MIN_VERSION = "4.0.9.2332"
-LIDARR_MIN_VERSION          = None
-READARR_MIN_VERSION         = None
-WHISPARR_MIN_VERSION        = '2.0.0.548'
-QBITTORRENT_MIN_VERSION     = '4.3.0'
-
-SUPPORTED_ARR_APPS  = ['RADARR', 'SONARR', 'LIDARR', 'READARR', 'WHISPARR']
-
-########### Add Variables to Dictionary
-settingsDict = {}
-for var_name in dir():
-    if var_name.isupper():
-        settingsDict[var_name] = locals()[var_name]
+
+def load_settings(config_file=config_file_full_path):
+    # Parses the config file (or the docker environment) once, and returns the settings with the data types and default values defined below
+    # Raises ConfigError if a setting is missing or invalid
+    reader = Config_Reader(config_file)
+    get_config_value = reader.get_config_value
+    CONFIG_FILE = config_file
+    CONFIG_MTIME = reader.mtime
+    # General   
+    LOG_LEVEL                       = get_config_value('LOG_LEVEL',                     'general',      False,  str,    'INFO')
+    LOG_FORMAT                      = get_config_value('LOG_FORMAT',                    'general',      False,  str,    'text')
+    TEST_RUN                        = get_config_value('TEST_RUN',                      'general',      False,  bool,   False)
+    SSL_VERIFICATION                = get_config_value('SSL_VERIFICATION',              'general',      False,  bool,   True)
+    RECORD_TRAFFIC                  = get_config_value('RECORD_TRAFFIC',                'general',      False,  str,    '')
+    CONNECT_TIMEOUT                 = get_config_value('CONNECT_TIMEOUT',               'general',      False,  float,  5)
+    READ_TIMEOUT                    = get_config_value('READ_TIMEOUT',                  'general',      False,  float,  60)
+    MAX_RETRIES                     = get_config_value('MAX_RETRIES',                   'general',      False,  int,    3)
+    CIRCUIT_BREAKER_THRESHOLD       = get_config_value('CIRCUIT_BREAKER_THRESHOLD',     'general',      False,  int,    5)
+    CIRCUIT_BREAKER_COOLDOWN        = get_config_value('CIRCUIT_BREAKER_COOLDOWN',      'general',      False,  float,  300)
+    MAX_CONCURRENT_REQUESTS         = get_config_value('MAX_CONCURRENT_REQUESTS',       'general',      False,  int,    5)
+    REQUESTS_PER_SECOND             = get_config_value('REQUESTS_PER_SECOND',           'general',      False,  float,  0)
+    REQUEST_LIMITS                  = get_config_value('REQUEST_LIMITS',                'general',      False,  dict,   {})
+    RESULT_TTL                      = get_config_value('RESULT_TTL',                    'general',      False,  dict,   {})
+    HTTP_CACHE_SIZE                 = get_config_value('HTTP_CACHE_SIZE',               'general',      False,  float,  20)
+    JSON_DECODER                    = get_config_value('JSON_DECODER',                  'general',      False,  str,    'auto')
+    STREAM_RECORDS                  = get_config_value('STREAM_RECORDS',                'general',      False,  bool,   False)
+    REFRESH_TIMEOUT                 = get_config_value('REFRESH_TIMEOUT',               'general',      False,  float,  10)
+    STARTUP_TIMEOUT                 = get_config_value('STARTUP_TIMEOUT',               'general',      False,  float,  30)
+    STARTUP_EXIT_DELAY              = get_config_value('STARTUP_EXIT_DELAY',            'general',      False,  float,  60)
+    WORKER_LEASE_FILE               = get_config_value('WORKER_LEASE_FILE',             'general',      False,  str,    '')
+    WORKER_ID                       = get_config_value('WORKER_ID',                     'general',      False,  str,    '')
+    WORKER_LEASE_DURATION           = get_config_value('WORKER_LEASE_DURATION',         'general',      False,  float,  0)
+    RUN_ONCE                        = get_config_value('RUN_ONCE',                      'general',      False,  bool,   False)
+    TRACKER_STATE_FILE              = get_config_value('TRACKER_STATE_FILE',            'general',      False,  str,    '')
+
+    # Features  
+    REMOVE_TIMER                    = get_config_value('REMOVE_TIMER',                  'features',     False,  float,  10)
+    REMOVE_FAILED                   = get_config_value('REMOVE_FAILED',                 'features',     False,  bool,   False)
+    REMOVE_FAILED_IMPORTS           = get_config_value('REMOVE_FAILED_IMPORTS' ,        'features',     False,  bool,   False)
+    REMOVE_METADATA_MISSING         = get_config_value('REMOVE_METADATA_MISSING',       'features',     False,  bool,   False)
+    REMOVE_MISSING_FILES            = get_config_value('REMOVE_MISSING_FILES',          'features',     False,  bool,   False)
+    REMOVE_NO_FORMAT_UPGRADE        = get_config_value('REMOVE_NO_FORMAT_UPGRADE',      'features',     False,  bool,   False) # OUTDATED - WILL RETURN WARNING
+    REMOVE_ORPHANS                  = get_config_value('REMOVE_ORPHANS',                'features',     False,  bool,   False)
+    REMOVE_SLOW                     = get_config_value('REMOVE_SLOW',                   'features',     False,  bool,   False)
+    REMOVE_STALLED                  = get_config_value('REMOVE_STALLED',                'features',     False,  bool,   False)
+    REMOVE_UNMONITORED              = get_config_value('REMOVE_UNMONITORED',            'features',     False,  bool,   False)
+    RUN_PERIODIC_RESCANS            = get_config_value('RUN_PERIODIC_RESCANS',          'features',     False,  dict,   {})
+
+    # Feature Settings
+    MIN_DOWNLOAD_SPEED              = get_config_value('MIN_DOWNLOAD_SPEED',            'feature_settings',     False,  int,    0)
+    PERMITTED_ATTEMPTS              = get_config_value('PERMITTED_ATTEMPTS',            'feature_settings',     False,  int,    3)
+    NO_STALLED_REMOVAL_QBIT_TAG     = get_config_value('NO_STALLED_REMOVAL_QBIT_TAG',   'feature_settings',     False,  str,   'Don\'t Kill')
+    IGNORE_PRIVATE_TRACKERS         = get_config_value('IGNORE_PRIVATE_TRACKERS',       'feature_settings',     False,  bool,   True)
+    FAILED_IMPORT_MESSAGE_PATTERNS  = get_config_value('FAILED_IMPORT_MESSAGE_PATTERNS','feature_settings',     False,  list,   [])
+    IGNORED_DOWNLOAD_CLIENTS        = get_config_value('IGNORED_DOWNLOAD_CLIENTS',      'feature_settings',     False,  list,   [])
+    DETECTION_RULES                 = get_config_value('DETECTION_RULES',               'feature_settings',     False,  list,   [])
+    QBIT_STATE_DETECTION            = get_config_value('QBIT_STATE_DETECTION',          'feature_settings',     False,  bool,   False)
+
+    # Radarr
+    RADARR_URL                      = get_config_value('RADARR_URL',                    'radarr',       False,  str)
+    RADARR_KEY                      = None if RADARR_URL == None else \
+                                      get_config_value('RADARR_KEY',                    'radarr',       True,   str)
+    RADARR_INSTANCES                = get_config_value('RADARR_INSTANCES',              'radarr',       False,  dict,   {})
+
+    # Sonarr        
+    SONARR_URL                      = get_config_value('SONARR_URL',                    'sonarr',       False,  str)
+    SONARR_KEY                      = None if SONARR_URL == None else \
+                                      get_config_value('SONARR_KEY',                    'sonarr',       True,   str)
+    SONARR_INSTANCES                = get_config_value('SONARR_INSTANCES',              'sonarr',       False,  dict,   {})
+
+    # Lidarr        
+    LIDARR_URL                      = get_config_value('LIDARR_URL',                    'lidarr',       False,  str)
+    LIDARR_KEY                      = None if LIDARR_URL == None else \
+                                      get_config_value('LIDARR_KEY',                    'lidarr',       True,   str)
+    LIDARR_INSTANCES                = get_config_value('LIDARR_INSTANCES',              'lidarr',       False,  dict,   {})
+
+    # Readarr       
+    READARR_URL                     = get_config_value('READARR_URL',                   'readarr',       False,  str)
+    READARR_KEY                     = None if READARR_URL == None else \
+                                      get_config_value('READARR_KEY',                   'readarr',       True,   str)
+    READARR_INSTANCES               = get_config_value('READARR_INSTANCES',             'readarr',       False,  dict,   {})
+
+    # Whisparr    
+    WHISPARR_URL                    = get_config_value('WHISPARR_URL',                  'whisparr',       False,  str)
+    WHISPARR_KEY                    = None if WHISPARR_URL == None else \
+                                      get_config_value('WHISPARR_KEY',                  'whisparr',       True,   str)
+    WHISPARR_INSTANCES              = get_config_value('WHISPARR_INSTANCES',            'whisparr',       False,  dict,   {})
+
+    # qBittorrent   
+    QBITTORRENT_URL                 = get_config_value('QBITTORRENT_URL',               'qbittorrent',  False,  str,    '')
+    QBITTORRENT_USERNAME            = get_config_value('QBITTORRENT_USERNAME',          'qbittorrent',  False,  str,    '')
+    QBITTORRENT_PASSWORD            = get_config_value('QBITTORRENT_PASSWORD',          'qbittorrent',  False,  str,    '')
+
+    # Transmission
+    TRANSMISSION_URL                = get_config_value('TRANSMISSION_URL',              'transmission', False,  str,    '')
+    TRANSMISSION_USERNAME           = get_config_value('TRANSMISSION_USERNAME',         'transmission', False,  str,    '')
+    TRANSMISSION_PASSWORD           = get_config_value('TRANSMISSION_PASSWORD',         'transmission', False,  str,    '')
+
+    # Deluge
+    DELUGE_URL                      = get_config_value('DELUGE_URL',                    'deluge',       False,  str,    '')
+    DELUGE_PASSWORD                 = get_config_value('DELUGE_PASSWORD',               'deluge',       False,  str,    '')
+
+    # SABnzbd
+    SABNZBD_URL                     = get_config_value('SABNZBD_URL',                   'sabnzbd',      False,  str,    '')
+    SABNZBD_KEY                     = get_config_value('SABNZBD_KEY',                   'sabnzbd',      False,  str,    '')
+
+    # NZBGet
+    NZBGET_URL                      = get_config_value('NZBGET_URL',                    'nzbget',       False,  str,    '')
+    NZBGET_USERNAME                 = get_config_value('NZBGET_USERNAME',               'nzbget',       False,  str,    '')
+    NZBGET_PASSWORD                 = get_config_value('NZBGET_PASSWORD',               'nzbget',       False,  str,    '')
+
+    ########################################################################################################################
+    ########### Validate settings
+    #### Validate additional instances
+    # Each gets its own id (e.g. SONARR_4K for the "4K" entry of SONARR_INSTANCES), which is used like the arr type for the main instance (SONARR_4K_URL, SONARR_4K_KEY)
+    arr_api_paths = {'RADARR': '/api/v3', 'SONARR': '/api/v3', 'LIDARR': '/api/v1', 'READARR': '/api/v1', 'WHISPARR': '/api/v3'}
+    additional_instances = {}
+    for arr_type, instances in [('RADARR', RADARR_INSTANCES), ('SONARR', SONARR_INSTANCES), ('LIDARR', LIDARR_INSTANCES), ('READARR', READARR_INSTANCES), ('WHISPARR', WHISPARR_INSTANCES)]:
+        for name, instance_settings in instances.items():
+            instance = arr_type + '_' + str(name).upper()
+            if not str(name).isalnum() or not isinstance(instance_settings, dict) or not instance_settings.get('URL') or not instance_settings.get('KEY'):
+                print(f"[ WARNING ]: Removed '{name}' from {arr_type}_INSTANCES since it needs an alphanumeric name, a URL and a KEY (e.g. {{\"4K\": {{\"URL\": \"http://sonarr-4k:8989\", \"KEY\": \"...\"}}}}).")
+                continue
+            additional_instances[instance] = {'URL': str(instance_settings['URL']).rstrip('/') + arr_api_paths[arr_type], 'KEY': str(instance_settings['KEY']), 'TYPE': arr_type}
+
+    if not (IS_IN_PYTEST or RADARR_URL or SONARR_URL or LIDARR_URL or READARR_URL or WHISPARR_URL or additional_instances):
+        raise ConfigError('No Radarr/Sonarr/Lidarr/Readarr/Whisparr URLs specified (nothing to monitor)')
+
+
+    #### Validate rescan settings
+    PERIODIC_RESCANS = get_config_value("PERIODIC_RESCANS", "features", False, dict, {})
+
+    rescan_supported_apps = ["SONARR", "RADARR"]
+    rescan_default_values = {
+        "MISSING": (True, bool),
+        "CUTOFF_UNMET": (True, bool),
+        "MAX_CONCURRENT_SCANS": (3, int),
+        "MIN_DAYS_BEFORE_RESCAN": (7, int),
+    }
+
+
+    # Remove rescan apps that are not supported
+    for key in list(RUN_PERIODIC_RESCANS.keys()):
+        if key not in rescan_supported_apps:
+            print(f"[ WARNING ]: Removed '{key}' from RUN_PERIODIC_RESCANS since only {rescan_supported_apps} are supported.")
+            RUN_PERIODIC_RESCANS.pop(key)
+
+    # Ensure SONARR and RADARR have the required parameters with default values if they are present
+    for app in rescan_supported_apps:
+        if app in RUN_PERIODIC_RESCANS:
+            for param, (default, expected_type) in rescan_default_values.items():
+                if param not in RUN_PERIODIC_RESCANS[app]:
+                    print(f"[ INFO ]: Adding missing parameter '{param}' to '{app}' with default value '{default}'.")
+                    RUN_PERIODIC_RESCANS[app][param] = default
+                else:
+                    # Check the type and correct if necessary
+                    current_value = RUN_PERIODIC_RESCANS[app][param]
+                    if not isinstance(current_value, expected_type):
+                        print(
+                            f"[ INFO ]: Parameter '{param}' for '{app}' must be of type {expected_type.__name__} and found value '{current_value}' (type '{type(current_value).__name__}'). Defaulting to '{default}'."
+                        )
+                        RUN_PERIODIC_RESCANS[app][param] = default
+
+    #### Validate request limits
+    request_limit_apps = ['RADARR', 'SONARR', 'LIDARR', 'READARR', 'WHISPARR', 'QBITTORRENT', 'TRANSMISSION', 'DELUGE', 'SABNZBD', 'NZBGET', *additional_instances]
+    for key in list(REQUEST_LIMITS.keys()):
+        if key not in request_limit_apps:
+            print(f"[ WARNING ]: Removed '{key}' from REQUEST_LIMITS since only {request_limit_apps} are supported.")
+            REQUEST_LIMITS.pop(key)
+
+    #### Validate result TTLs
+    for key in list(RESULT_TTL.keys()):
+        if not isinstance(RESULT_TTL[key], (int, float)) or RESULT_TTL[key] < 0:
+            print(f"[ WARNING ]: Removed '{key}' from RESULT_TTL since its value must be a number of seconds (found '{RESULT_TTL[key]}').")
+            RESULT_TTL.pop(key)
+
+    #### Validate JSON decoder
+    json_decoders = ['auto', 'orjson', 'msgspec', 'json']
+    if JSON_DECODER not in json_decoders:
+        print(f"[ WARNING ]: JSON_DECODER '{JSON_DECODER}' is not supported, using 'auto' instead (supported: {json_decoders}).")
+        JSON_DECODER = 'auto'
+
+    #### Validate log format
+    log_formats = ['text', 'json']
+    if LOG_FORMAT not in log_formats:
+        print(f"[ WARNING ]: LOG_FORMAT '{LOG_FORMAT}' is not supported, using 'text' instead (supported: {log_formats}).")
+        LOG_FORMAT = 'text'
+
+    ########### Enrich setting variables
+    if RADARR_URL:      RADARR_URL =        RADARR_URL.rstrip('/')      + '/api/v3'
+    if SONARR_URL:      SONARR_URL =        SONARR_URL.rstrip('/')      + '/api/v3'
+    if LIDARR_URL:      LIDARR_URL =        LIDARR_URL.rstrip('/')      + '/api/v1'
+    if READARR_URL:     READARR_URL =       READARR_URL.rstrip('/')     + '/api/v1'
+    if WHISPARR_URL:    WHISPARR_URL =      WHISPARR_URL.rstrip('/')    + '/api/v3'
+    if QBITTORRENT_URL: QBITTORRENT_URL =   QBITTORRENT_URL.rstrip('/') + '/api/v2'
+
+
+    RADARR_MIN_VERSION = "5.3.6.8608"
+    if "RADARR" in PERIODIC_RESCANS:
+        RADARR_MIN_VERSION = "5.10.3.9171"
+
+    SONARR_MIN_VERSION = "4.0.1.1131"
+    if "SONARR" in PERIODIC_RESCANS:
+        SONARR_MIN_VERSION = "4.0.9.2332"
+    LIDARR_MIN_VERSION          = None
+    READARR_MIN_VERSION         = None
+    WHISPARR_MIN_VERSION        = '2.0.0.548'
+    QBITTORRENT_MIN_VERSION     = '4.3.0'
+
+    SUPPORTED_ARR_APPS  = ['RADARR', 'SONARR', 'LIDARR', 'READARR', 'WHISPARR']
+
+    ########### Add Variables to Dictionary
+    settings = {name: value for name, value in locals().items() if name.isupper()}
+    settings.update(IS_IN_DOCKER=IS_IN_DOCKER, IMAGE_TAG=IMAGE_TAG, SHORT_COMMIT_ID=SHORT_COMMIT_ID, IS_IN_PYTEST=IS_IN_PYTEST)
+    # Adds the instances that are actually configured (per arr type, the main instance first), and the arr type of each
+    for instance, instance_settings in additional_instances.items():
+        for key, value in instance_settings.items():
+            settings[instance + '_' + key] = value
+    settings['INSTANCES'] = []
+    for arrApplication in SUPPORTED_ARR_APPS:
+        settings[arrApplication + '_TYPE'] = arrApplication
+        if settings[arrApplication + '_URL']:
+            settings['INSTANCES'].append(arrApplication)
+        settings['INSTANCES'] += [instance for instance in additional_instances if settings[instance + '_TYPE'] == arrApplication]
+    return Settings(settings)
+
+
+# The current settings. Loaded when decluttarr starts (see loadSettings in src/utils/loadScripts.py), and replaced as a whole when the config file changes (see reloadSettings)
+settingsDict = None
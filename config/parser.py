@@ -11,72 +11,104 @@ config_file_full_path = os.path.join(
     os.path.abspath(os.path.dirname(__file__)), config_file_name
 )
 sys.tracebacklimit = 0  # dont show stack traces in prod mode
-config = configparser.ConfigParser()
-config.optionxform = str  # maintain capitalization of config keys
-config.read(config_file_full_path)
 
+# Accepted spellings for booleans (case-insensitive)
+TRUE_VALUES = ("true", "yes", "on", "1")
+FALSE_VALUES = ("false", "no", "off", "0")
 
-def config_section_map(section):
-    "Load the config file into a dictionary"
-    dict1 = {}
-    options = config.options(section)
-    for option in options:
-        try:
-            value = config.get(section, option)
-            # Attempt to parse JSON for dictionary-like values
+
+class ConfigError(Exception):
+    # Raised when a setting is missing or cannot be converted to its data type
+    pass
+
+
+def config_file_mtime(path=config_file_full_path):
+    "Return when the config file was last changed (None if there is none)"
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def read_config_file(path=config_file_full_path):
+    "Load the config file into a dictionary per section, decoding the JSON values once"
+    config = configparser.ConfigParser()
+    config.optionxform = str  # maintain capitalization of config keys
+    config.read(path)
+    sections = {}
+    for section in config.sections():
+        sections[section] = {}
+        for option in config.options(section):
             try:
-                dict1[option] = json.loads(value)
-            except json.JSONDecodeError:
-                dict1[option] = value
-        except Exception as e:
-            print(f"Exception on {option}: {e}")
-            dict1[option] = None
-    return dict1
+                value = config.get(section, option)
+                # Attempt to parse JSON for dictionary-like values
+                try:
+                    sections[section][option] = json.loads(value)
+                except json.JSONDecodeError:
+                    sections[section][option] = value
+            except Exception as e:
+                print(f"Exception on {option}: {e}")
+                sections[section][option] = None
+    return sections
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"Expected one of {TRUE_VALUES + FALSE_VALUES}")
 
 
 def cast(value, type_):
     return type_(value)
 
 
-def get_config_value(key, config_section, is_mandatory, datatype, default_value=None):
-    "Return for each key the corresponding value from the Docker Environment or the Config File"
-    if IS_IN_DOCKER:
-        config_value = os.environ.get(key)
-        if config_value is not None:
-            config_value = config_value
-        elif is_mandatory:
-            print(f"[ ERROR ]: Variable not specified in Docker environment: {key}")
-            sys.exit(0)
+class Config_Reader:
+    # Reads the settings from the Docker Environment or the Config File (which is parsed only once)
+    def __init__(self, path=config_file_full_path):
+        self.path = path
+        # Taken before reading, so that a change made while reading is picked up by the next reload
+        self.mtime = None if IS_IN_DOCKER else config_file_mtime(path)
+        self.sections = {} if IS_IN_DOCKER else read_config_file(path)
+
+    def get_config_value(
+        self, key, config_section, is_mandatory, datatype, default_value=None
+    ):
+        "Return for each key the corresponding value from the Docker Environment or the Config File"
+        if IS_IN_DOCKER:
+            config_value = os.environ.get(key)
+            if config_value is None:
+                if is_mandatory:
+                    raise ConfigError(
+                        f"Variable not specified in Docker environment: {key}"
+                    )
+                config_value = default_value
         else:
-            config_value = default_value
-    else:
+            config_value = self.sections.get(config_section, {}).get(key)
+            if config_value is None:
+                if is_mandatory:
+                    raise ConfigError(
+                        f"Mandatory variable not specified in config file, section [{config_section}]: {key} (data type: {datatype.__name__})"
+                    )
+                config_value = default_value
+
+        # Apply data type
         try:
-            config_value = config_section_map(config_section).get(key)
-        except configparser.NoSectionError:
-            config_value = None
-        if config_value is not None:
-            config_value = config_value
-        elif is_mandatory:
-            print(
-                f"[ ERROR ]: Mandatory variable not specified in config file, section [{config_section}]: {key} (data type: {datatype.__name__})"
+            if datatype == bool:
+                config_value = parse_bool(config_value)
+            elif datatype == list or datatype == dict:
+                if not isinstance(config_value, datatype):
+                    config_value = json.loads(config_value)
+                if not isinstance(config_value, datatype):
+                    raise ValueError(f"Expected a {datatype.__name__}")
+            elif config_value is not None:
+                config_value = cast(config_value, datatype)
+        except Exception as e:
+            raise ConfigError(
+                f'The value retrieved for [{config_section}]: {key} is "{config_value}" and cannot be converted to data type {datatype}\n{e}'
             )
-            sys.exit(0)
-        else:
-            config_value = default_value
-
-    # Apply data type
-    try:
-        if datatype == bool:
-            config_value = eval(str(config_value).capitalize())
-        elif datatype == list or datatype == dict:
-            if not isinstance(config_value, datatype):
-                config_value = json.loads(config_value)
-        elif config_value is not None:
-            config_value = cast(config_value, datatype)
-    except Exception as e:
-        print(
-            f'[ ERROR ]: The value retrieved for [{config_section}]: {key} is "{config_value}" and cannot be converted to data type {datatype}'
-        )
-        print(e)
-        sys.exit(0)
-    return config_value
+        return config_value
@@ -0,0 +1,38 @@
+# Holds the settings once they are parsed (see config/definitions.py). They cannot be changed while decluttarr runs:
+# a changed config file results in a new Settings object, which replaces the old one as a whole
+
+
+class Frozen_Dict(dict):
+    # A dictionary that cannot be changed after it was created (still serialisable to JSON, and usable wherever a dict is)
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(
+            "Settings are read-only, use Settings.replace() to derive changed settings"
+        )
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+
+def freeze(value):
+    # Converts nested dictionaries and lists into their read-only counterparts
+    if isinstance(value, dict):
+        return Frozen_Dict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class Settings(Frozen_Dict):
+    # The settings (KEY: value, with each value converted to the data type it is defined with)
+    def __init__(self, values=()):
+        super().__init__({key: freeze(value) for key, value in dict(values).items()})
+
+    def replace(self, **changes):
+        # Returns new settings with the given values changed or added (used for the values found at runtime, e.g. the instance names)
+        return Settings({**self, **changes})
+
+    def __repr__(self):
+        return f"Settings({dict.__repr__(self)})"
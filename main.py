@@ -1,45 +1,56 @@
 # Import Libraries
 import asyncio
+import sqlite3
+import sys
+import time
 import logging, verboselogs
 
 logger = verboselogs.VerboseLogger(__name__)
 import json
 
 # Import Functions
-from config.definitions import settingsDict
+from config import definitions
+from config.parser import ConfigError
 from src.utils.loadScripts import *
 from src.decluttarr import queueCleaner
-from src.utils.rest import rest_get, rest_post
-from src.utils.trackers import Defective_Tracker, Download_Sizes_Tracker
-
-# Hide SSL Verification Warnings
-if settingsDict["SSL_VERIFICATION"] == False:
-    import warnings
-
-    warnings.filterwarnings("ignore", message="Unverified HTTPS request")
-
-# Set up logging
-setLoggingFormat(settingsDict)
+from src.utils.rest import rest_get, rest_post, Rest_Error
+from src.utils.rate_limiter import pop_wait_stats
+from src.utils.leases import get_lease_store
+from src.utils.verdict_cache import verdict_cache
+from src.utils.download_clients import get_download_failures, get_download_progress
+from src.utils import rest
+from src.utils.shared import pop_cleaning_failures
+from src.utils.trackers import (
+    Defective_Tracker,
+    Download_Sizes_Tracker,
+    load_tracker_state,
+    save_tracker_state,
+)
+
+# Used to report the time until the first clean-up starts
+STARTED = time.monotonic()
 
 
 # Main function
 async def main(settingsDict):
-    # Adds to settings Dict the instances that are actually configures
-    settingsDict["INSTANCES"] = []
-    for arrApplication in settingsDict["SUPPORTED_ARR_APPS"]:
-        if settingsDict[arrApplication + "_URL"]:
-            settingsDict["INSTANCES"].append(arrApplication)
-
+    # Returns the exit status in RUN_ONCE mode; otherwise runs until stopped
     # Pre-populates the dictionaries (in classes) that track the items that were already caught as having problems or removed
+    # Continues with the trackers of the previous process, if they were kept (see TRACKER_STATE_FILE)
+    tracker_state = load_tracker_state(settingsDict["TRACKER_STATE_FILE"])
     defectiveTrackingInstances = {}
     for instance in settingsDict["INSTANCES"]:
         defectiveTrackingInstances[instance] = {}
-    defective_tracker = Defective_Tracker(defectiveTrackingInstances)
-    download_sizes_tracker = Download_Sizes_Tracker({})
+    defective_tracker = Defective_Tracker(
+        {**defectiveTrackingInstances, **tracker_state["defective"]}
+    )
+    download_sizes_tracker = Download_Sizes_Tracker(tracker_state["download_sizes"])
 
-    # Get name of arr-instances
+    # Get status of arr-instances (all at once), and take their name from it
+    arr_statuses = await getArrStatuses(settingsDict)
     for instance in settingsDict["INSTANCES"]:
-        settingsDict = await getArrInstanceName(settingsDict, instance)
+        settingsDict = await getArrInstanceName(
+            settingsDict, instance, arr_statuses.get(instance)
+        )
 
     # Check outdated
     upgradeChecks(settingsDict)
@@ -51,47 +62,192 @@ async def main(settingsDict):
     showSettings(settingsDict)
 
     # Check Minimum Version and if instances are reachable and retrieve qbit cookie
-    settingsDict = await instanceChecks(settingsDict)
+    settingsDict = await instanceChecks(settingsDict, arr_statuses)
 
     # Create qBit protection tag if not existing
-    await createQbitProtectionTag(settingsDict)
+    # The run does not depend on it, thus in RUN_ONCE mode it is created while the run goes on
+    tag_creation = asyncio.ensure_future(create_protection_tag(settingsDict))
+    if not settingsDict["RUN_ONCE"]:
+        await tag_creation
 
     # Show Logger Level
     showLoggerLevel(settingsDict)
 
     # Start Cleaning
-    while True:
-        logger.verbose("-" * 50)
-        
-        # Refresh qBit Cookie
-        if settingsDict["QBITTORRENT_URL"]:
-            await qBitRefreshCookie(settingsDict)
-            if not settingsDict["QBIT_COOKIE"]:
-                logger.error("Cookie Refresh failed - exiting decluttarr")
-                exit()
-
-        # Cache protected (via Tag) and private torrents
+    logger.verbose(
+        "Startup took %.2f seconds, starting the first clean-up",
+        time.monotonic() - STARTED,
+    )
+    try:
+        while True:
+            # In worker mode, only the instances this worker holds the lease for are cleaned
+            cycleSettings = await claim_instances(settingsDict)
+            succeeded = cycleSettings is not None
+            if cycleSettings and cycleSettings["INSTANCES"]:
+                succeeded = await run_cycle(
+                    cycleSettings, defective_tracker, download_sizes_tracker
+                )
+            save_tracker_state(
+                settingsDict["TRACKER_STATE_FILE"],
+                defective_tracker,
+                download_sizes_tracker,
+            )
+
+            # In RUN_ONCE mode, whatever schedules the runs (e.g. cron) takes care of the next one
+            if settingsDict["RUN_ONCE"]:
+                succeeded = await tag_creation and succeeded
+                logger.verbose(
+                    "Run %s after %.2f seconds, exiting",
+                    "finished" if succeeded else "failed",
+                    time.monotonic() - STARTED,
+                )
+                return 0 if succeeded else 1
+
+            # Wait for the next run
+            await asyncio.sleep(settingsDict["REMOVE_TIMER"] * 60)
+
+            # Pick up changes to the config file (the trackers are kept)
+            settingsDict = await reloadSettings(settingsDict)
+    finally:
+        # Not left running if the run stopped early
+        tag_creation.cancel()
+        # Lets the other workers take over the instances right away
+        lease_store = get_lease_store(settingsDict)
+        if lease_store:
+            lease_store.release()
+    return
+
+
+async def create_protection_tag(settingsDict):
+    # Returns False if the qBit protection tag could not be created (which is logged, rather than stopping decluttarr)
+    try:
+        await createQbitProtectionTag(settingsDict)
+    except Rest_Error as error:
+        logger.warning("qBittorrent protection tag could not be created: %s", error)
+        return False
+    return True
+
+
+async def claim_instances(settingsDict):
+    # Returns the settings with INSTANCES limited to the instances this worker cleans in this run (see WORKER_LEASE_FILE)
+    # Returns None if the leases cannot be read, since without them another worker could be cleaning the same instances
+    lease_store = get_lease_store(settingsDict)
+    if lease_store is None:
+        return settingsDict
+    try:
+        instances = await asyncio.get_event_loop().run_in_executor(
+            None, lease_store.claim, settingsDict["INSTANCES"]
+        )
+    except sqlite3.Error as error:
+        logger.warning("Worker leases could not be read, skipping this run: %s", error)
+        return None
+    logger.verbose(
+        "Worker %s cleans: %s",
+        lease_store.worker_id,
+        ", ".join(instances) or "nothing (all instances are taken by other workers)",
+    )
+    return settingsDict.replace(INSTANCES=instances)
+
+
+async def run_cycle(settingsDict, defective_tracker, download_sizes_tracker):
+    # Runs one clean-up cycle across all instances. Returns False if the cycle was skipped, or if a job failed on one of the instances
+    logger.verbose("-" * 50)
+
+    # Fetch the torrents once for all instances, and cache protected (via Tag) and private torrents
+    # Without them, protected downloads could be removed - thus skip the run if qBit cannot be reached
+    try:
+        qbit_snapshot = await getQbitSnapshot(settingsDict)
         protectedDownloadIDs, privateDowloadIDs = await getProtectedAndPrivateFromQbit(
-            settingsDict
+            settingsDict, qbit_snapshot
         )
-
-        # Run script for each instance
-        for instance in settingsDict["INSTANCES"]:
-            await queueCleaner(
+    except Rest_Error as error:
+        logger.warning("qBittorrent could not be queried, skipping this run: %s", error)
+        return False
+    # The progress of the downloads in the other download clients (for REMOVE_SLOW), also fetched once for all instances
+    download_progress = (
+        await get_download_progress(settingsDict) if settingsDict["REMOVE_SLOW"] else {}
+    )
+    # The failures reported by the usenet clients (for REMOVE_MISSING_FILES and REMOVE_STALLED), likewise
+    download_failures = (
+        await get_download_failures(settingsDict)
+        if settingsDict["REMOVE_MISSING_FILES"] or settingsDict["REMOVE_STALLED"]
+        else {}
+    )
+
+    # Run script for all instances at the same time
+    await asyncio.gather(
+        *[
+            queueCleaner(
                 settingsDict,
                 instance,
                 defective_tracker,
                 download_sizes_tracker,
                 protectedDownloadIDs,
                 privateDowloadIDs,
+                qbit_snapshot,
+                download_progress,
+                download_failures,
             )
-        logger.verbose("")
-        logger.verbose("Queue clean-up complete!")
+            for instance in settingsDict["INSTANCES"]
+        ]
+    )
+    logger.verbose("")
+    logger.verbose("Queue clean-up complete!")
+
+    # Report how long requests had to wait for the per-host limits
+    for host, stats in pop_wait_stats().items():
+        log = logger.verbose if stats["waited"] >= 1 else logger.debug
+        log(
+            "Request limits on %s: %s requests waited %.2fs in total (longest wait: %.2fs)",
+            host,
+            stats["requests"],
+            stats["waited"],
+            stats["max_wait"],
+        )
 
-        # Wait for the next run
-        await asyncio.sleep(settingsDict["REMOVE_TIMER"] * 60)
-    return
+    # Report how often responses could be served from the response cache
+    if rest.response_cache:
+        for endpoint, stats in sorted(rest.response_cache.pop_stats().items()):
+            logger.debug(
+                "Response cache for %s: %s of %s requests not modified (%.0f%%), %s bytes saved",
+                endpoint,
+                stats["hits"],
+                stats["requests"],
+                stats["hit_rate"] * 100,
+                stats["bytes_saved"],
+            )
+
+    # Report how many detector verdicts could be kept from the previous run (see Verdict_Cache)
+    stats = verdict_cache.pop_stats()
+    if stats["items"]:
+        logger.verbose(
+            "Detection: %s of %s queue items unchanged since the previous run (%.0f%%)",
+            stats["hits"],
+            stats["items"],
+            stats["hit_rate"] * 100,
+        )
+    return pop_cleaning_failures() == 0
 
 
 if __name__ == "__main__":
-    asyncio.run(main(settingsDict))
+    # Read the settings (from the config file or the docker environment)
+    try:
+        settingsDict = loadSettings()
+    except ConfigError as error:
+        print(f"[ ERROR ]: {error}")
+        sys.exit(1)
+    # --once is the same as RUN_ONCE
+    if "--once" in sys.argv[1:]:
+        settingsDict = settingsDict.replace(RUN_ONCE=True)
+    definitions.settingsDict = settingsDict
+
+    # Hide SSL Verification Warnings
+    if settingsDict["SSL_VERIFICATION"] == False:
+        import warnings
+
+        warnings.filterwarnings("ignore", message="Unverified HTTPS request")
+
+    # Set up logging
+    setLoggingFormat(settingsDict)
+
+    sys.exit(asyncio.run(main(settingsDict)))
@@ -1,8 +1,11 @@
 # Cleans the download queue
+import asyncio
+import sqlite3
+import sys
 import logging, verboselogs
 
 logger = verboselogs.VerboseLogger(__name__)
-from src.utils.shared import errorDetails, get_queue
+from src.utils.shared import errorDetails, get_queue, refresh_monitored_downloads
 from src.jobs.remove_failed import remove_failed
 from src.jobs.remove_failed_imports import remove_failed_imports
 from src.jobs.remove_metadata_missing import remove_metadata_missing
@@ -13,52 +16,70 @@ from src.jobs.remove_stalled import remove_stalled
 from src.jobs.remove_unmonitored import remove_unmonitored
 from src.jobs.run_periodic_rescans import run_periodic_rescans
 from src.utils.trackers import Deleted_Downloads
+from src.utils.log_pipeline import log_instance
+from src.utils.leases import get_lease_store
 
+# Parameter that makes the queue include items that cannot be matched, per arr type
+FULL_QUEUE_PARAMS = {
+    "RADARR": "includeUnknownMovieItems",
+    "SONARR": "includeUnknownSeriesItems",
+    "LIDARR": "includeUnknownArtistItems",
+    "READARR": "includeUnknownAuthorItems",
+    "WHISPARR": "includeUnknownSeriesItems",
+}
 
+
+class Lease_Lost(Exception):
+    pass
+
+
+async def renew_lease(settingsDict, instance):
+    # In worker mode (see WORKER_LEASE_FILE), renews the lease on the instance before each job
+    # Raises Lease_Lost once another worker took the instance over, or if the leases cannot be read, since from then on
+    # the other worker may be cleaning the same queue
+    lease_store = get_lease_store(settingsDict)
+    if lease_store is None:
+        return
+    try:
+        renewed = await asyncio.get_event_loop().run_in_executor(
+            None, lease_store.renew, instance
+        )
+    except sqlite3.Error as error:
+        raise Lease_Lost(f"the worker leases could not be read: {error}")
+    if not renewed:
+        raise Lease_Lost("another worker took it over")
+
+
+@log_instance
 async def queueCleaner(
     settingsDict,
-    arr_type,
+    instance,
     defective_tracker,
     download_sizes_tracker,
     protectedDownloadIDs,
     privateDowloadIDs,
+    qbit_snapshot=None,
+    download_progress=None,
+    download_failures=None,
 ):
-    # Read out correct instance depending on radarr/sonarr flag
-    run_dict = {}
-    if arr_type == "RADARR":
-        BASE_URL = settingsDict["RADARR_URL"]
-        API_KEY = settingsDict["RADARR_KEY"]
-        NAME = settingsDict["RADARR_NAME"]
-        full_queue_param = "includeUnknownMovieItems"
-    elif arr_type == "SONARR":
-        BASE_URL = settingsDict["SONARR_URL"]
-        API_KEY = settingsDict["SONARR_KEY"]
-        NAME = settingsDict["SONARR_NAME"]
-        full_queue_param = "includeUnknownSeriesItems"
-    elif arr_type == "LIDARR":
-        BASE_URL = settingsDict["LIDARR_URL"]
-        API_KEY = settingsDict["LIDARR_KEY"]
-        NAME = settingsDict["LIDARR_NAME"]
-        full_queue_param = "includeUnknownArtistItems"
-    elif arr_type == "READARR":
-        BASE_URL = settingsDict["READARR_URL"]
-        API_KEY = settingsDict["READARR_KEY"]
-        NAME = settingsDict["READARR_NAME"]
-        full_queue_param = "includeUnknownAuthorItems"
-    elif arr_type == "WHISPARR":
-        BASE_URL = settingsDict["WHISPARR_URL"]
-        API_KEY = settingsDict["WHISPARR_KEY"]
-        NAME = settingsDict["WHISPARR_NAME"]
-        full_queue_param = "includeUnknownSeriesItems"
-    else:
+    # Read out the settings of the instance (e.g. SONARR, or SONARR_4K for an additional one)
+    BASE_URL = settingsDict[instance + "_URL"]
+    API_KEY = settingsDict[instance + "_KEY"]
+    NAME = settingsDict[instance + "_NAME"]
+    arr_type = settingsDict[instance + "_TYPE"]
+    if arr_type not in FULL_QUEUE_PARAMS:
         logger.error("Unknown arr_type specified, exiting: %s", str(arr_type))
         sys.exit()
+    full_queue_param = FULL_QUEUE_PARAMS[arr_type]
 
     # Cleans up the downloads queue
     logger.verbose("Cleaning queue on %s:", NAME)
-    # Refresh queue:
+    # Refresh queue (once, for all jobs):
     try:
-        full_queue = await get_queue(BASE_URL, API_KEY, settingsDict, params={full_queue_param: True})
+        await refresh_monitored_downloads(BASE_URL, API_KEY, settingsDict)
+        full_queue = await get_queue(
+            BASE_URL, API_KEY, settingsDict, params={full_queue_param: True}
+        )
         if full_queue:
             logger.debug("queueCleaner/full_queue at start:")
             logger.debug(full_queue)
@@ -67,6 +88,7 @@ async def queueCleaner(
             items_detected = 0
 
             if settingsDict["REMOVE_FAILED"]:
+                await renew_lease(settingsDict, instance)
                 items_detected += await remove_failed(
                     settingsDict,
                     BASE_URL,
@@ -79,6 +101,7 @@ async def queueCleaner(
                 )
 
             if settingsDict["REMOVE_FAILED_IMPORTS"]:
+                await renew_lease(settingsDict, instance)
                 items_detected += await remove_failed_imports(
                     settingsDict,
                     BASE_URL,
@@ -91,6 +114,7 @@ async def queueCleaner(
                 )
 
             if settingsDict["REMOVE_METADATA_MISSING"]:
+                await renew_lease(settingsDict, instance)
                 items_detected += await remove_metadata_missing(
                     settingsDict,
                     BASE_URL,
@@ -100,9 +124,11 @@ async def queueCleaner(
                     defective_tracker,
                     protectedDownloadIDs,
                     privateDowloadIDs,
+                    qbit_snapshot,
                 )
 
             if settingsDict["REMOVE_MISSING_FILES"]:
+                await renew_lease(settingsDict, instance)
                 items_detected += await remove_missing_files(
                     settingsDict,
                     BASE_URL,
@@ -112,9 +138,12 @@ async def queueCleaner(
                     defective_tracker,
                     protectedDownloadIDs,
                     privateDowloadIDs,
+                    qbit_snapshot,
+                    download_failures,
                 )
 
             if settingsDict["REMOVE_ORPHANS"]:
+                await renew_lease(settingsDict, instance)
                 items_detected += await remove_orphans(
                     settingsDict,
                     BASE_URL,
@@ -128,6 +157,7 @@ async def queueCleaner(
                 )
 
             if settingsDict["REMOVE_SLOW"]:
+                await renew_lease(settingsDict, instance)
                 items_detected += await remove_slow(
                     settingsDict,
                     BASE_URL,
@@ -138,9 +168,12 @@ async def queueCleaner(
                     protectedDownloadIDs,
                     privateDowloadIDs,
                     download_sizes_tracker,
+                    qbit_snapshot,
+                    download_progress,
                 )
 
             if settingsDict["REMOVE_STALLED"]:
+                await renew_lease(settingsDict, instance)
                 items_detected += await remove_stalled(
                     settingsDict,
                     BASE_URL,
@@ -150,9 +183,12 @@ async def queueCleaner(
                     defective_tracker,
                     protectedDownloadIDs,
                     privateDowloadIDs,
+                    qbit_snapshot,
+                    download_failures,
                 )
 
             if settingsDict["REMOVE_UNMONITORED"]:
+                await renew_lease(settingsDict, instance)
                 items_detected += await remove_unmonitored(
                     settingsDict,
                     BASE_URL,
@@ -170,6 +206,7 @@ async def queueCleaner(
             logger.verbose(">>> Queue is empty.")
 
         if settingsDict["RUN_PERIODIC_RESCANS"]:
+            await renew_lease(settingsDict, instance)
             await run_periodic_rescans(
                 settingsDict,
                 BASE_URL,
@@ -178,6 +215,8 @@ async def queueCleaner(
                 arr_type,
             )
 
+    except Lease_Lost as reason:
+        logger.warning("Stopped cleaning %s, since %s", NAME, reason)
     except Exception as error:
         errorDetails(NAME, error)
     return
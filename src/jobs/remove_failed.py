@@ -9,12 +9,14 @@ from src.utils.shared import (
     remove_download,
     qBitOffline,
 )
-import sys, os, traceback
 import logging, verboselogs
+from src.utils.log_pipeline import log_job
+from src.utils.detection_rules import select_affected
 
 logger = verboselogs.VerboseLogger(__name__)
 
 
+@log_job
 async def remove_failed(
     settingsDict,
     BASE_URL,
@@ -36,12 +38,8 @@ async def remove_failed(
 
         if await qBitOffline(settingsDict, failType, NAME):
             return 0
-        # Find items affected
-        affectedItems = []
-        for queueItem in queue:
-            if "errorMessage" in queueItem and "status" in queueItem:
-                if queueItem["status"] == "failed":
-                    affectedItems.append(queueItem)
+        # Find items affected (see DETECTION_RULES)
+        affectedItems = select_affected(settingsDict, BASE_URL, queue, failType)
         affectedItems = await execute_checks(
             settingsDict,
             affectedItems,
@@ -1,10 +1,13 @@
 from src.utils.shared import errorDetails, formattedQueueInfo, get_queue, execute_checks
-import sys, os, traceback
 import logging, verboselogs
+from src.utils.log_pipeline import log_job
+from src.utils.message_matcher import get_message_matcher
+from src.utils.verdict_cache import verdict_cache
 
 logger = verboselogs.VerboseLogger(__name__)
 
 
+@log_job
 async def remove_failed_imports(
     settingsDict,
     BASE_URL,
@@ -23,62 +26,23 @@ async def remove_failed_imports(
         if not queue:
             return 0
 
-        # Find items affected
-        affectedItems = []
-
-        # Check if any patterns have been specified
+        # Find items affected (the verdicts are kept per item for the next run, see Verdict_Cache)
+        # Check if any patterns have been specified (compiled into one matcher, see FAILED_IMPORT_MESSAGE_PATTERNS)
         patterns = settingsDict.get("FAILED_IMPORT_MESSAGE_PATTERNS", [])
-        if not patterns:  # If patterns is empty or not present
-            patterns = None
-        for queueItem in queue:
-            if (
-                "status" in queueItem
-                and "trackedDownloadStatus" in queueItem
-                and "trackedDownloadState" in queueItem
-                and "statusMessages" in queueItem
-            ):
-
-                removal_messages = []
-                if (
-                    queueItem["status"] == "completed"
-                    and queueItem["trackedDownloadStatus"] == "warning"
-                    and queueItem["trackedDownloadState"]
-                    in {"importPending", "importFailed", "importBlocked"}
-                ):
-
-                    # Find messages that find specified pattern and put them into a "removal_message" that will be displayed in the logger when removing the affected item
-                    if not patterns:
-                        # No patterns defined - including all status messages in the removal_messages
-                        removal_messages.append(">>>>> Status Messages (All):")
-                        for statusMessage in queueItem["statusMessages"]:
-                            removal_messages.extend(
-                                f">>>>> - {message}"
-                                for message in statusMessage.get("messages", [])
-                            )
-                    else:
-                        # Specific patterns defined - only removing if any of these are matched
-                        for statusMessage in queueItem["statusMessages"]:
-                            messages = statusMessage.get("messages", [])
-                            for message in messages:
-                                if any(pattern in message for pattern in patterns):
-                                    removal_messages.append(f">>>>> - {message}")
-                            if removal_messages:
-                                removal_messages.insert(
-                                    0,
-                                    ">>>>> Status Messages (matching specified patterns):",
-                                )
-
-                if removal_messages:
-                    removal_messages = list(
-                        dict.fromkeys(removal_messages)
-                    )  # deduplication
-                    removal_messages.insert(
-                        0,
-                        ">>>>> Tracked Download State: "
-                        + queueItem["trackedDownloadState"],
-                    )
-                    queueItem["removal_messages"] = removal_messages
-                    affectedItems.append(queueItem)
+        matcher = get_message_matcher(tuple(patterns)) if patterns else None
+        verdicts = verdict_cache.get_verdicts(
+            BASE_URL,
+            failType,
+            queue,
+            lambda queueItem: removalMessages(queueItem, matcher),
+            depends_on=matcher,
+        )
+        affectedItems = [
+            # Copied, since the queue may be shared with other jobs (see rest_get)
+            {**queueItem, "removal_messages": list(removal_messages)}
+            for queueItem, removal_messages in zip(queue, verdicts)
+            if removal_messages
+        ]
 
         check_kwargs = {
             "settingsDict": settingsDict,
@@ -103,3 +67,53 @@ async def remove_failed_imports(
     except Exception as error:
         errorDetails(NAME, error)
         return 0
+
+
+def removalMessages(queueItem, matcher):
+    # Returns the messages to log when removing the queue item, or an empty tuple if it is not a failed import
+    if not (
+        "status" in queueItem
+        and "trackedDownloadStatus" in queueItem
+        and "trackedDownloadState" in queueItem
+        and "statusMessages" in queueItem
+    ):
+        return ()
+    removal_messages = []
+    if (
+        queueItem["status"] == "completed"
+        and queueItem["trackedDownloadStatus"] == "warning"
+        and queueItem["trackedDownloadState"]
+        in {"importPending", "importFailed", "importBlocked"}
+    ):
+
+        # Find messages that find specified pattern and put them into a "removal_message" that will be displayed in the logger when removing the affected item
+        if not matcher:
+            # No patterns defined - including all status messages in the removal_messages
+            removal_messages.append(">>>>> Status Messages (All):")
+            for statusMessage in queueItem["statusMessages"]:
+                removal_messages.extend(
+                    f">>>>> - {message}"
+                    for message in statusMessage.get("messages", [])
+                )
+        else:
+            # Specific patterns defined - only removing if any of these are matched
+            for statusMessage in queueItem["statusMessages"]:
+                messages = statusMessage.get("messages", [])
+                for message in messages:
+                    if matcher.matches(message):
+                        removal_messages.append(f">>>>> - {message}")
+                if removal_messages:
+                    removal_messages.insert(
+                        0,
+                        ">>>>> Status Messages (matching specified patterns):",
+                    )
+
+    if not removal_messages:
+        return ()
+    removal_messages = list(dict.fromkeys(removal_messages))  # deduplication
+    removal_messages.insert(
+        0,
+        ">>>>> Tracked Download State: " + queueItem["trackedDownloadState"],
+    )
+    # A tuple, since the verdicts are kept for the next run
+    return tuple(removal_messages)
@@ -9,12 +9,14 @@ from src.utils.shared import (
     remove_download,
     qBitOffline,
 )
-import sys, os, traceback
 import logging, verboselogs
+from src.utils.log_pipeline import log_job
+from src.utils.detection_rules import select_affected
 
 logger = verboselogs.VerboseLogger(__name__)
 
 
+@log_job
 async def remove_metadata_missing(
     settingsDict,
     BASE_URL,
@@ -24,6 +26,7 @@ async def remove_metadata_missing(
     defective_tracker,
     protectedDownloadIDs,
     privateDowloadIDs,
+    qbit_snapshot=None,
 ):
     # Detects downloads stuck downloading meta data and triggers repeat check and subsequent delete. Adds to blocklist
     try:
@@ -34,16 +37,10 @@ async def remove_metadata_missing(
             return 0
         if await qBitOffline(settingsDict, failType, NAME):
             return 0
-        # Find items affected
-        affectedItems = []
-        for queueItem in queue:
-            if "errorMessage" in queueItem and "status" in queueItem:
-                if (
-                    queueItem["status"] == "queued"
-                    and queueItem["errorMessage"]
-                    == "qBittorrent is downloading metadata"
-                ):
-                    affectedItems.append(queueItem)
+        # Find items affected (see DETECTION_RULES and QBIT_STATE_DETECTION)
+        affectedItems = select_affected(
+            settingsDict, BASE_URL, queue, failType, qbit_snapshot
+        )
         affectedItems = await execute_checks(
             settingsDict,
             affectedItems,
@@ -9,12 +9,14 @@ from src.utils.shared import (
     remove_download,
     qBitOffline,
 )
-import sys, os, traceback
 import logging, verboselogs
+from src.utils.log_pipeline import log_job
+from src.utils.detection_rules import select_affected
 
 logger = verboselogs.VerboseLogger(__name__)
 
 
+@log_job
 async def remove_missing_files(
     settingsDict,
     BASE_URL,
@@ -24,6 +26,8 @@ async def remove_missing_files(
     defective_tracker,
     protectedDownloadIDs,
     privateDowloadIDs,
+    qbit_snapshot=None,
+    download_failures=None,
 ):
     # Detects downloads broken because of missing files. Does not add to blocklist
     try:
@@ -34,31 +38,10 @@ async def remove_missing_files(
             return 0
         if await qBitOffline(settingsDict, failType, NAME):
             return 0
-        # Find items affected
-        affectedItems = []
-        for queueItem in queue:
-            if "status" in queueItem:
-                # case to check for failed torrents
-                if (
-                    queueItem["status"] == "warning"
-                    and "errorMessage" in queueItem
-                    and (
-                        queueItem["errorMessage"]
-                        == "DownloadClientQbittorrentTorrentStateMissingFiles"
-                        or queueItem["errorMessage"] == "The download is missing files"
-                        or queueItem["errorMessage"] == "qBittorrent is reporting missing files"
-                    )
-                ):
-                    affectedItems.append(queueItem)
-                # case to check for failed nzb's/bad files/empty directory
-                if queueItem["status"] == "completed" and "statusMessages" in queueItem:
-                    for statusMessage in queueItem["statusMessages"]:
-                        if "messages" in statusMessage:
-                            for message in statusMessage["messages"]:
-                                if message.startswith(
-                                    "No files found are eligible for import in"
-                                ):
-                                    affectedItems.append(queueItem)
+        # Find items affected (see DETECTION_RULES, QBIT_STATE_DETECTION and the usenet clients)
+        affectedItems = select_affected(
+            settingsDict, BASE_URL, queue, failType, qbit_snapshot, download_failures
+        )
         affectedItems = await execute_checks(
             settingsDict,
             affectedItems,
@@ -8,12 +8,13 @@ from src.utils.shared import (
     permittedAttemptsCheck,
     remove_download,
 )
-import sys, os, traceback
 import logging, verboselogs
+from src.utils.log_pipeline import log_job
 
 logger = verboselogs.VerboseLogger(__name__)
 
 
+@log_job
 async def remove_orphans(
     settingsDict,
     BASE_URL,
@@ -9,13 +9,14 @@ from src.utils.shared import (
     remove_download,
     qBitOffline,
 )
-import sys, os, traceback
 import logging, verboselogs
-from src.utils.rest import rest_get
+from src.utils.log_pipeline import log_job
+from src.utils.qbit_client import get_qbit_client
 
 logger = verboselogs.VerboseLogger(__name__)
 
 
+@log_job
 async def remove_slow(
     settingsDict,
     BASE_URL,
@@ -26,10 +27,14 @@ async def remove_slow(
     protectedDownloadIDs,
     privateDowloadIDs,
     download_sizes_tracker,
+    qbit_snapshot=None,
+    download_progress=None,
 ):
     # Detects slow downloads and triggers delete. Adds to blocklist
     try:
         failType = "slow"
+        # Sizes are tracked per instance, since the instances are cleaned at the same time
+        download_sizes = download_sizes_tracker.dict.setdefault(BASE_URL, {})
         queue = await get_queue(BASE_URL, API_KEY, settingsDict)
         logger.debug("remove_slow/queue IN: %s", formattedQueueInfo(queue))
         if not queue:
@@ -67,11 +72,16 @@ async def remove_slow(
                         # determine if the downloaded bit on average between this and the last iteration is greater than the min threshold
                         downloadedSize, previousSize, increment, speed = (
                             await getDownloadedSize(
-                                settingsDict, queueItem, download_sizes_tracker, NAME
+                                settingsDict,
+                                queueItem,
+                                download_sizes,
+                                NAME,
+                                qbit_snapshot,
+                                download_progress,
                             )
                         )
                         if (
-                            queueItem["downloadId"] in download_sizes_tracker.dict
+                            queueItem["downloadId"] in download_sizes
                             and speed is not None
                         ):
                             if speed < settingsDict["MIN_DOWNLOAD_SPEED"]:
@@ -108,7 +118,14 @@ async def remove_slow(
         return 0
 
 
-async def getDownloadedSize(settingsDict, queueItem, download_sizes_tracker, NAME):
+async def getDownloadedSize(
+    settingsDict,
+    queueItem,
+    download_sizes,
+    NAME,
+    qbit_snapshot=None,
+    download_progress=None,
+):
     try:
         # Determines the speed of download
         # Since Sonarr/Radarr do not update the downlodedSize on realtime, if possible, fetch it directly from qBit
@@ -116,19 +133,24 @@ async def getDownloadedSize(settingsDict, queueItem, download_sizes_tracker, NAM
             settingsDict["QBITTORRENT_URL"]
             and queueItem["downloadClient"] == "qBittorrent"
         ):
-            qbitInfo = await rest_get(
-                settingsDict["QBITTORRENT_URL"] + "/torrents/info",
-                params={"hashes": queueItem["downloadId"]},
-                cookies=settingsDict["QBIT_COOKIE"],
-            )
-            downloadedSize = qbitInfo[0]["completed"]
+            # Taken from the torrents fetched at the start of the run (shared by all instances), if it was there already
+            torrent = (qbit_snapshot or {}).get(queueItem["downloadId"])
+            if torrent is None:
+                qbitInfo = await get_qbit_client(settingsDict).get(
+                    "/torrents/info", params={"hashes": queueItem["downloadId"]}
+                )
+                torrent = qbitInfo[0]
+            downloadedSize = torrent["completed"]
+        elif download_progress and queueItem["downloadId"] in download_progress:
+            # Taken from the other download clients (see get_download_progress), fetched once per run for all their downloads
+            downloadedSize = download_progress[queueItem["downloadId"]]
         else:
             logger.debug(
-                "getDownloadedSize/WARN: Using imprecise method to determine download increments because no direct qBIT query is possible"
+                "getDownloadedSize/WARN: Using imprecise method to determine download increments because no direct query of the download client is possible"
             )
             downloadedSize = queueItem["size"] - queueItem["sizeleft"]
-        if queueItem["downloadId"] in download_sizes_tracker.dict:
-            previousSize = download_sizes_tracker.dict.get(queueItem["downloadId"])
+        if queueItem["downloadId"] in download_sizes:
+            previousSize = download_sizes.get(queueItem["downloadId"])
             increment = downloadedSize - previousSize
             speed = round(increment / 1000 / (settingsDict["REMOVE_TIMER"] * 60), 1)
         else:
@@ -136,7 +158,7 @@ async def getDownloadedSize(settingsDict, queueItem, download_sizes_tracker, NAM
             increment = None
             speed = None
 
-        download_sizes_tracker.dict[queueItem["downloadId"]] = downloadedSize
+        download_sizes[queueItem["downloadId"]] = downloadedSize
         return downloadedSize, previousSize, increment, speed
     except Exception as error:
         errorDetails(NAME, error)
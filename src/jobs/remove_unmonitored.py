@@ -8,13 +8,24 @@ from src.utils.shared import (
     permittedAttemptsCheck,
     remove_download,
 )
-import sys, os, traceback
 import logging, verboselogs
+from src.utils.log_pipeline import log_job
 
 logger = verboselogs.VerboseLogger(__name__)
 from src.utils.rest import rest_get
+import asyncio
 
+# Endpoint and queue item field to look up whether the media of a queue item is monitored
+MONITORED_LOOKUPS = {
+    "SONARR": ("episode", "episodeId"),
+    "RADARR": ("movie", "movieId"),
+    "LIDARR": ("album", "albumId"),
+    "READARR": ("book", "bookId"),
+    "WHISPARR": ("episode", "episodeId"),
+}
 
+
+@log_job
 async def remove_unmonitored(
     settingsDict,
     BASE_URL,
@@ -34,40 +45,23 @@ async def remove_unmonitored(
         if not queue:
             return 0
         # Find items affected
-        monitoredDownloadIDs = []
-        for queueItem in queue:
-            if arr_type == "SONARR":
-                isMonitored = (
-                    await rest_get(
-                        f'{BASE_URL}/episode/{str(queueItem["episodeId"])}', API_KEY
-                    )
-                )["monitored"]
-            elif arr_type == "RADARR":
-                isMonitored = (
-                    await rest_get(
-                        f'{BASE_URL}/movie/{str(queueItem["movieId"])}', API_KEY
-                    )
-                )["monitored"]
-            elif arr_type == "LIDARR":
-                isMonitored = (
-                    await rest_get(
-                        f'{BASE_URL}/album/{str(queueItem["albumId"])}', API_KEY
-                    )
-                )["monitored"]
-            elif arr_type == "READARR":
-                isMonitored = (
-                    await rest_get(
-                        f'{BASE_URL}/book/{str(queueItem["bookId"])}', API_KEY
-                    )
-                )["monitored"]
-            elif arr_type == "WHISPARR":
-                isMonitored = (
-                    await rest_get(
-                        f'{BASE_URL}/episode/{str(queueItem["episodeId"])}', API_KEY
-                    )
-                )["monitored"]
-            if isMonitored:
-                monitoredDownloadIDs.append(queueItem["downloadId"])
+        # Looks up the monitored status of all items concurrently (rest layer limits the requests per host)
+        end_point, id_field = MONITORED_LOOKUPS[arr_type]
+        item_ids = list(dict.fromkeys(queueItem[id_field] for queueItem in queue))
+        lookups = await asyncio.gather(
+            *(
+                rest_get(f"{BASE_URL}/{end_point}/{str(item_id)}", API_KEY)
+                for item_id in item_ids
+            )
+        )
+        isMonitored = {
+            item_id: lookup["monitored"] for item_id, lookup in zip(item_ids, lookups)
+        }
+        monitoredDownloadIDs = {
+            queueItem["downloadId"]
+            for queueItem in queue
+            if isMonitored[queueItem[id_field]]
+        }
 
         affectedItems = []
         for queueItem in queue:
@@ -6,12 +6,13 @@ from src.utils.shared import (
     get_arr_records,
 )
 import logging, verboselogs
+from src.utils.log_pipeline import log_job
 from datetime import datetime, timedelta, timezone
-import dateutil.parser
 
 logger = verboselogs.VerboseLogger(__name__)
 
 
+@log_job
 async def run_periodic_rescans(
     settingsDict,
     BASE_URL,
@@ -22,6 +23,8 @@ async def run_periodic_rescans(
     # Checks the wanted items and runs scans
     if not arr_type in settingsDict["RUN_PERIODIC_RESCANS"]:
         return
+    import dateutil.parser  # Only needed for rescans, thus imported here (keeps the start-up fast)
+
     try:
         queue = await get_queue(BASE_URL, API_KEY, settingsDict)
         check_on_endpoint = []
@@ -42,56 +45,43 @@ async def run_periodic_rescans(
             params["sortKey"] = "movies.lastSearchTime"
             queue_ids = [r["movieId"] for r in queue if "movieId" in r]
 
+        # Only items that are not already being downloaded (are in queue), and that have not been searched for recently
+        queue_ids = set(queue_ids)
+        last_search_before = datetime.now(timezone.utc) - timedelta(
+            days=RESCAN_SETTINGS["MIN_DAYS_BEFORE_RESCAN"]
+        )
+
+        def due_for_rescan(record):
+            return record["id"] not in queue_ids and (
+                "lastSearchTime" not in record
+                or dateutil.parser.isoparse(record["lastSearchTime"])
+                < last_search_before
+            )
+
         for end_point in check_on_endpoint:
+            # Select oldest records (the endpoint is sorted by last search time)
             records = await get_arr_records(
-                BASE_URL, API_KEY, params=params, end_point=f"wanted/{end_point}"
+                BASE_URL,
+                API_KEY,
+                params=params,
+                end_point=f"wanted/{end_point}",
+                keep=due_for_rescan,
+                limit=RESCAN_SETTINGS["MAX_CONCURRENT_SCANS"],
+                stream=settingsDict["STREAM_RECORDS"],
             )
-            if records is None:
-                logger.verbose(
-                    f">>> Rescan: No {end_point} items, thus nothing to rescan."
-                )
-                continue
-
-            # Filter out items that are already being downloaded (are in queue)
-            records = [r for r in records if r["id"] not in queue_ids]
-            if records is None:
-                logger.verbose(
-                    f">>> Rescan: All {end_point} items are already being downloaded, thus nothing to rescan."
-                )
-                continue
-
-            # Remove records that have recently been searched already
-            for record in reversed(records):
-                if not (
-                    ("lastSearchTime" not in record)
-                    or (
-                        (
-                            dateutil.parser.isoparse(record["lastSearchTime"])
-                            + timedelta(days=RESCAN_SETTINGS["MIN_DAYS_BEFORE_RESCAN"])
-                        )
-                        < datetime.now(timezone.utc)
-                    )
-                ):
-                    records.remove(record)
-
-            # Select oldest records
-            records = records[: RESCAN_SETTINGS["MAX_CONCURRENT_SCANS"]]
 
             if not records:
                 logger.verbose(
-                    f">>> Rescan: All {end_point} items have recently been scanned for, thus nothing to rescan."
+                    f">>> Rescan: All {end_point} items are already being downloaded or have recently been scanned for, thus nothing to rescan."
                 )
                 continue
 
             if arr_type == "SONARR":
-                for record in records:
-                    series_id = record.get("seriesId")
-                    if series_id and series_id in series_dict:
-                        record["series"] = series_dict[series_id]
-                    else:
-                        record["series"] = (
-                            None  # Or handle missing series info as needed
-                        )
+                # Copied, since the records may be shared with other callers (see rest_get)
+                records = [
+                    record | {"series": series_dict.get(record.get("seriesId"))}
+                    for record in records
+                ]
 
                 logger.verbose(
                     f">>> Running a scan for {len(records)} {end_point} items:\n"
@@ -0,0 +1,57 @@
+# Keeps track of hosts that are failing, so that calls to them can be skipped quickly for a while
+import time
+
+
+class Circuit_Breaker:
+    # Opens after `threshold` consecutive failures. Once `cooldown` seconds have passed, a single trial
+    # request is let through: if it succeeds the circuit closes again, if it fails it stays open
+    def __init__(self, host, threshold, cooldown, clock=time.monotonic):
+        self.host = host
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def acquire(self):
+        # Returns None if a request may be sent now (taking the trial slot if the cooldown has passed),
+        # else the seconds until the next trial request
+        if self.opened_at is None:
+            return None
+        retry_in = self.opened_at + self.cooldown - self.clock()
+        if retry_in > 0 or self.trial_running:
+            return max(retry_in, 0)
+        self.trial_running = True
+        return None
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def release_trial(self):
+        # Gives the trial slot back without a verdict on the host (e.g. when the trial request was cancelled)
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_running or (self.threshold and self.failures >= self.threshold):
+            self.opened_at = self.clock()
+        self.trial_running = False
+
+
+circuit_breakers = {}
+
+
+def get_circuit_breaker(host, threshold, cooldown):
+    if host not in circuit_breakers:
+        circuit_breakers[host] = Circuit_Breaker(host, threshold, cooldown)
+    circuit_breaker = circuit_breakers[host]
+    # Picks up changed settings, keeping the failures counted so far
+    circuit_breaker.threshold, circuit_breaker.cooldown = threshold, cooldown
+    return circuit_breaker
@@ -0,0 +1,291 @@
+# Decides which queue items are failed, stalled, missing metadata or missing files, based on a table of rules (see DETECTION_RULES)
+# A rule matches on the status of the queue item, optionally its trackedDownloadState, and either its errorMessage or
+# the start of one of its status messages (messagePrefix, the longest matching one decides). Rules on the errorMessage are
+# looked up in a dictionary, rules on the status messages in a sorted list of prefixes; thus classifying an item takes the same time however many rules there are
+from bisect import bisect_right
+from operator import attrgetter
+from src.utils.queue_item import MISSING, QueueItem
+from src.utils.qbit_states import STATE_FAIL_TYPES, qbit_fail_types
+from src.utils.verdict_cache import verdict_cache
+
+ANY = "*"  # As errorMessage: the item has an errorMessage, whatever it is
+EXACT = object()  # Stands for the errorMessage of the item in LOOKUP_ORDER
+# (with trackedDownloadState, errorMessage) in the order the rules are looked up
+LOOKUP_ORDER = [
+    (True, EXACT),
+    (True, ANY),
+    (True, None),
+    (False, EXACT),
+    (False, ANY),
+    (False, None),
+]
+# The fields of the queue items that the exact rules are about
+FIELDS = ("status", "trackedDownloadState", "errorMessage")
+ITEM_FIELDS = attrgetter(*FIELDS)
+MAX_DECISIONS = 10000  # distinct combinations of these fields that are kept
+RULE_FIELDS = (
+    "failType",
+    "status",
+    "trackedDownloadState",
+    "errorMessage",
+    "messagePrefix",
+)
+FAIL_TYPES = ("failed", "stalled", "missing metadata", "missing files")
+
+DEFAULT_RULES = (
+    {"failType": "failed", "status": "failed", "errorMessage": ANY},
+    {
+        "failType": "stalled",
+        "status": "warning",
+        "errorMessage": "The download is stalled with no connections",
+    },
+    {
+        "failType": "missing metadata",
+        "status": "queued",
+        "errorMessage": "qBittorrent is downloading metadata",
+    },
+    {
+        "failType": "missing files",
+        "status": "warning",
+        "errorMessage": "DownloadClientQbittorrentTorrentStateMissingFiles",
+    },
+    {
+        "failType": "missing files",
+        "status": "warning",
+        "errorMessage": "The download is missing files",
+    },
+    {
+        "failType": "missing files",
+        "status": "warning",
+        "errorMessage": "qBittorrent is reporting missing files",
+    },
+    # Failed nzb's, bad files, empty directories
+    {
+        "failType": "missing files",
+        "status": "completed",
+        "messagePrefix": "No files found are eligible for import in",
+    },
+)
+
+rule_table = None
+
+
+def validate_rule(rule):
+    # Raises ValueError if the rule cannot be used
+    if not isinstance(rule, dict):
+        raise ValueError("a rule must be a dictionary")
+    unknown = set(rule) - set(RULE_FIELDS)
+    if unknown:
+        raise ValueError(
+            f"unknown fields {sorted(unknown)} (supported: {list(RULE_FIELDS)})"
+        )
+    if rule.get("failType") not in FAIL_TYPES:
+        raise ValueError(f"failType must be one of {list(FAIL_TYPES)}")
+    if not rule.get("status"):
+        raise ValueError("status is missing")
+    if "errorMessage" in rule and "messagePrefix" in rule:
+        raise ValueError("a rule matches either the errorMessage or a messagePrefix")
+    if not all(isinstance(value, str) and value for value in rule.values()):
+        raise ValueError("all values must be non-empty texts")
+
+
+class Rule_Table:
+    def __init__(self, rules=()):
+        # Later rules take precedence over earlier ones (thus the rules from the config file over the default ones)
+        self.rules = tuple(rules)
+        # (status, trackedDownloadState or None, errorMessage or ANY or None) -> failType
+        self.exact = {}
+        # (status, trackedDownloadState or None) -> sorted prefixes, and their failTypes
+        self.prefixes = {}
+        prefix_rules = {}
+        for rule in (*DEFAULT_RULES, *self.rules):
+            state = rule.get("trackedDownloadState")
+            if "messagePrefix" in rule:
+                prefix_rules.setdefault((rule["status"], state), {})[
+                    rule["messagePrefix"]
+                ] = rule["failType"]
+            else:
+                self.exact[(rule["status"], state, rule.get("errorMessage"))] = rule[
+                    "failType"
+                ]
+        for key, fail_types in prefix_rules.items():
+            # The longest prefix that a message starts with decides. Along with each prefix, the index of the longest other
+            # prefix that it starts with is kept (-1 if none): the prefixes of a message are the prefix right before it in
+            # sorted order, and those it starts with
+            prefixes = sorted(fail_types)
+            parents = []
+            enclosing = []
+            for index, prefix in enumerate(prefixes):
+                while enclosing and not prefix.startswith(prefixes[enclosing[-1]]):
+                    enclosing.pop()
+                parents.append(enclosing[-1] if enclosing else -1)
+                enclosing.append(index)
+            self.prefixes[key] = (
+                prefixes,
+                [fail_types[prefix] for prefix in prefixes],
+                set(fail_types.values()),
+                parents,
+            )
+        # The combinations of fields that the rules use, most specific first; only those are looked up
+        shapes = {
+            (state is not None, message if message in (None, ANY) else EXACT)
+            for _, state, message in self.exact
+        }
+        self.lookups = [shape for shape in LOOKUP_ORDER if shape in shapes]
+        # Most items (e.g. those downloading) have a status that no rule is about, and are skipped right away
+        self.statuses = {status for status, _, _ in self.exact} | {
+            status for status, _ in self.prefixes
+        }
+        self.decisions = {}
+
+    def select(self, queue, failType):
+        # The items of the queue that are classified as failType
+        # Same as calling classify for each item, but items already decided on take only a dictionary lookup
+        selected = []
+        decisions = self.decisions
+        check_messages = self.checks_messages(failType)
+        for queueItem in queue:
+            decision = (
+                decisions.get(ITEM_FIELDS(queueItem))
+                if type(queueItem) is QueueItem
+                else None
+            )
+            if type(decision) is str:
+                if decision == failType:
+                    selected.append(queueItem)
+            elif decision is None or (decision and check_messages):
+                if self.classify(queueItem, failType) == failType:
+                    selected.append(queueItem)
+        return selected
+
+    def checks_messages(self, failType):
+        # True if a rule on the status messages could result in failType
+        return any(
+            failType in fail_types for _, _, fail_types, _ in self.prefixes.values()
+        )
+
+    def classify(self, queueItem, only=None):
+        # Returns the failType of the first matching rule (most specific first, and exact rules before prefix rules), or None
+        # If only is given, the status messages are only looked at if a rule on them could result in that failType
+        # Queues hold many items with the same status, state and errorMessage, thus the decision on these is kept
+        if isinstance(queueItem, QueueItem):
+            fields = ITEM_FIELDS(queueItem)
+        else:
+            fields = tuple(queueItem.get(field, MISSING) for field in FIELDS)
+        decision = self.decisions.get(fields)
+        if decision is None:
+            if len(self.decisions) >= MAX_DECISIONS:
+                self.decisions.clear()
+            decision = self.decisions[fields] = self.decide(*fields)
+        if type(decision) is str:
+            return decision
+        # Up to the status messages
+        for prefix_index in decision:
+            if only is not None and only not in prefix_index[2]:
+                continue
+            fail_type = self.match_prefix(prefix_index, queueItem)
+            if fail_type is not None:
+                return fail_type
+        return None
+
+    def decide(self, status, state, error_message):
+        # Returns the failType if the exact rules decide, else the prefix indexes to check (none if no rule can match)
+        if status not in self.statuses:
+            return ()
+        state = None if state is MISSING else state
+        error_message = None if error_message is MISSING else error_message
+        for with_state, message in self.lookups:
+            if message is not None:
+                if error_message is None:
+                    continue
+                if message is EXACT:
+                    message = error_message
+            fail_type = self.exact.get((status, state if with_state else None, message))
+            if fail_type is not None:
+                return fail_type
+        return tuple(
+            self.prefixes[key]
+            for key in ((status, state), (status, None))
+            if key in self.prefixes
+        )
+
+    def match_prefix(self, prefix_index, queueItem):
+        prefixes, fail_types, _, parents = prefix_index
+        for message in status_message_texts(queueItem):
+            index = bisect_right(prefixes, message) - 1
+            while index >= 0 and not message.startswith(prefixes[index]):
+                index = parents[index]
+            if index >= 0:
+                return fail_types[index]
+        return None
+
+
+def status_message_texts(queueItem):
+    if isinstance(queueItem, QueueItem):
+        return queueItem.status_message_texts()
+    return (
+        message
+        for statusMessage in queueItem.get("statusMessages") or ()
+        for message in statusMessage.get("messages") or ()
+    )
+
+
+def get_rule_table(settingsDict):
+    # Built once, and again when DETECTION_RULES change
+    global rule_table
+    rules = tuple(settingsDict.get("DETECTION_RULES", ()))
+    if rule_table is None or rule_table.rules != rules:
+        rule_table = Rule_Table(rules)
+    return rule_table
+
+
+def select_affected(
+    settingsDict, BASE_URL, queue, failType, qbit_snapshot=None, download_failures=None
+):
+    # The items of the queue that are classified as failType. If the status messages need to be checked, the verdicts are kept per item for the next run (see Verdict_Cache)
+    # With QBIT_STATE_DETECTION, the downloads whose torrent state in qBit shows failType, and the failures reported by the
+    # usenet clients (see get_download_failures), are affected on top of those found by the rules
+    rule_table = get_rule_table(settingsDict)
+    others = queue
+    affectedItems = []
+    if (
+        settingsDict["QBIT_STATE_DETECTION"]
+        and qbit_snapshot
+        and failType in STATE_FAIL_TYPES.values()
+    ):
+        fail_types = qbit_fail_types(settingsDict, qbit_snapshot)
+        affectedItems = [
+            queueItem
+            for queueItem in queue
+            if fail_types.get(queueItem["downloadId"]) == failType
+        ]
+        if affectedItems:
+            affected_ids = set(map(id, affectedItems))
+            others = [
+                queueItem for queueItem in queue if id(queueItem) not in affected_ids
+            ]
+    if download_failures:
+        reported = [
+            queueItem
+            for queueItem in others
+            if download_failures.get(queueItem["downloadId"].upper()) == failType
+        ]
+        if reported:
+            affectedItems += reported
+            reported_ids = set(map(id, reported))
+            others = [
+                queueItem for queueItem in others if id(queueItem) not in reported_ids
+            ]
+    if not rule_table.checks_messages(failType):
+        # Decided on status, trackedDownloadState and errorMessage alone, on which the rule table keeps the decisions already
+        return affectedItems + rule_table.select(others, failType)
+    verdicts = verdict_cache.get_verdicts(
+        BASE_URL,
+        failType,
+        others,
+        lambda queueItem: rule_table.classify(queueItem, failType) == failType,
+        depends_on=rule_table,
+    )
+    return affectedItems + [
+        queueItem for queueItem, affected in zip(others, verdicts) if affected
+    ]
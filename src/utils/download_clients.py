@@ -0,0 +1,422 @@
+# Adapters for the download clients besides qBittorrent (which has its own client, see qbit_client)
+# Each adapter fetches what decluttarr needs of all its downloads in one call per run, rather than one call per queue item
+# Sessions (Transmission's session id, Deluge's cookie) are kept from one run to the next, and only renewed when the client refuses them
+import asyncio
+import logging, verboselogs
+from requests.exceptions import RequestException
+from src.utils.rest import decode_json, rest_request, Rest_Error
+
+logger = verboselogs.VerboseLogger(__name__)
+
+download_clients = {}  # Name of the client -> adapter, kept until its settings change
+
+
+class Download_Client_Error(Rest_Error):
+    # Raised when a download client cannot be queried (not reachable, wrong credentials, or an error reported by the client)
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code  # The error code reported by the client, if any
+
+
+class Download_Client:
+    # Base of the adapters. SETTINGS are the settings of the client (after its name, e.g. TRANSMISSION_URL), passed to __init__ in this order
+    name = None
+    SETTINGS = ()
+
+    async def get_progress(self):
+        # Returns {downloadId: bytes downloaded} for all downloads of the client
+        return {}
+
+    async def get_failures(self):
+        # Returns {downloadId: failType} for the downloads of the client that are failing
+        return {}
+
+    async def send(self, request):
+        # Awaits the request (see rest_request) and returns the response; connection errors and refused credentials become Download_Client_Error
+        try:
+            response = await request()
+            if response.status_code in (401, 403):
+                raise Download_Client_Error(
+                    f"{self.name} refused the credentials (HTTP {response.status_code})"
+                )
+            return response
+        except Rest_Error:
+            raise
+        except RequestException as e:
+            raise Download_Client_Error(
+                f"Error making API request to {self.name}: {e}"
+            ) from e
+
+
+class Transmission_Client(Download_Client):
+    # Transmission RPC (https://github.com/transmission/transmission/blob/main/docs/rpc-spec.md)
+    name = "Transmission"
+    SETTINGS = ("URL", "USERNAME", "PASSWORD")
+    RPC_PATH = "/transmission/rpc"
+    SESSION_HEADER = "X-Transmission-Session-Id"
+
+    def __init__(self, url, username="", password=""):
+        self.url = url.rstrip("/") + self.RPC_PATH
+        self.auth = (username, password) if username else None
+        self.session_id = None
+        self.sessions = 0
+
+    async def rpc(self, method, arguments):
+        # Transmission answers 409 with a new session id if the current one is missing or no longer valid (e.g. after a restart)
+        for _ in range(2):
+            response = await self.send(
+                lambda: rest_request(
+                    "POST",
+                    self.url,
+                    json={"method": method, "arguments": arguments},
+                    headers=(
+                        {self.SESSION_HEADER: self.session_id}
+                        if self.session_id
+                        else None
+                    ),
+                    auth=self.auth,
+                )
+            )
+            if response.status_code == 409 and self.SESSION_HEADER in response.headers:
+                self.session_id = response.headers[self.SESSION_HEADER]
+                self.sessions += 1
+                logger.debug(
+                    "Transmission handed out a new session id (session #%s)",
+                    self.sessions,
+                )
+                continue
+            try:
+                response.raise_for_status()
+                result = decode_json(response)
+            except (RequestException, ValueError) as e:
+                raise Download_Client_Error(
+                    f"Error making API request to {self.name}: {e}"
+                ) from e
+            if result.get("result") != "success":
+                raise Download_Client_Error(
+                    f"{self.name} reported an error: {result.get('result')}"
+                )
+            return result.get("arguments", {})
+        raise Download_Client_Error(f"{self.name} did not accept its own session id")
+
+    async def get_progress(self):
+        torrents = (
+            await self.rpc(
+                "torrent-get",
+                {"fields": ["hashString", "sizeWhenDone", "leftUntilDone"]},
+            )
+        )["torrents"]
+        return {
+            torrent["hashString"].upper(): torrent["sizeWhenDone"]
+            - torrent["leftUntilDone"]
+            for torrent in torrents
+        }
+
+
+class Deluge_Client(Download_Client):
+    # Deluge Web UI JSON-RPC (https://deluge.readthedocs.io/en/latest/reference/webapi.html)
+    name = "Deluge"
+    SETTINGS = ("URL", "PASSWORD")
+    RPC_PATH = "/json"
+    NOT_AUTHENTICATED = 1  # Error code of calls without a valid session cookie
+
+    def __init__(self, url, password=""):
+        self.url = url.rstrip("/") + self.RPC_PATH
+        self.password = password
+        self.cookie = None  # Set once logged in
+        self.request_id = 0
+        self.logins = 0
+
+    async def call(self, method, *params):
+        # Returns the result of the call. Raises Download_Client_Error with the error code of Deluge if it reports an error
+        self.request_id += 1
+        response = await self.send(
+            lambda: rest_request(
+                "POST",
+                self.url,
+                json={"method": method, "params": list(params), "id": self.request_id},
+                cookies=self.cookie,
+            )
+        )
+        try:
+            response.raise_for_status()
+            body = decode_json(response)
+        except (RequestException, ValueError) as e:
+            raise Download_Client_Error(
+                f"Error making API request to {self.name}: {e}"
+            ) from e
+        if body.get("error"):
+            raise Download_Client_Error(
+                f"{self.name} reported an error: {body['error'].get('message')}",
+                body["error"].get("code"),
+            )
+        if "_session_id" in response.cookies:
+            self.cookie = {"_session_id": response.cookies["_session_id"]}
+        return body.get("result")
+
+    async def login(self):
+        self.cookie = None
+        if not await self.call("auth.login", self.password):
+            raise Download_Client_Error(
+                "Login into Deluge failed. Have you configured DELUGE_PASSWORD correctly?"
+            )
+        self.logins += 1
+        logger.debug("Deluge logged in (login #%s)", self.logins)
+        # The Web UI has to be connected to a Deluge daemon; if it is not, it is connected to the first one it knows
+        if not await self.call("web.connected"):
+            hosts = await self.call("web.get_hosts")
+            if not hosts:
+                raise Download_Client_Error(
+                    "The Deluge Web UI is not connected to a Deluge daemon"
+                )
+            await self.call("web.connect", hosts[0][0])
+
+    async def call_logged_in(self, method, *params):
+        # Logs in if needed, and again (once) if Deluge no longer accepts the session cookie
+        if self.cookie is None:
+            await self.login()
+        try:
+            return await self.call(method, *params)
+        except Download_Client_Error as error:
+            if error.code != self.NOT_AUTHENTICATED:
+                raise
+        logger.debug(
+            "Deluge did not accept the session cookie anymore, logging in again"
+        )
+        await self.login()
+        return await self.call(method, *params)
+
+    async def get_progress(self):
+        torrents = await self.call_logged_in(
+            "core.get_torrents_status", {}, ["total_done"]
+        )
+        return {
+            torrent_hash.upper(): torrent["total_done"]
+            for torrent_hash, torrent in torrents.items()
+        }
+
+
+class Usenet_Client(Download_Client):
+    # Base of the usenet adapters, which report failures themselves, before the *arr picks them up from the history of the client
+    # Failed downloads (failed post-processing, or too many missing articles to be repaired) count as "missing files", which is
+    # what the *arr reports for them later on ("No files found are eligible for import")
+    # Repairs that made no progress since the previous run count as "stalled" (and are thus only removed after PERMITTED_ATTEMPTS)
+    def __init__(self):
+        self.repairs = {}  # downloadId -> progress of the repairs at the previous run
+
+    def stuck_repairs(self, repairs):
+        # Takes {downloadId: progress} of the running repairs, and returns the downloadIds of those that did not progress since the previous run
+        stuck = [
+            downloadId
+            for downloadId, progress in repairs.items()
+            if self.repairs.get(downloadId) == progress
+        ]
+        self.repairs = repairs
+        return stuck
+
+    def report(self, failures, downloadId, failType, reason):
+        logger.debug("%s reports %s as %s: %s", self.name, downloadId, failType, reason)
+        failures[downloadId] = failType
+
+
+class Sabnzbd_Client(Usenet_Client):
+    # SABnzbd API (https://sabnzbd.org/wiki/configuration/4.3/api)
+    # SABnzbd aborts jobs that can no longer be completed (missing articles) by itself, and moves them to the history; thus the
+    # history holds all that is needed, including the jobs being repaired
+    name = "SABnzbd"
+    SETTINGS = ("URL", "KEY")
+    RPC_PATH = "/api"
+    HISTORY_LIMIT = 200  # Most recent entries fetched; older ones have been picked up by the *arr long since
+    REPAIR_STATUSES = {"Verifying", "Repairing"}
+
+    def __init__(self, url, api_key):
+        super().__init__()
+        self.url = url.rstrip("/") + self.RPC_PATH
+        self.api_key = api_key
+
+    async def api(self, mode, **params):
+        response = await self.send(
+            lambda: rest_request(
+                "GET",
+                self.url,
+                params={
+                    "mode": mode,
+                    "output": "json",
+                    "apikey": self.api_key,
+                    **params,
+                },
+            )
+        )
+        try:
+            response.raise_for_status()
+            body = decode_json(response)
+        except (RequestException, ValueError) as e:
+            raise Download_Client_Error(
+                f"Error making API request to {self.name}: {e}"
+            ) from e
+        # SABnzbd reports errors (e.g. a wrong API key) with HTTP 200
+        if isinstance(body, dict) and body.get("status") is False:
+            raise Download_Client_Error(
+                f"{self.name} reported an error: {body.get('error')}"
+            )
+        return body
+
+    async def get_failures(self):
+        slots = (await self.api("history", limit=self.HISTORY_LIMIT))["history"][
+            "slots"
+        ]
+        failures = {}
+        repairs = {}
+        for slot in slots:
+            downloadId = slot["nzo_id"].upper()
+            if slot["status"] == "Failed":
+                self.report(
+                    failures, downloadId, "missing files", slot.get("fail_message")
+                )
+            elif slot["status"] in self.REPAIR_STATUSES:
+                repairs[downloadId] = (slot["status"], slot.get("action_line"))
+        for downloadId in self.stuck_repairs(repairs):
+            self.report(
+                failures,
+                downloadId,
+                "stalled",
+                "repair did not progress since the previous run",
+            )
+        return failures
+
+
+class Nzbget_Client(Usenet_Client):
+    # NZBGet JSON-RPC (https://nzbget.com/documentation/api/)
+    name = "NZBGet"
+    SETTINGS = ("URL", "USERNAME", "PASSWORD")
+    RPC_PATH = "/jsonrpc"
+    REPAIR_STATUSES = {"VERIFYING_SOURCES", "REPAIRING", "VERIFYING_REPAIRED"}
+    DRONE_PARAMETER = "drone"  # Set by the *arr on the downloads it adds, and used by it as downloadId
+
+    def __init__(self, url, username="", password=""):
+        super().__init__()
+        self.url = url.rstrip("/") + self.RPC_PATH
+        self.auth = (username, password) if username else None
+        self.request_id = 0
+
+    async def rpc(self, method, *params):
+        self.request_id += 1
+        response = await self.send(
+            lambda: rest_request(
+                "POST",
+                self.url,
+                json={"method": method, "params": list(params), "id": self.request_id},
+                auth=self.auth,
+            )
+        )
+        try:
+            response.raise_for_status()
+            body = decode_json(response)
+        except (RequestException, ValueError) as e:
+            raise Download_Client_Error(
+                f"Error making API request to {self.name}: {e}"
+            ) from e
+        if body.get("error"):
+            raise Download_Client_Error(
+                f"{self.name} reported an error: {body['error'].get('message')}"
+            )
+        return body.get("result")
+
+    def download_id(self, group):
+        for parameter in group.get("Parameters") or ():
+            if parameter.get("Name") == self.DRONE_PARAMETER:
+                return str(parameter.get("Value")).upper()
+        return str(group["NZBID"]).upper()
+
+    async def get_failures(self):
+        # The queue (listgroups) and the history, each in one call
+        groups, history = await asyncio.gather(
+            self.rpc("listgroups", 0), self.rpc("history", False)
+        )
+        failures = {}
+        repairs = {}
+        for group in groups:
+            downloadId = self.download_id(group)
+            # Below the critical health, there are more articles missing than can be repaired
+            if group.get("Health", 1000) < group.get("CriticalHealth", 0):
+                self.report(
+                    failures,
+                    downloadId,
+                    "missing files",
+                    "missing articles (health %s)" % group["Health"],
+                )
+            elif group.get("Status") in self.REPAIR_STATUSES:
+                repairs[downloadId] = (group["Status"], group.get("PostStageProgress"))
+        for downloadId in self.stuck_repairs(repairs):
+            self.report(
+                failures,
+                downloadId,
+                "stalled",
+                "repair did not progress since the previous run",
+            )
+        for entry in history:
+            status = entry.get("Status", "")
+            if status.startswith("FAILURE/") or status == "DELETED/HEALTH":
+                self.report(failures, self.download_id(entry), "missing files", status)
+        return failures
+
+
+# Adapters by the name of their settings (e.g. TRANSMISSION_URL)
+DOWNLOAD_CLIENTS = {
+    "TRANSMISSION": Transmission_Client,
+    "DELUGE": Deluge_Client,
+    "SABNZBD": Sabnzbd_Client,
+    "NZBGET": Nzbget_Client,
+}
+
+
+def get_download_clients(settingsDict):
+    # Returns the adapters of the configured clients. They (and thus their sessions) are kept until their settings change
+    clients = []
+    for name, client_class in DOWNLOAD_CLIENTS.items():
+        if not settingsDict.get(name + "_URL"):
+            download_clients.pop(name, None)
+            continue
+        client_settings = tuple(
+            settingsDict[name + "_" + setting] for setting in client_class.SETTINGS
+        )
+        if name not in download_clients or download_clients[name][0] != client_settings:
+            download_clients[name] = (client_settings, client_class(*client_settings))
+        clients.append(download_clients[name][1])
+    return clients
+
+
+async def from_all_clients(settingsDict, fetch, fallback):
+    # Returns the merged results of fetch(client) for all configured clients, queried at the same time
+    # Clients that cannot be queried are left out (fallback says what is done for their downloads instead)
+    async def query(client):
+        try:
+            return await fetch(client)
+        except (Rest_Error, KeyError, TypeError, AttributeError) as error:
+            logger.warning(
+                "%s could not be queried, %s: %s", client.name, fallback, error
+            )
+            return {}
+
+    merged = {}
+    for result in await asyncio.gather(*map(query, get_download_clients(settingsDict))):
+        merged.update(result)
+    return merged
+
+
+async def get_download_progress(settingsDict):
+    # Returns {downloadId: bytes downloaded} of the downloads in all configured clients (see get_download_clients), fetched once per run
+    return await from_all_clients(
+        settingsDict,
+        lambda client: client.get_progress(),
+        "using the download sizes of the arr apps instead",
+    )
+
+
+async def get_download_failures(settingsDict):
+    # Returns {downloadId: failType} of the failing downloads in all configured clients (see Usenet_Client), fetched once per run
+    return await from_all_clients(
+        settingsDict,
+        lambda client: client.get_failures(),
+        "leaving its failed downloads to the arr apps",
+    )
@@ -0,0 +1,91 @@
+# Keeps responses that came with validators (ETag / Last-Modified), so that they can be re-requested conditionally
+# and served from memory when the server answers "304 Not Modified"
+import threading
+from collections import OrderedDict
+
+
+def copy_result(result):
+    # Returns a copy of a decoded response that shares no lists or dictionaries with it, so that a caller changing what it got
+    # changes nothing in the cache. Read-only records (e.g. QueueItem) are shared as they are
+    if isinstance(result, list):
+        return [copy_result(item) for item in result]
+    if isinstance(result, dict):
+        return {key: copy_result(value) for key, value in result.items()}
+    return result
+
+
+class Cache_Entry:
+    __slots__ = ("etag", "last_modified", "result", "size")
+    # result is the cache's own copy; hand out copies of it (see copy_result)
+
+    def __init__(self, etag, last_modified, result, size):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.result = result
+        self.size = size
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class Response_Cache:
+    # Least recently used entries are evicted once the bodies add up to more than max_bytes
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def store(self, key, response, result):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        size = len(response.content)
+        if not (etag or last_modified) or size > self.max_bytes:
+            self.discard(key)
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key).size
+            self.entries[key] = Cache_Entry(
+                etag, last_modified, copy_result(result), size
+            )
+            self.size += size
+            while self.size > self.max_bytes:
+                self.size -= self.entries.popitem(last=False)[1].size
+
+    def discard(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key).size
+
+    def count(self, endpoint, hit, bytes_saved=0):
+        with self.lock:
+            stats = self.stats.setdefault(
+                endpoint, {"requests": 0, "hits": 0, "bytes_saved": 0}
+            )
+            stats["requests"] += 1
+            stats["hits"] += hit
+            stats["bytes_saved"] += bytes_saved
+
+    def pop_stats(self):
+        # Returns the requests, hits (304s), hit rate and bytes saved per endpoint since the last call
+        with self.lock:
+            stats, self.stats = self.stats, {}
+        for endpoint_stats in stats.values():
+            endpoint_stats["hit_rate"] = (
+                endpoint_stats["hits"] / endpoint_stats["requests"]
+            )
+        return stats
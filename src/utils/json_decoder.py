@@ -0,0 +1,33 @@
+# Decodes the API responses with the fastest JSON library that is installed (see JSON_DECODER)
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def available_backends():
+    # In order of preference for "auto"
+    return [
+        name
+        for name, module in (("orjson", orjson), ("msgspec", msgspec), ("json", json))
+        if module is not None
+    ]
+
+
+def get_decoder(name="auto"):
+    # Returns (backend name, function decoding bytes, errors it raises on invalid json)
+    # Falls back to the standard library if the requested backend is not installed
+    if name == "auto":
+        name = available_backends()[0]
+    if name == "orjson" and orjson is not None:
+        return "orjson", orjson.loads, (orjson.JSONDecodeError,)
+    if name == "msgspec" and msgspec is not None:
+        return "msgspec", msgspec.json.decode, (msgspec.DecodeError,)
+    return "json", json.loads, (ValueError,)
@@ -0,0 +1,95 @@
+# Decodes the records of a paged *arr response ({"page": 1, ..., "records": [...]}) while the body is being read,
+# so that neither the whole body nor all decoded records need to be in memory at once
+import codecs
+import json
+
+WHITESPACE = " \t\n\r"
+decoder = json.JSONDecoder()
+
+
+class Json_Stream:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.position = 0
+        self.exhausted = False
+
+    def fill(self):
+        # Appends the next chunk to the buffer (dropping what has been decoded already). Returns False at the end of the body
+        if self.exhausted:
+            return False
+        self.buffer = self.buffer[self.position :]
+        self.position = 0
+        for chunk in self.chunks:
+            text = self.text_decoder.decode(chunk)
+            if text:
+                self.buffer += text
+                return True
+        self.buffer += self.text_decoder.decode(b"", final=True)
+        self.exhausted = True
+        return True
+
+    def next_char(self):
+        # Skips whitespace and returns the next character (without consuming it), or None at the end of the body
+        while True:
+            while (
+                self.position < len(self.buffer)
+                and self.buffer[self.position] in WHITESPACE
+            ):
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return None
+
+    def expect(self, char):
+        if self.next_char() != char:
+            raise ValueError(
+                f"Expected '{char}' at position {self.position} of the buffer"
+            )
+        self.position += 1
+
+    def value(self):
+        # Decodes the next complete value. Numbers, true/false and null are only complete once something follows them
+        while True:
+            self.next_char()
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.position)
+                if end < len(self.buffer) or self.exhausted:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+            self.fill()
+
+    def records(self, page):
+        # Yields the records one by one; the other keys of the page are put into page
+        self.expect("{")
+        while True:
+            char = self.next_char()
+            if char == "}":
+                return
+            if char == ",":
+                self.position += 1
+                continue
+            if char is None:
+                raise ValueError("Unexpected end of the response")
+            key = self.value()
+            self.expect(":")
+            if key == "records" and self.next_char() == "[":
+                self.position += 1
+                while True:
+                    char = self.next_char()
+                    if char == "]":
+                        self.position += 1
+                        break
+                    if char == ",":
+                        self.position += 1
+                        continue
+                    if char is None:
+                        raise ValueError("Unexpected end of the response")
+                    yield self.value()
+            else:
+                page[key] = self.value()
@@ -0,0 +1,137 @@
+# Splits the instances between several decluttarr workers (see WORKER_LEASE_FILE)
+# The workers share a SQLite file, in which each worker holds a lease on the instances it cleans. A worker renews its
+# leases at the start of each run, and each lease again before every job on its instance; leases of a worker that stopped
+# expire, and are then taken over by the others
+import math
+import os
+import socket
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (worker TEXT PRIMARY KEY, expires REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (instance TEXT PRIMARY KEY, worker TEXT NOT NULL, expires REAL NOT NULL);
+"""
+LOCK_TIMEOUT = 30  # seconds to wait for another worker that is updating the leases
+
+lease_store = None
+
+
+def default_worker_id():
+    # Unique per container (its hostname) and per process
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Lease_Store:
+    def __init__(self, path, worker_id=None, duration=600, clock=time.time):
+        self.path = path
+        self.worker_id = worker_id or default_worker_id()
+        self.duration = duration
+        self.clock = clock  # Wall clock, since it is compared across processes
+
+    def connect(self):
+        # One connection per call, since the calls are made from the threads of the executor
+        connection = sqlite3.connect(
+            self.path, timeout=LOCK_TIMEOUT, isolation_level=None
+        )
+        connection.executescript(SCHEMA)
+        return connection
+
+    def claim(self, instances):
+        # Returns the instances this worker cleans in this run (in the order given), renewing their leases
+        # Each worker gets a fair share (the instances divided by the workers that are alive). A worker that has more,
+        # for instance because another worker joined, gives the rest up; they are taken over in the next run of the others
+        # All of this happens in one transaction, so that no two workers ever hold the same instance
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            now = self.clock()
+            expires = now + self.duration
+            connection.execute("DELETE FROM workers WHERE expires < ?", (now,))
+            connection.execute(
+                "INSERT OR REPLACE INTO workers (worker, expires) VALUES (?, ?)",
+                (self.worker_id, expires),
+            )
+            workers = connection.execute("SELECT COUNT(*) FROM workers").fetchone()[0]
+            share = math.ceil(len(instances) / workers)
+            holders = {
+                instance: worker
+                for instance, worker in connection.execute(
+                    "SELECT instance, worker FROM leases WHERE expires >= ?", (now,)
+                )
+            }
+            held = [
+                instance
+                for instance in instances
+                if holders.get(instance) == self.worker_id
+            ]
+            free = [instance for instance in instances if instance not in holders]
+            claimed = set((held + free)[:share])
+            connection.execute("DELETE FROM leases WHERE worker = ?", (self.worker_id,))
+            connection.executemany(
+                "INSERT OR REPLACE INTO leases (instance, worker, expires) VALUES (?, ?, ?)",
+                [(instance, self.worker_id, expires) for instance in claimed],
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+        return [instance for instance in instances if instance in claimed]
+
+    def renew(self, instance):
+        # Extends the lease on an instance this worker cleans (before each job, so that a long run does not outlast it)
+        # Returns False if another worker took the instance over in the meantime, for instance because the lease expired
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            expires = self.clock() + self.duration
+            renewed = connection.execute(
+                "UPDATE leases SET expires = ? WHERE instance = ? AND worker = ?",
+                (expires, instance, self.worker_id),
+            ).rowcount
+            connection.execute(
+                "UPDATE workers SET expires = ? WHERE worker = ?",
+                (expires, self.worker_id),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+        return renewed == 1
+
+    def release(self):
+        # Gives up all leases (when the worker stops), so that the other workers can take them over right away
+        connection = self.connect()
+        try:
+            connection.execute("DELETE FROM leases WHERE worker = ?", (self.worker_id,))
+            connection.execute(
+                "DELETE FROM workers WHERE worker = ?", (self.worker_id,)
+            )
+        finally:
+            connection.close()
+
+
+def get_lease_store(settingsDict):
+    # Returns None unless worker mode is turned on. Recreated if the settings change
+    global lease_store
+    if not settingsDict["WORKER_LEASE_FILE"]:
+        return None
+    duration = (
+        settingsDict["WORKER_LEASE_DURATION"] or settingsDict["REMOVE_TIMER"] * 60 * 3
+    )
+    if (
+        lease_store is None
+        or lease_store.path != settingsDict["WORKER_LEASE_FILE"]
+        or lease_store.worker_id != (settingsDict["WORKER_ID"] or default_worker_id())
+        or lease_store.duration != duration
+    ):
+        lease_store = Lease_Store(
+            settingsDict["WORKER_LEASE_FILE"], settingsDict["WORKER_ID"], duration
+        )
+    return lease_store
@@ -3,40 +3,114 @@
 ########### Import Libraries
 import logging, verboselogs
 logger = verboselogs.VerboseLogger(__name__)
-from dateutil.relativedelta import relativedelta as rd
 import requests 
-from src.utils.rest import rest_get, rest_post # 
-from src.utils.shared import qBitRefreshCookie
+from src.utils.rest import decode_json, rest_get, rest_request, Rest_Error
+from src.utils.qbit_client import get_qbit_client
+from src.utils.download_clients import get_download_clients
+from src.utils.log_pipeline import Json_Formatter, start_logging
+from config import definitions
+from config.parser import ConfigError, config_file_full_path, config_file_mtime
+from config.settings import Settings
+from src.utils.detection_rules import validate_rule
+from src.utils.message_matcher import get_message_matcher, pattern_regex, REGEX_PREFIX, GLOB_PREFIX
 import asyncio
-from packaging import version
+import json
+
+def parseVersion(version_string):
+    # packaging is only imported once versions are compared, which keeps the start-up fast
+    from packaging import version
+    return version.parse(version_string)
 
 def setLoggingFormat(settingsDict):
-    # Sets logger output to specific format
+    # Sets logger output to specific format (text, or one JSON object per line). The log is written by a separate thread, see log_pipeline
     log_level_num=logging.getLevelName(settingsDict['LOG_LEVEL'])
-    logging.basicConfig(
-        format=('' if settingsDict['IS_IN_DOCKER'] else '%(asctime)s ') + ('[%(levelname)-7s]' if settingsDict['LOG_LEVEL']=='VERBOSE' else '[%(levelname)s]') + ': %(message)s', 
-        level=log_level_num 
-    )
+    if settingsDict['LOG_FORMAT'] == 'json':
+        formatter = Json_Formatter()
+    else:
+        formatter = logging.Formatter(('' if settingsDict['IS_IN_DOCKER'] else '%(asctime)s ') + ('[%(levelname)-7s]' if settingsDict['LOG_LEVEL']=='VERBOSE' else '[%(levelname)s]') + ': %(message)s')
+    start_logging(formatter, log_level_num)
     return 
 
+def loadSettings(config_file=config_file_full_path):
+    # Reads the settings (see config/definitions.py), and removes the failed import message patterns and detection rules that cannot be used
+    # Raises ConfigError if a setting is missing or invalid
+    settingsDict = definitions.load_settings(config_file)
+    patterns = []
+    for pattern in settingsDict['FAILED_IMPORT_MESSAGE_PATTERNS']:
+        try:
+            if not isinstance(pattern, str) or not pattern:
+                raise ValueError('must be a non-empty text')
+            if pattern.startswith((REGEX_PREFIX, GLOB_PREFIX)):
+                pattern_regex(pattern)
+            patterns.append(pattern)
+        except Exception as error:
+            print(f"[ WARNING ]: Removed '{pattern}' from FAILED_IMPORT_MESSAGE_PATTERNS since it is not a valid pattern ({error}).")
+    # Compiled here once, see get_message_matcher
+    get_message_matcher(tuple(patterns))
+    rules = []
+    for rule in settingsDict['DETECTION_RULES']:
+        try:
+            validate_rule(rule)
+            rules.append(rule)
+        except ValueError as error:
+            print(f"[ WARNING ]: Removed {json.dumps(rule)} from DETECTION_RULES since {error}.")
+    return settingsDict.replace(FAILED_IMPORT_MESSAGE_PATTERNS=patterns, DETECTION_RULES=rules)
+
+
+async def getArrStatus(settingsDict, arrApp):
+    # Fetches /system/status of an arr instance. It holds the name, app type and version, and is thus fetched only once at startup
+    response = await rest_request('GET', settingsDict[arrApp + '_URL']+'/system/status', params=None, headers={'X-Api-Key': settingsDict[arrApp + '_KEY']})
+    response.raise_for_status()
+    return decode_json(response)
+
+
+async def getArrStatuses(settingsDict):
+    # Fetches the status of all arr instances concurrently. Returns a dictionary with the status (or the error) per instance
+    instances = [instance for instance in settingsDict['INSTANCES'] if settingsDict[instance + '_URL']]
+    statuses = await asyncio.gather(*[withStartupTimeout(settingsDict, getArrStatus(settingsDict, instance)) for instance in instances], return_exceptions=True)
+    return dict(zip(instances, statuses))
+
+
+async def withStartupTimeout(settingsDict, coroutine):
+    # Limits how long a startup check may take in total (including retries)
+    try:
+        return await asyncio.wait_for(coroutine, settingsDict['STARTUP_TIMEOUT'] or None)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"No response within {settingsDict['STARTUP_TIMEOUT']} seconds (STARTUP_TIMEOUT)")
+
 
-async def getArrInstanceName(settingsDict, arrApp):
+async def getArrInstanceName(settingsDict, arrApp, arr_status=None):
     # Retrieves the names of the arr instances, and if not defined, sets a default (should in theory not be requried, since UI already enforces a value)
+    # Returns the settings with the name added
     try:
         if settingsDict[arrApp + '_URL']:
-            settingsDict[arrApp + '_NAME'] = (await rest_get(settingsDict[arrApp + '_URL']+'/system/status', settingsDict[arrApp + '_KEY']))['instanceName']
+            if arr_status is None:
+                arr_status = await getArrStatus(settingsDict, arrApp)
+            return settingsDict.replace(**{arrApp + '_NAME': arr_status['instanceName']})
     except:
-            settingsDict[arrApp + '_NAME'] = arrApp.title()
+            return settingsDict.replace(**{arrApp + '_NAME': arrApp.title()})
     return settingsDict
 
 
-async def getProtectedAndPrivateFromQbit(settingsDict):
+async def getQbitSnapshot(settingsDict):
+    # Fetches all torrents from qbit, once per run for all instances. Returns a dictionary with the torrents by hash (upper case, like the downloadIds)
+    if not settingsDict['QBITTORRENT_URL']:
+        return {}
+    qbitItems = await get_qbit_client(settingsDict).get('/torrents/info', params={})
+    return {str.upper(qbitItem['hash']): qbitItem for qbitItem in qbitItems}
+
+
+async def getProtectedAndPrivateFromQbit(settingsDict, qbitSnapshot=None):
     # Returns two lists containing the hashes of Qbit that are either protected by tag, or are private trackers (if IGNORE_PRIVATE_TRACKERS is true)
     protectedDownloadIDs = []
     privateDowloadIDs = []
     if settingsDict['QBITTORRENT_URL']:
-        # Fetch all torrents
-        qbitItems = await rest_get(settingsDict['QBITTORRENT_URL']+'/torrents/info',params={}, cookies=settingsDict['QBIT_COOKIE'])
+        # Fetch all torrents (unless already fetched for this run)
+        if qbitSnapshot is None:
+            qbitSnapshot = await getQbitSnapshot(settingsDict)
+        qbitItems = list(qbitSnapshot.values())
+        fetchedPrivate = {} # hash -> is_private, for qbit versions that do not report it in the torrent list
+        qbitReportsPrivate = settingsDict['IGNORE_PRIVATE_TRACKERS'] and parseVersion(settingsDict['QBIT_VERSION']) >= parseVersion('5.1.0') # Compared once, rather than per torrent
 
         for qbitItem in qbitItems:
             # Fetch protected torrents (by tag)
@@ -45,16 +119,16 @@ async def getProtectedAndPrivateFromQbit(settingsDict):
                 
             # Fetch private torrents
             if settingsDict['IGNORE_PRIVATE_TRACKERS']: 
-                if version.parse(settingsDict['QBIT_VERSION']) >= version.parse('5.1.0'):
+                if qbitReportsPrivate:
                     if qbitItem['private']:
                         privateDowloadIDs.append(str.upper(qbitItem['hash']))
                 else:
-                    qbitItemProperties = await rest_get(settingsDict['QBITTORRENT_URL']+'/torrents/properties',params={'hash': qbitItem['hash']}, cookies=settingsDict['QBIT_COOKIE'])
+                    qbitItemProperties = await get_qbit_client(settingsDict).get('/torrents/properties', params={'hash': qbitItem['hash']})
                     if qbitItemProperties.get('is_private', False):
                         privateDowloadIDs.append(str.upper(qbitItem['hash']))
-                    qbitItem['private'] = qbitItemProperties.get('is_private', None) # Adds the is_private flag to qbitItem info for simplified logging
+                    fetchedPrivate[qbitItem['hash']] = qbitItemProperties.get('is_private', None) # Kept for the logging below; the torrents are shared with the other jobs, and thus not changed
 
-        logger.debug('main/getProtectedAndPrivateFromQbit/qbitItems: %s', str([{"hash": str.upper(item["hash"]), "name": item["name"], "category": item["category"], "tags": item["tags"], "private": item.get("private", None)} for item in qbitItems]))
+        logger.debug('main/getProtectedAndPrivateFromQbit/qbitItems: %s', str([{"hash": str.upper(item["hash"]), "name": item["name"], "category": item["category"], "tags": item["tags"], "private": fetchedPrivate.get(item["hash"], item.get("private", None))} for item in qbitItems]))
     
     logger.debug('main/getProtectedAndPrivateFromQbit/protectedDownloadIDs: %s', str(protectedDownloadIDs))
     logger.debug('main/getProtectedAndPrivateFromQbit/privateDowloadIDs: %s', str(privateDowloadIDs))   
@@ -96,6 +170,7 @@ def showSettings(settingsDict):
         logger.info('%s/%s (%s) | Search missing/cutoff-unmet items. Max queries/list: %s. Min. days to re-search: %s (%s)', RESCAN_SETTINGS['MISSING'],  RESCAN_SETTINGS['CUTOFF_UNMET'], arr_type, RESCAN_SETTINGS['MAX_CONCURRENT_SCANS'], RESCAN_SETTINGS['MIN_DAYS_BEFORE_RESCAN'], 'RUN_PERIODIC_RESCANS') 
     logger.info('') 
     
+    from dateutil.relativedelta import relativedelta as rd # Only needed here, thus imported here (keeps the start-up fast)
     logger.info('Running every: %s', fmt.format(rd(minutes=settingsDict['REMOVE_TIMER'])))  
     if settingsDict['REMOVE_SLOW']: 
         logger.info('Minimum speed enforced: %s KB/s', str(settingsDict['MIN_DOWNLOAD_SPEED'])) 
@@ -103,8 +178,18 @@ def showSettings(settingsDict):
     if settingsDict['QBITTORRENT_URL']: 
         logger.info('Downloads with this tag will be skipped: \"%s\"', settingsDict['NO_STALLED_REMOVAL_QBIT_TAG'])  
         logger.info('Private Trackers will be skipped: %s', settingsDict['IGNORE_PRIVATE_TRACKERS'])        
+        if settingsDict['QBIT_STATE_DETECTION']:
+            logger.info('Stalled, missing metadata and missing files detected from the torrent states in qBit (%s)', 'QBIT_STATE_DETECTION')
     if settingsDict['IGNORED_DOWNLOAD_CLIENTS']: 
         logger.info('Download clients skipped: %s',", ".join(settingsDict['IGNORED_DOWNLOAD_CLIENTS']))
+    if settingsDict['DETECTION_RULES']:
+        logger.info('Additional detection rules: %s (%s)', len(settingsDict['DETECTION_RULES']), 'DETECTION_RULES')
+    if settingsDict['WORKER_LEASE_FILE']:
+        logger.info('Instances shared with the other workers via: %s (%s)', settingsDict['WORKER_LEASE_FILE'], 'WORKER_LEASE_FILE')
+    if settingsDict['TRACKER_STATE_FILE']:
+        logger.info('Tracker state kept in: %s (%s)', settingsDict['TRACKER_STATE_FILE'], 'TRACKER_STATE_FILE')
+    if settingsDict['RUN_ONCE']:
+        logger.info('Single run, then exiting (%s)', 'RUN_ONCE')
     logger.info('') 
     logger.info('*** Configured Instances ***')
     
@@ -122,6 +207,8 @@ def showSettings(settingsDict):
             'qBittorrent: %s', 
             (settingsDict['QBITTORRENT_URL']).split('/api')[0]
         )    
+    for client in get_download_clients(settingsDict):
+        logger.info('%s: %s', client.name, client.url.split(client.RPC_PATH)[0])
 
     logger.info('') 
     return   
@@ -138,92 +225,176 @@ def upgradeChecks(settingsDict):
         logger.warn('')
     return
 
-async def instanceChecks(settingsDict):
-    # Checks if the arr and qbit instances are reachable, and returns the settings dictionary with the qbit cookie 
-    logger.info('*** Check Instances ***')
+async def checkArrInstance(settingsDict, instance, arr_status):
+    # Checks a single arr instance, based on its status (or the error raised when fetching it). Returns True if all is fine
     error_occured = False
-    # Check ARR-apps
-    for instance in settingsDict['INSTANCES']:
-        if settingsDict[instance + '_URL']:    
-            # Check instance is reachable
-            try: 
-                response = await asyncio.get_event_loop().run_in_executor(None, lambda: requests.get(settingsDict[instance + '_URL']+'/system/status', params=None, headers={'X-Api-Key': settingsDict[instance + '_KEY']}, verify=settingsDict['SSL_VERIFICATION']))
-                response.raise_for_status()
-            except Exception as error:
+    # Check instance is reachable
+    if isinstance(arr_status, BaseException):
+        error = arr_status
+        error_occured = True
+        logger.error('!! %s Error: !!', instance.title())
+        logger.error('> %s', error)
+        if isinstance(error, requests.exceptions.HTTPError) and error.response.status_code == 401:
+            logger.error ('> Have you configured %s correctly?', instance + '_KEY')
+
+    if not error_occured:  
+        # Check if network settings are pointing to the right Arr-apps
+        current_app = arr_status['appName']
+        arr_type = settingsDict[instance + '_TYPE']
+        if current_app.upper() != arr_type:
+            error_occured = True
+            logger.error('!! %s Error: !!', instance.title())                    
+            logger.error('> Your %s points to a %s instance, rather than %s. Did you specify the wrong IP?', instance + '_URL', current_app, arr_type.title())
+
+    if not error_occured:
+        # Check minimum version requirements are met
+        current_version = arr_status['version']
+        if settingsDict[arr_type + '_MIN_VERSION']:
+            if parseVersion(current_version) < parseVersion(settingsDict[arr_type + '_MIN_VERSION']):
                 error_occured = True
                 logger.error('!! %s Error: !!', instance.title())
-                logger.error('> %s', error)
-                if isinstance(error, requests.exceptions.HTTPError) and error.response.status_code == 401:
-                    logger.error ('> Have you configured %s correctly?', instance + '_KEY')
-
-            arr_status = response.json()
-            if not error_occured:  
-                # Check if network settings are pointing to the right Arr-apps
-                current_app = arr_status['appName']
-                if current_app.upper() != instance:
-                    error_occured = True
-                    logger.error('!! %s Error: !!', instance.title())                    
-                    logger.error('> Your %s points to a %s instance, rather than %s. Did you specify the wrong IP?', instance + '_URL', current_app, instance.title())
- 
-            if not error_occured:
-                # Check minimum version requirements are met
-                current_version = arr_status['version']
-                if settingsDict[instance + '_MIN_VERSION']:
-                    if version.parse(current_version) < version.parse(settingsDict[instance + '_MIN_VERSION']):
-                        error_occured = True
-                        logger.error('!! %s Error: !!', instance.title())
-                        logger.error('> Please update %s to at least version %s. Current version: %s', instance.title(), settingsDict[instance + '_MIN_VERSION'], current_version)
-
-            if not error_occured:
-                # Check if language is english
-                uiLanguage = (await rest_get(settingsDict[instance + '_URL']+'/config/ui', settingsDict[instance + '_KEY']))['uiLanguage']
-                if uiLanguage > 1: # Not English
-                    error_occured = True
-                    logger.error('!! %s Error: !!', instance.title())
-                    logger.error('> Decluttarr only works correctly if UI language is set to English (under Settings/UI in %s)', instance.title())        
-                    logger.error('> Details: https://github.com/ManiMatter/decluttarr/issues/132)')        
-
-            if not error_occured:
-                logger.info('OK | %s', instance.title())     
-                logger.debug('Current version of %s: %s', instance, current_version)  
-
-    # Check Bittorrent
-    if settingsDict['QBITTORRENT_URL']:
-        # Checking if qbit can be reached, and checking if version is OK
-        await qBitRefreshCookie(settingsDict)
-        if not settingsDict['QBIT_COOKIE']:
-            error_occured = True
+                logger.error('> Please update %s to at least version %s. Current version: %s', instance.title(), settingsDict[arr_type + '_MIN_VERSION'], current_version)
 
-        if not error_occured:
-            qbit_version = await rest_get(settingsDict['QBITTORRENT_URL']+'/app/version',cookies=settingsDict['QBIT_COOKIE'])
-            qbit_version = qbit_version[1:] # version without _v
-            settingsDict['QBIT_VERSION'] = qbit_version
-            if version.parse(qbit_version) < version.parse(settingsDict['QBITTORRENT_MIN_VERSION']):
+    if not error_occured:
+        # Check if language is english
+        try:
+            uiLanguage = (await withStartupTimeout(settingsDict, rest_get(settingsDict[instance + '_URL']+'/config/ui', settingsDict[instance + '_KEY'])))['uiLanguage']
+        except Exception as error:
+            error_occured = True
+            logger.error('!! %s Error: !!', instance.title())
+            logger.error('> %s', error)
+        else:
+            if uiLanguage > 1: # Not English
                 error_occured = True
-                logger.error('-- | %s *** Error: %s ***', 'qBittorrent', 'Please update qBittorrent to at least version %s Current version: %s',settingsDict['QBITTORRENT_MIN_VERSION'], qbit_version)
+                logger.error('!! %s Error: !!', instance.title())
+                logger.error('> Decluttarr only works correctly if UI language is set to English (under Settings/UI in %s)', instance.title())        
+                logger.error('> Details: https://github.com/ManiMatter/decluttarr/issues/132)')        
+
+    if not error_occured:
+        logger.info('OK | %s', instance.title())     
+        logger.debug('Current version of %s: %s', instance, current_version)  
+    return not error_occured
+
+
+async def checkQbit(settingsDict):
+    # Checks if qbit can be reached (logging in), and if its version is OK. Returns the settings with the qbit version if all is fine, else False
+    error_occured = False
+    qbitClient = get_qbit_client(settingsDict)
+    try:
+        await withStartupTimeout(settingsDict, qbitClient.login())
+    except Rest_Error as error:
+        error_occured = True
+        logger.error('!! %s Error: !!', 'qBittorrent')
+        logger.error('> %s', error)
+
+    if not error_occured:
+        qbit_version = await withStartupTimeout(settingsDict, qbitClient.get('/app/version'))
+        qbit_version = qbit_version[1:] # version without _v
+        settingsDict = settingsDict.replace(QBIT_VERSION=qbit_version)
+        if parseVersion(qbit_version) < parseVersion(settingsDict['QBITTORRENT_MIN_VERSION']):
+            error_occured = True
+            logger.error('-- | %s *** Error: %s ***', 'qBittorrent', 'Please update qBittorrent to at least version %s Current version: %s',settingsDict['QBITTORRENT_MIN_VERSION'], qbit_version)
 
-        if not error_occured:
-            logger.info('OK | %s', 'qBittorrent')
-            logger.debug('Current version of %s: %s', 'qBittorrent', qbit_version)  
+    if not error_occured:
+        logger.info('OK | %s', 'qBittorrent')
+        logger.debug('Current version of %s: %s', 'qBittorrent', qbit_version)  
+    return settingsDict if not error_occured else False
 
 
+async def instanceChecks(settingsDict, arr_statuses=None):
+    # Checks if the arr and qbit instances are reachable, and returns the settings dictionary with the qbit version
+    # All instances are checked at the same time; arr_statuses (see getArrStatuses) are fetched if not passed in
+    logger.info('*** Check Instances ***')
+    if arr_statuses is None:
+        arr_statuses = await getArrStatuses(settingsDict)
+    checks = [checkArrInstance(settingsDict, instance, arr_status) for instance, arr_status in arr_statuses.items()]
+    if settingsDict['QBITTORRENT_URL']:
+        checks.append(checkQbit(settingsDict))
+    results = await asyncio.gather(*checks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            logger.error('!! Error: !!')
+            logger.error('> %s', result)
+        elif isinstance(result, Settings):
+            settingsDict = result # With the qbit version
+    error_occured = not all(result is True or isinstance(result, Settings) for result in results)
+
     if error_occured:
-        logger.warning('At least one instance had a problem. Waiting for 60 seconds, then exiting Decluttarr.')      
-        await asyncio.sleep(60)
+        if settingsDict['RUN_ONCE']:
+            # Whatever schedules the runs decides when to try again; the exit status tells it that this run failed
+            logger.warning('At least one instance had a problem. Exiting Decluttarr.')
+            exit(1)
+        if settingsDict['STARTUP_EXIT_DELAY']:
+            logger.warning('At least one instance had a problem. Waiting for %s seconds, then exiting Decluttarr.', settingsDict['STARTUP_EXIT_DELAY'])      
+            await asyncio.sleep(settingsDict['STARTUP_EXIT_DELAY'])
+        else:
+            logger.warning('At least one instance had a problem. Exiting Decluttarr.')
         exit()
 
     logger.info('') 
     return settingsDict
 
+async def reloadSettings(settingsDict):
+    # Reloads the settings if the config file was changed since it was read (checked before every run), and returns the settings for the next run
+    # The names of unchanged instances and the qbit cookie are kept; added or changed instances are checked first and left out if the check fails
+    # Tracker state is not part of the settings, and is thus kept as well
+    mtime = config_file_mtime(settingsDict['CONFIG_FILE'])
+    if settingsDict['IS_IN_DOCKER'] or mtime == settingsDict['CONFIG_MTIME']:
+        return settingsDict
+    try:
+        newSettings = loadSettings(settingsDict['CONFIG_FILE'])
+    except ConfigError as error:
+        logger.warning('Config file was changed, but cannot be loaded. Keeping the current settings: %s', error)
+        return settingsDict.replace(CONFIG_MTIME=mtime)
+    changedSettings = [key for key in newSettings if key != 'CONFIG_MTIME' and newSettings[key] != settingsDict.get(key)]
+    logger.info('Config file was changed, reloading settings. Changed: %s', ', '.join(changedSettings) or 'nothing')
+
+    # Keep what was found out about the instances that did not change, check the others
+    def isUnchanged(instance):
+        return instance in settingsDict['INSTANCES'] and all(newSettings[instance + key] == settingsDict[instance + key] for key in ('_URL', '_KEY'))
+    newInstances = [instance for instance in newSettings['INSTANCES'] if not isUnchanged(instance)]
+    newSettings = newSettings.replace(**{instance + '_NAME': settingsDict[instance + '_NAME'] for instance in newSettings['INSTANCES'] if instance not in newInstances})
+    if newInstances:
+        arr_statuses = await getArrStatuses(newSettings.replace(INSTANCES=newInstances))
+        results = await asyncio.gather(*[checkArrInstance(newSettings, instance, arr_status) for instance, arr_status in arr_statuses.items()], return_exceptions=True)
+        for (instance, arr_status), result in zip(arr_statuses.items(), results):
+            if result is True:
+                newSettings = await getArrInstanceName(newSettings, instance, arr_status)
+            else:
+                logger.warning('%s is skipped until the config file is changed again', instance.title())
+                newSettings = newSettings.replace(INSTANCES=[other for other in newSettings['INSTANCES'] if other != instance])
+
+    qbitSettings = ['QBITTORRENT_URL', 'QBITTORRENT_USERNAME', 'QBITTORRENT_PASSWORD']
+    if all(newSettings[key] == settingsDict[key] for key in qbitSettings):
+        newSettings = newSettings.replace(**{key: settingsDict[key] for key in ('QBIT_VERSION',) if key in settingsDict})
+    elif newSettings['QBITTORRENT_URL']:
+        try:
+            qbitChecked = await checkQbit(newSettings)
+        except Exception as error:
+            logger.error('> %s', error)
+            qbitChecked = False
+        if not qbitChecked:
+            logger.warning('qBittorrent settings were changed, but qBittorrent cannot be used. Keeping the current settings.')
+            return settingsDict.replace(CONFIG_MTIME=mtime)
+        newSettings = qbitChecked
+    if newSettings['QBITTORRENT_URL'] and any(newSettings[key] != settingsDict[key] for key in qbitSettings + ['NO_STALLED_REMOVAL_QBIT_TAG']):
+        await createQbitProtectionTag(newSettings)
+
+    if any(newSettings[key] != settingsDict[key] for key in ('LOG_LEVEL', 'LOG_FORMAT')):
+        setLoggingFormat(newSettings)
+    showSettings(newSettings)
+    definitions.settingsDict = newSettings
+    return newSettings
+
 async def createQbitProtectionTag(settingsDict):
     # Creates the qBit Protection tag if not already present
     if settingsDict['QBITTORRENT_URL']:
-        current_tags = await rest_get(settingsDict['QBITTORRENT_URL']+'/torrents/tags',cookies=settingsDict['QBIT_COOKIE'])
+        current_tags = await get_qbit_client(settingsDict).get('/torrents/tags')
         if not settingsDict['NO_STALLED_REMOVAL_QBIT_TAG'] in current_tags:
             if settingsDict['QBITTORRENT_URL']: 
                 logger.info('Creating tag in qBittorrent: %s', settingsDict['NO_STALLED_REMOVAL_QBIT_TAG'])  
                 if not settingsDict['TEST_RUN']:
-                    await rest_post(url=settingsDict['QBITTORRENT_URL']+'/torrents/createTags', data={'tags': settingsDict['NO_STALLED_REMOVAL_QBIT_TAG']}, headers={'content-type': 'application/x-www-form-urlencoded'}, cookies=settingsDict['QBIT_COOKIE'])
+                    await get_qbit_client(settingsDict).post('/torrents/createTags', data={'tags': settingsDict['NO_STALLED_REMOVAL_QBIT_TAG']})
 
 def showLoggerLevel(settingsDict):
     logger.info('#' * 50)
@@ -0,0 +1,108 @@
+# Writes the log from a separate thread: log calls only put the record on a queue, so that a slow log output (e.g. a
+# container log driver) does not hold up the event loop
+# Records carry the instance, job, failType and downloadId they belong to (see log_context), which the JSON format includes
+import atexit
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+
+CONTEXT_FIELDS = ("instance", "job", "failType", "downloadId")
+
+context = contextvars.ContextVar("log_context", default={})
+queue_handler = None
+listener = None
+handled_logger = None
+
+
+@contextlib.contextmanager
+def log_context(**fields):
+    # Adds fields to the records logged within (also by the tasks started within, which take a copy of the context)
+    token = context.set({**context.get(), **fields})
+    try:
+        yield
+    finally:
+        context.reset(token)
+
+
+def log_job(job):
+    # Decorator for the jobs, so that their records carry the job name
+    @functools.wraps(job)
+    async def wrapper(*args, **kwargs):
+        with log_context(job=job.__name__):
+            return await job(*args, **kwargs)
+
+    return wrapper
+
+
+def log_instance(cleaner):
+    # Decorator for functions called with (settingsDict, instance, ...), so that their records carry the instance
+    @functools.wraps(cleaner)
+    async def wrapper(settingsDict, instance, *args, **kwargs):
+        with log_context(instance=instance):
+            return await cleaner(settingsDict, instance, *args, **kwargs)
+
+    return wrapper
+
+
+class Context_Filter(logging.Filter):
+    # Adds the context fields to each record. Runs where the record is logged (not in the thread that writes it)
+    def filter(self, record):
+        fields = context.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, fields.get(field))
+        return True
+
+
+class Json_Formatter(logging.Formatter):
+    # One JSON object per line; the context fields are only included if set. Tracebacks are part of the message
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            if getattr(record, field, None) is not None:
+                entry[field] = getattr(record, field)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def start_logging(formatter, level, stream=None, logger=None):
+    # Routes the records of the logger (by default the root logger) through a queue to a thread that writes them to stream (stderr)
+    # Like logging.basicConfig, leaves the output alone if another handler was set up already (e.g. by pytest); only the level is set then
+    global queue_handler, listener, handled_logger
+    logger = logger or logging.getLogger()
+    stop_logging()
+    logger.setLevel(level)
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(formatter)
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(Context_Filter())
+    handled_logger = logger
+    logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(records, handler)
+    listener.start()
+
+
+def stop_logging():
+    # Writes out the records still queued (also called when decluttarr exits)
+    global queue_handler, listener, handled_logger
+    if listener is not None:
+        handled_logger.removeHandler(queue_handler)
+        listener.stop()
+    queue_handler = listener = handled_logger = None
+
+
+atexit.register(stop_logging)
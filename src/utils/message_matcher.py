@@ -0,0 +1,112 @@
+# Checks messages against many patterns at once (see FAILED_IMPORT_MESSAGE_PATTERNS), rather than one pattern after the other
+# Patterns are plain text found anywhere in the message, or, with a prefix, a regular expression ("re:") or a glob for the whole message ("glob:")
+import fnmatch
+import functools
+import re
+
+REGEX_PREFIX = "re:"
+GLOB_PREFIX = "glob:"
+# From this many plain patterns on, an Aho-Corasick automaton is used if pyahocorasick is installed (it scans each message once, whatever the number of patterns)
+AHO_CORASICK_MIN_PATTERNS = 10
+GLOBAL_FLAGS = re.compile(r"^\(\?([ims]+)\)")
+
+
+def pattern_regex(pattern):
+    # Returns the regular expression for a regex or glob pattern (raises re.error if it is not valid)
+    if pattern.startswith(REGEX_PREFIX):
+        # Flags at the start (e.g. "(?i)" to ignore the case) are limited to the pattern, since it becomes part of a larger regex
+        source = GLOBAL_FLAGS.sub(r"(?\1:", pattern[len(REGEX_PREFIX) :], count=1)
+        if source != pattern[len(REGEX_PREFIX) :]:
+            source += ")"
+    else:
+        source = r"\A" + fnmatch.translate(pattern[len(GLOB_PREFIX) :])
+    re.compile(f"(?:{source})|")  # As part of a larger regex
+    return source
+
+
+def trie_regex(texts):
+    # A regular expression matching any of the texts, with common prefixes merged (e.g. "Not a(?:n upgrade| Custom Format upgrade)")
+    # The regex engine then compares each prefix once per position, instead of once per pattern
+    trie = {}
+    for text in texts:
+        node = trie
+        for char in text:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [
+            re.escape(char) + build(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ""
+        regex = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Ends here for a text that is a prefix of another one
+        return f"(?:{regex})?" if "" in node else regex
+
+    return build(trie)
+
+
+def load_aho_corasick():
+    # Returns the module if installed, else None (imported only when needed, which keeps the start-up fast)
+    try:
+        import ahocorasick
+    except ImportError:
+        return None
+    return ahocorasick
+
+
+class Message_Matcher:
+    def __init__(self, patterns):
+        self.patterns = tuple(patterns)
+        texts = [
+            pattern
+            for pattern in self.patterns
+            if not pattern.startswith((REGEX_PREFIX, GLOB_PREFIX))
+        ]
+        regexes = []
+        # Regexes with groups are compiled on their own: combined, group names could clash and backreferences (e.g. "\1") would shift
+        self.separate = []
+        for pattern in self.patterns:
+            if pattern.startswith((REGEX_PREFIX, GLOB_PREFIX)):
+                regex = pattern_regex(pattern)
+                compiled = re.compile(regex)
+                if compiled.groups:
+                    self.separate.append(compiled)
+                else:
+                    regexes.append(regex)
+        self.automaton = None
+        ahocorasick = (
+            load_aho_corasick() if len(texts) >= AHO_CORASICK_MIN_PATTERNS else None
+        )
+        if ahocorasick:
+            self.automaton = ahocorasick.Automaton()
+            for text in texts:
+                self.automaton.add_word(text, text)
+            self.automaton.make_automaton()
+        elif texts:
+            regexes.append(trie_regex(texts))
+        self.regex = (
+            re.compile("|".join(f"(?:{regex})" for regex in regexes))
+            if regexes
+            else None
+        )
+
+    def matches(self, message):
+        # True if any pattern matches the message
+        if (
+            self.automaton is not None
+            and next(self.automaton.iter(message), None) is not None
+        ):
+            return True
+        if self.regex is not None and self.regex.search(message) is not None:
+            return True
+        return any(regex.search(message) is not None for regex in self.separate)
+
+
+@functools.lru_cache(maxsize=8)
+def get_message_matcher(patterns):
+    # Compiled once per list of patterns (a tuple, as held by the settings)
+    return Message_Matcher(patterns)
@@ -0,0 +1,141 @@
+# Talks to qBittorrent. Logs in when first needed and keeps the session cookie (SID) from one run to the next,
+# since qBit may limit (and eventually ban) repeated logins
+# When qBit no longer accepts the cookie (403, e.g. after its session expired or qBit restarted), the client logs in again and retries the call once
+import asyncio
+import logging, verboselogs
+import requests
+from requests.exceptions import RequestException
+from config import definitions
+from src.utils.rest import rest_get, rest_request, Rest_Error
+
+logger = verboselogs.VerboseLogger(__name__)
+
+FORM_HEADERS = {"content-type": "application/x-www-form-urlencoded"}
+
+qbit_client = None
+
+
+class Qbit_Login_Error(Rest_Error):
+    # Raised when qBit cannot be logged into (not reachable, or wrong credentials)
+    pass
+
+
+def is_forbidden(error):
+    # True for calls that qBit refused because the session cookie is missing or no longer valid
+    cause = error.__cause__
+    return (
+        isinstance(cause, requests.HTTPError)
+        and cause.response is not None
+        and cause.response.status_code == 403
+    )
+
+
+class Qbit_Client:
+    def __init__(self, url, username, password):
+        self.url = url  # Including /api/v2
+        self.username = username
+        self.password = password
+        self.cookie = None  # Set once logged in
+        self.login_task = None
+        self.logins = 0
+
+    async def login(self, refused_cookie=None):
+        # Returns the session cookie, logging in if there is none yet, or if it is the one qBit just refused
+        # Concurrent callers share a single login
+        if self.cookie is not None and self.cookie is not refused_cookie:
+            return self.cookie
+        if self.login_task is None or self.login_task.done():
+            self.cookie = None
+            self.login_task = asyncio.ensure_future(self._login())
+        return await asyncio.shield(self.login_task)
+
+    async def _login(self):
+        try:
+            response = await rest_request(
+                "POST",
+                self.url + "/auth/login",
+                data={"username": self.username, "password": self.password},
+                headers=FORM_HEADERS,
+            )
+            if response.text == "Fails.":
+                raise Qbit_Login_Error(
+                    "Login failed. Have you configured QBITTORRENT_USERNAME and QBITTORRENT_PASSWORD correctly?"
+                )
+            response.raise_for_status()
+        except Rest_Error:
+            raise
+        except RequestException as e:
+            raise Qbit_Login_Error(f"Error logging into qBittorrent: {e}") from e
+        self.logins += 1
+        # No cookie is handed out if qBit does not require a login (e.g. for clients on localhost)
+        self.cookie = (
+            {"SID": response.cookies["SID"]} if "SID" in response.cookies else {}
+        )
+        logger.debug("qBit logged in (login #%s)", self.logins)
+        return self.cookie
+
+    async def call(self, send):
+        # Runs send(cookie); if qBit refuses the cookie, logs in again and runs it once more
+        cookie = await self.login()
+        try:
+            return await send(cookie)
+        except Rest_Error as error:
+            if not is_forbidden(error):
+                raise
+        logger.debug("qBit did not accept the session cookie anymore, logging in again")
+        return await send(await self.login(refused_cookie=cookie))
+
+    async def get(self, path, params=None, convert=None):
+        # Returns the parsed json, see rest_get. Raises Rest_Error if the call fails
+        return await self.call(
+            lambda cookie: rest_get(
+                self.url + path, params=params, cookies=cookie, convert=convert
+            )
+        )
+
+    async def post(self, path, data=None):
+        # Like rest_post: not sent on test runs, and errors are logged rather than raised
+        if definitions.settingsDict["TEST_RUN"]:
+            return
+
+        async def send(cookie):
+            try:
+                response = await rest_request(
+                    "POST",
+                    self.url + path,
+                    data=data,
+                    headers=FORM_HEADERS,
+                    cookies=cookie,
+                )
+                response.raise_for_status()
+            except Rest_Error:
+                raise
+            except RequestException as e:
+                raise Rest_Error(
+                    f"Error making API request to {self.url + path}: {e}"
+                ) from e
+
+        try:
+            await self.call(send)
+        except Rest_Error as e:
+            logging.error(
+                f"Error making API request to {self.url + path}: {e.__cause__ or e}"
+            )
+
+
+def get_qbit_client(settingsDict):
+    # Returns None if no qBit is configured. The client (and thus the session) is kept until the qBit settings change
+    global qbit_client
+    if not settingsDict["QBITTORRENT_URL"]:
+        return None
+    credentials = (
+        settingsDict["QBITTORRENT_URL"],
+        settingsDict["QBITTORRENT_USERNAME"],
+        settingsDict["QBITTORRENT_PASSWORD"],
+    )
+    if (
+        qbit_client is None
+        or (qbit_client.url, qbit_client.username, qbit_client.password) != credentials
+    ):
+        qbit_client = Qbit_Client(*credentials)
+    return qbit_client
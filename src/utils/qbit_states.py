@@ -0,0 +1,47 @@
+# Decides from the torrent states in qBit which downloads are stalled, missing metadata or missing files (see QBIT_STATE_DETECTION)
+# The torrents are taken from the snapshot fetched at the start of each run, thus the verdicts are up to date, rather than
+# waiting for the *arr to refresh its queue, and they do not depend on the language of the *arr's messages
+import time
+
+# qBit torrent state -> failType
+STATE_FAIL_TYPES = {
+    "stalledDL": "stalled",
+    "metaDL": "missing metadata",
+    "forcedMetaDL": "missing metadata",
+    "missingFiles": "missing files",
+}
+
+verdicts = (
+    None,
+    None,
+    {},
+)  # (snapshot, inactivity, {downloadId: failType}) of the last snapshot looked at
+
+
+def is_stalled(torrent, now, inactivity):
+    # qBit also reports torrents as stalledDL that are connected to seeds that just do not send anything right now
+    # Only those without seeds, and that did not receive anything since the previous run, are stalled
+    return (
+        torrent.get("num_seeds", 0) == 0
+        and now - torrent.get("last_activity", 0) >= inactivity
+    )
+
+
+def qbit_fail_types(settingsDict, qbit_snapshot, now=None):
+    # Returns {downloadId: failType} for the torrents of the snapshot that are failing
+    # Worked out in one pass over the snapshot, which is then shared by all jobs and instances of the run
+    global verdicts
+    inactivity = settingsDict["REMOVE_TIMER"] * 60
+    snapshot, cached_inactivity, fail_types = verdicts
+    if snapshot is qbit_snapshot and cached_inactivity == inactivity and now is None:
+        return fail_types
+    now = time.time() if now is None else now
+    fail_types = {}
+    for downloadId, torrent in qbit_snapshot.items():
+        failType = STATE_FAIL_TYPES.get(torrent.get("state"))
+        if failType == "stalled" and not is_stalled(torrent, now, inactivity):
+            continue
+        if failType is not None:
+            fail_types[downloadId] = failType
+    verdicts = (qbit_snapshot, inactivity, fail_types)
+    return fail_types
@@ -0,0 +1,117 @@
+# Compact, read-only representation of the *arr queue items
+import sys
+from collections.abc import Mapping
+
+# The fields of a queue record that decluttarr uses; everything else (quality, languages, custom formats, ...) is dropped
+FIELDS = (
+    "id",
+    "downloadId",
+    "title",
+    "status",
+    "trackedDownloadStatus",
+    "trackedDownloadState",
+    "errorMessage",
+    "protocol",
+    "downloadClient",
+    "indexer",
+    "size",
+    "sizeleft",
+    "seriesId",
+    "episodeId",
+    "movieId",
+    "albumId",
+    "bookId",
+)
+# Fields with few distinct values, which are interned so that all items share the same strings
+INTERNED_FIELDS = {
+    "status",
+    "trackedDownloadStatus",
+    "trackedDownloadState",
+    "protocol",
+    "downloadClient",
+    "indexer",
+}
+FIELD_NAMES = frozenset(FIELDS)
+MISSING = object()
+
+
+class QueueItem(Mapping):
+    # Behaves like the (read-only) record dict it was built from, limited to FIELDS and statusMessages
+    # statusMessages are only needed by few jobs, and are thus kept as tuples and turned back into dicts when accessed
+    __slots__ = FIELDS + ("_statusMessages",)
+
+    def __init__(self, record):
+        for field in FIELDS:
+            value = record.get(field, MISSING)
+            if field in INTERNED_FIELDS and type(value) is str:
+                value = sys.intern(value)
+            object.__setattr__(self, field, value)
+        status_messages = record.get("statusMessages", MISSING)
+        if status_messages is not MISSING:
+            status_messages = tuple(
+                (message.get("title"), tuple(message.get("messages") or ()))
+                for message in status_messages
+            )
+        object.__setattr__(self, "_statusMessages", status_messages)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("QueueItem is read-only")
+
+    def __getitem__(self, key):
+        if key in FIELD_NAMES:
+            value = getattr(self, key)
+            if value is not MISSING:
+                return value
+        elif key == "statusMessages" and self._statusMessages is not MISSING:
+            return [
+                {"title": title, "messages": list(messages)}
+                for title, messages in self._statusMessages
+            ]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        # Same as Mapping.get, without the cost of raising and catching a KeyError
+        if key in FIELD_NAMES:
+            value = getattr(self, key)
+            return default if value is MISSING else value
+        return self[key] if key in self else default
+
+    def __contains__(self, key):
+        if key in FIELD_NAMES:
+            return getattr(self, key) is not MISSING
+        return key == "statusMessages" and self._statusMessages is not MISSING
+
+    def status_message_texts(self):
+        # The messages of all statusMessages, without turning them back into dicts
+        if self._statusMessages is not MISSING:
+            for _, messages in self._statusMessages:
+                yield from messages
+
+    def fingerprint(self):
+        # The fields that the detectors depend on; if these are the same as in the previous run, so are the verdicts (see Verdict_Cache)
+        return (
+            self.status,
+            self.trackedDownloadStatus,
+            self.trackedDownloadState,
+            self.errorMessage,
+            self.sizeleft,
+            hash(self._statusMessages),
+        )
+
+    def __iter__(self):
+        for field in FIELDS:
+            if getattr(self, field) is not MISSING:
+                yield field
+        if self._statusMessages is not MISSING:
+            yield "statusMessages"
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+def queue_page(page):
+    # Converts a page of the queue endpoint (as returned by the *arr apps) into QueueItems
+    return page | {"records": [QueueItem(record) for record in page["records"]]}
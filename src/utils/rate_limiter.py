@@ -0,0 +1,95 @@
+# Limits how hard decluttarr hits a single host: a cap on concurrent requests and an optional rate limit
+import asyncio
+import time
+
+
+class Token_Bucket:
+    # Allows `rate` requests per second on average, with bursts of up to `burst` requests
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = max(burst or rate, 1)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = self.clock()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Host_Limiter:
+    # Use as "async with limiter:" around a request. Keeps track of the time spent waiting for the limits
+    def __init__(self, host, max_concurrent, per_second):
+        self.host = host
+        self.max_concurrent = max_concurrent
+        self.per_second = per_second
+        self.loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(max_concurrent) if max_concurrent else None
+        self.bucket = Token_Bucket(per_second) if per_second else None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.requests = 0
+        self.waited = 0.0
+        self.max_wait = 0.0
+
+    async def __aenter__(self):
+        start = time.monotonic()
+        if self.semaphore:
+            await self.semaphore.acquire()
+        if self.bucket:
+            try:
+                await self.bucket.acquire()
+            except BaseException:
+                # E.g. cancelled while waiting for the rate limit: the slot is given back, else the host would have one less for good
+                if self.semaphore:
+                    self.semaphore.release()
+                raise
+        waited = time.monotonic() - start
+        self.requests += 1
+        self.waited += waited
+        self.max_wait = max(self.max_wait, waited)
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.semaphore:
+            self.semaphore.release()
+
+
+host_limiters = {}
+
+
+def get_host_limiter(host, max_concurrent, per_second):
+    # Limiters are bound to the event loop they were created in
+    limiter = host_limiters.get(host)
+    if (
+        limiter is None
+        or limiter.loop is not asyncio.get_running_loop()
+        or (limiter.max_concurrent, limiter.per_second) != (max_concurrent, per_second)
+    ):
+        limiter = host_limiters[host] = Host_Limiter(host, max_concurrent, per_second)
+    return limiter
+
+
+def pop_wait_stats():
+    # Returns the waiting time per host since the last call, and starts counting anew
+    stats = {}
+    for host, limiter in host_limiters.items():
+        if limiter.requests:
+            stats[host] = {
+                "requests": limiter.requests,
+                "waited": limiter.waited,
+                "max_wait": limiter.max_wait,
+            }
+        limiter.reset_stats()
+    return stats
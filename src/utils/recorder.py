@@ -0,0 +1,84 @@
+# Records the API traffic into a compressed trace file, so that real-world cycles can be replayed offline
+import gzip
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Values of these keys never make it into a trace (params, form data and json bodies)
+REDACTED_KEYS = {"apikey", "api_key", "username", "password"}
+# JSON-RPC methods whose params never make it into a trace (Deluge's auth.login takes the password as a param)
+REDACTED_METHOD_PREFIXES = ("auth.",)
+# Response headers that are kept (everything else, including Set-Cookie values, is dropped)
+KEPT_RESPONSE_HEADERS = {"content-type", "etag", "last-modified"}
+REDACTED = "REDACTED"
+
+
+def redact(values):
+    if not isinstance(values, dict):
+        return values
+    redacted = {
+        key: REDACTED if str(key).lower() in REDACTED_KEYS else value
+        for key, value in values.items()
+    }
+    if "params" in redacted and str(values.get("method", "")).startswith(
+        REDACTED_METHOD_PREFIXES
+    ):
+        redacted["params"] = REDACTED
+    return redacted
+
+
+def trace_key(method, url, params=None):
+    # Identifies a request independently of the host it was sent to
+    path = urlsplit(url).path
+    params = sorted((str(key), str(value)) for key, value in (params or {}).items())
+    return method.upper(), path, json.dumps(params)
+
+
+class Traffic_Recorder:
+    # Appends one json line per request/response pair to a gzip file
+    # Each line is a complete gzip member of its own, so that the trace can be read even if decluttarr is killed or
+    # stopped (e.g. by docker stop) without closing anything
+    # Called from the threads of the executor, thus the entries are appended one at a time
+    def __init__(self, path):
+        self.path = path
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, method, url, kwargs, response):
+        headers = {
+            key.lower(): value
+            for key, value in response.headers.items()
+            if key.lower() in KEPT_RESPONSE_HEADERS
+        }
+        if "set-cookie" in {key.lower() for key in response.headers}:
+            headers["set-cookie"] = f"SID={REDACTED}; path=/"
+        entry = {
+            "time": round(time.monotonic() - self.started, 4),
+            "method": method.upper(),
+            "url": url,
+            "params": redact(kwargs.get("params")),
+            "data": redact(kwargs.get("data")),
+            "json": redact(kwargs.get("json")),
+            "status": response.status_code,
+            "headers": headers,
+            "elapsed": response.elapsed.total_seconds() if response.elapsed else None,
+            "body": response.text,
+        }
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self.lock, gzip.open(self.path, "at", encoding="utf-8") as file:
+            file.write(line)
+
+
+def load_trace(path):
+    # Returns the recorded entries in the order they were recorded
+    # If the end of the trace was cut off (the process was killed while writing), the entries before it are returned
+    entries = []
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                if line.endswith("\n") and line.strip():
+                    entries.append(json.loads(line))
+        except EOFError:
+            pass
+    return entries
@@ -1,57 +1,358 @@
 ########### Functions to call radarr/sonarr APIs
 import logging
 import asyncio
+import random
+import http.cookiejar
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 import json
-from config.definitions import settingsDict
+import re
+import time
+from urllib.parse import urlsplit
+from config import definitions
+from src.utils.circuit_breaker import get_circuit_breaker
+from src.utils.http_cache import Response_Cache, copy_result
+from src.utils.json_decoder import get_decoder
+from src.utils.json_stream import Json_Stream
+from src.utils.rate_limiter import get_host_limiter
+
+POOL_SIZE = 32  # keep-alive connections per host (as many as the executor has threads)
+
+
+def new_session():
+    # All instances share one session, and thus one pool of connections per host
+    # The session does not keep cookies: they are passed with each call (e.g. the qBit cookie, which the qBit client keeps)
+    session = requests.Session()
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Sends the actual request. Replaced by the replay driver to serve recorded responses instead
+session = new_session()
+transport = session.request
+recorder = None
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+RETRY_STATUS_CODES = {502, 503, 504}
+DOWNLOAD_CLIENT_SETTINGS = [
+    "QBITTORRENT",
+    "TRANSMISSION",
+    "DELUGE",
+    "SABNZBD",
+    "NZBGET",
+]  # Names of the settings of the download clients (e.g. QBITTORRENT_URL)
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_CAP = 10  # seconds
+
+# Identical GETs that are in flight share one request; their results may be kept for a while (see RESULT_TTL)
+in_flight = {}
+result_cache = {}
+API_PREFIX = re.compile(r"^.*?/api/v\d+/")
+# Responses with validators, re-requested conditionally (see HTTP_CACHE_SIZE)
+response_cache = None
+# Larger responses are decoded in the executor, so that the event loop can carry on meanwhile
+LARGE_RESPONSE = 256 * 1024  # bytes
+STREAM_CHUNK_SIZE = 64 * 1024  # bytes
+
+
+class Rest_Error(Exception):
+    # Raised when an API call fails (after retries)
+    pass
+
+
+class Circuit_Open_Error(Rest_Error):
+    # Raised without sending the request, while a host is skipped after repeated failures
+    def __init__(self, host, retry_in):
+        self.host = host
+        self.retry_in = retry_in
+        super().__init__(
+            f"{host} failed repeatedly and is skipped for another {round(retry_in)} seconds"
+        )
+
+
+def backoff_delay(attempt):
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+
+
+def limits_for_host(host):
+    # Returns (max concurrent requests, requests per second) for a host, using the overrides in REQUEST_LIMITS of the instance it belongs to
+    settingsDict = definitions.settingsDict
+    limits = {}
+    for instance in [*settingsDict["INSTANCES"], *DOWNLOAD_CLIENT_SETTINGS]:
+        if (
+            settingsDict.get(instance + "_URL")
+            and urlsplit(settingsDict[instance + "_URL"]).netloc == host
+        ):
+            # Limits of an instance, else of its arr type
+            limits = settingsDict["REQUEST_LIMITS"].get(
+                instance,
+                settingsDict["REQUEST_LIMITS"].get(
+                    settingsDict.get(instance + "_TYPE"), {}
+                ),
+            )
+            break
+    return (
+        limits.get("MAX_CONCURRENT", settingsDict["MAX_CONCURRENT_REQUESTS"]),
+        limits.get("PER_SECOND", settingsDict["REQUESTS_PER_SECOND"]),
+    )
+
+
+# Any request
+async def rest_request(method, url, **kwargs):
+    # Sends a request in the executor and returns the raw response (all API calls go through here)
+    # Idempotent calls are retried on connection problems and gateway errors. Hosts that keep failing are skipped for a while
+    # Concurrent requests (and optionally requests per second) are limited per host, see REQUEST_LIMITS
+    global recorder
+    # The current settings (replaced as a whole when the config file changes)
+    settingsDict = definitions.settingsDict
+    host = urlsplit(url).netloc
+    circuit_breaker = get_circuit_breaker(
+        host,
+        settingsDict["CIRCUIT_BREAKER_THRESHOLD"],
+        settingsDict["CIRCUIT_BREAKER_COOLDOWN"],
+    )
+    kwargs.setdefault(
+        "timeout", (settingsDict["CONNECT_TIMEOUT"], settingsDict["READ_TIMEOUT"])
+    )
+    attempts = 1 + (
+        settingsDict["MAX_RETRIES"] if method.upper() in IDEMPOTENT_METHODS else 0
+    )
+    if settingsDict.get("RECORD_TRAFFIC") and recorder is None:
+        # Only needed when recording
+        from src.utils.recorder import Traffic_Recorder
+
+        recorder = Traffic_Recorder(settingsDict["RECORD_TRAFFIC"])
+
+    def send():
+        # Runs in the executor; so does the recording, which reads the whole body (also of streamed responses) and writes it
+        response = transport(
+            method, url, verify=settingsDict["SSL_VERIFICATION"], **kwargs
+        )
+        if settingsDict.get("RECORD_TRAFFIC"):
+            recorder.record(method, url, kwargs, response)
+        return response
+
+    for attempt in range(attempts):
+        retry_in = circuit_breaker.acquire()
+        if retry_in is not None:
+            raise Circuit_Open_Error(host, retry_in)
+        try:
+            async with get_host_limiter(host, *limits_for_host(host)):
+                response = await asyncio.get_event_loop().run_in_executor(None, send)
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        ) as error:
+            circuit_breaker.record_failure()
+            if attempt == attempts - 1:
+                raise
+            logging.debug(f"Retrying {method} {url} after error: {error}")
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        except asyncio.CancelledError:
+            # Says nothing about the host, but the trial slot (if this was the trial request) must not stay taken
+            circuit_breaker.release_trial()
+            raise
+        except BaseException:
+            # Any other error while sending counts as a failure, which also ends a trial
+            circuit_breaker.record_failure()
+            raise
+
+        if response.status_code in RETRY_STATUS_CODES:
+            circuit_breaker.record_failure()
+        else:
+            circuit_breaker.record_success()
+        if response.status_code in RETRY_STATUS_CODES and attempt < attempts - 1:
+            logging.debug(
+                f"Retrying {method} {url} after status {response.status_code}"
+            )
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        return response
 
 
 # GET
-async def rest_get(url, api_key=None, params=None, cookies=None):
+def endpoint_class(url):
+    # Groups urls such as http://sonarr:8989/api/v3/episode/123 into "episode/{id}"
+    path = API_PREFIX.sub("", urlsplit(url).path.rstrip("/") + "/", count=1).strip("/")
+    return "/".join("{id}" if part.isdigit() else part for part in path.split("/"))
+
+
+async def rest_get(url, api_key=None, params=None, cookies=None, convert=None):
+    # Returns the parsed json (or the text, for plain-text endpoints such as qBit's /app/version)
+    # If given, convert is applied to the parsed json once, before it is shared or cached (e.g. to project it into compact records)
+    # Raises Rest_Error if the call fails, rather than handing the callers something they cannot use
+    # Concurrent identical calls (url, params and credentials) share a single request and its result; thus callers must not modify what is returned
+    key = (
+        url,
+        json.dumps(params or {}, sort_keys=True, default=str),
+        api_key,
+        json.dumps(cookies or {}, sort_keys=True, default=str),
+        convert,
+    )
+    ttl = definitions.settingsDict["RESULT_TTL"].get(endpoint_class(url), 0)
+    if ttl and key in result_cache:
+        expires, result = result_cache[key]
+        if expires > time.monotonic():
+            return copy_result(result)
+        del result_cache[key]
+    if key not in in_flight:
+        shared = in_flight[key] = asyncio.ensure_future(
+            fetch_shared(url, api_key, params, cookies, key, convert, ttl)
+        )
+        # Marks the exception as retrieved, in case all callers were cancelled meanwhile
+        shared.add_done_callback(
+            lambda shared: shared.cancelled() or shared.exception()
+        )
+    # Shielded, so that a caller being cancelled (even the one that started the request) does not cancel it for everybody else
+    return await asyncio.shield(in_flight[key])
+
+
+async def fetch_shared(url, api_key, params, cookies, key, convert, ttl):
+    # Runs as a task of its own, shared by all identical calls while it is in flight
+    try:
+        result = await fetch_json(url, api_key, params, cookies, key, convert)
+        if ttl:
+            store_result(key, result, ttl)
+        return result
+    finally:
+        del in_flight[key]
+
+
+def store_result(key, result, ttl):
+    # Expired results are dropped whenever a result is stored, else those of calls that are not repeated (e.g. for
+    # changing ids) would be kept for as long as decluttarr runs
+    now = time.monotonic()
+    for expired in [
+        other for other, (expires, _) in result_cache.items() if expires <= now
+    ]:
+        del result_cache[expired]
+    result_cache[key] = (now + ttl, copy_result(result))
+
+
+def get_response_cache():
+    # Returns None if the cache is turned off
+    global response_cache
+    max_bytes = int(definitions.settingsDict["HTTP_CACHE_SIZE"] * 1024 * 1024)
+    if not max_bytes:
+        return None
+    if response_cache is None or response_cache.max_bytes != max_bytes:
+        response_cache = Response_Cache(max_bytes)
+    return response_cache
+
+
+async def fetch_json(url, api_key, params, cookies, key, convert):
+    # Sends the GET, conditionally if an earlier response came with an ETag or Last-Modified header
+    cache = get_response_cache()
+    entry = cache.get(key) if cache else None
+    headers = {"X-Api-Key": api_key} if api_key else {}
+    if entry is not None:
+        headers.update(entry.conditional_headers())
     try:
-        headers = {"X-Api-Key": api_key} if api_key else None
-        response = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: requests.get(
-                url,
-                params=params,
-                headers=headers,
-                cookies=cookies,
-                verify=settingsDict["SSL_VERIFICATION"],
-            ),
+        response = await rest_request(
+            "GET", url, params=params, headers=headers or None, cookies=cookies
         )
+        if response.status_code == 304 and entry is not None:
+            cache.count(endpoint_class(url), True, entry.size)
+            return copy_result(entry.result)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        print("HTTP Error:", e)
+    except Rest_Error:
+        raise
     except RequestException as e:
-        return response.text
-    except ValueError as e:
-        logging.error(f"Error parsing JSON response from {url}: {e}")
-        return None
+        raise Rest_Error(f"Error making API request to {url}: {e}") from e
+    if len(response.content) > LARGE_RESPONSE:
+        result = await asyncio.get_event_loop().run_in_executor(
+            None, decode_response, response, convert
+        )
+    else:
+        result = decode_response(response, convert)
+    if cache:
+        cache.count(endpoint_class(url), False)
+        cache.store(key, response, result)
+    return result
+
+
+def decode_json(response):
+    # Decodes the json of a response with the decoder chosen by JSON_DECODER (all responses are decoded this way)
+    # Raises ValueError if the body is not json, whichever decoder is used
+    _, decode, decode_errors = get_decoder(definitions.settingsDict["JSON_DECODER"])
+    try:
+        return decode(response.content)
+    except decode_errors as e:
+        raise ValueError(f"Invalid json in response: {e}") from e
+
+
+def decode_response(response, convert=None):
+    # Returns the decoded json (or the text, for plain-text endpoints such as qBit's /app/version), passed through convert
+    try:
+        result = decode_json(response)
+    except ValueError:
+        result = response.text
+    return convert(result) if convert else result
+
+
+async def rest_get_stream(
+    url, api_key=None, params=None, handle_record=None, limit=None
+):
+    # Reads a paged *arr response in chunks, decoding its records one by one (see STREAM_RECORDS)
+    # Each record is passed through handle_record, which returns what to keep (or None to drop the record)
+    # Stops reading once limit records are kept. Returns the page (without its records) and the kept records
+    # Streamed calls are neither shared with identical calls nor cached, since that would keep the records in memory
+    headers = {"X-Api-Key": api_key} if api_key else None
+    try:
+        response = await rest_request(
+            "GET", url, params=params, headers=headers, stream=True
+        )
+    except Rest_Error:
+        raise
+    except RequestException as e:
+        raise Rest_Error(f"Error making API request to {url}: {e}") from e
+    # Closed in any case, else the connection would not go back into the pool
+    try:
+        try:
+            response.raise_for_status()
+        except RequestException as e:
+            raise Rest_Error(f"Error making API request to {url}: {e}") from e
+        try:
+            return await asyncio.get_event_loop().run_in_executor(
+                None, read_records, response, handle_record, limit
+            )
+        except (RequestException, ValueError) as e:
+            raise Rest_Error(f"Error reading API response from {url}: {e}") from e
+    finally:
+        response.close()
+
+
+def read_records(response, handle_record=None, limit=None):
+    page = {}
+    records = []
+    for record in Json_Stream(response.iter_content(STREAM_CHUNK_SIZE)).records(page):
+        if handle_record:
+            record = handle_record(record)
+        if record is not None:
+            records.append(record)
+            if limit and len(records) >= limit:
+                break
+    return page, records
 
 
 # DELETE
 async def rest_delete(url, api_key, params=None):
-    if settingsDict["TEST_RUN"]:
+    if definitions.settingsDict["TEST_RUN"]:
         return
     try:
         headers = {"X-Api-Key": api_key}
-        response = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: requests.delete(
-                url,
-                params=params,
-                headers=headers,
-                verify=settingsDict["SSL_VERIFICATION"],
-            ),
-        )
+        response = await rest_request("DELETE", url, params=params, headers=headers)
         response.raise_for_status()
         if response.status_code in [200, 204]:
             return None
-        return response.json()
-    except RequestException as e:
+        return decode_json(response)
+    except (RequestException, Rest_Error) as e:
         logging.error(f"Error making API request to {url}: {e}")
         return None
     except ValueError as e:
@@ -61,25 +362,17 @@ async def rest_delete(url, api_key, params=None):
 
 # POST
 async def rest_post(url, data=None, json=None, headers=None, cookies=None):
-    if settingsDict["TEST_RUN"]:
+    if definitions.settingsDict["TEST_RUN"]:
         return
     try:
-        response = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: requests.post(
-                url,
-                data=data,
-                json=json,
-                headers=headers,
-                cookies=cookies,
-                verify=settingsDict["SSL_VERIFICATION"],
-            ),
+        response = await rest_request(
+            "POST", url, data=data, json=json, headers=headers, cookies=cookies
         )
         response.raise_for_status()
         if response.status_code in (200, 201):
             return None
-        return response.json()
-    except RequestException as e:
+        return decode_json(response)
+    except (RequestException, Rest_Error) as e:
         logging.error(f"Error making API request to {url}: {e}")
         return None
     except ValueError as e:
@@ -89,19 +382,14 @@ async def rest_post(url, data=None, json=None, headers=None, cookies=None):
 
 # PUT
 async def rest_put(url, api_key, data):
-    if settingsDict["TEST_RUN"]:
+    if definitions.settingsDict["TEST_RUN"]:
         return
     try:
         headers = {"X-Api-Key": api_key} | {"content-type": "application/json"}
-        response = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: requests.put(
-                url, data=data, headers=headers, verify=settingsDict["SSL_VERIFICATION"]
-            ),
-        )
+        response = await rest_request("PUT", url, data=data, headers=headers)
         response.raise_for_status()
-        return response.json()
-    except RequestException as e:
+        return decode_json(response)
+    except (RequestException, Rest_Error) as e:
         logging.error(f"Error making API request to {url}: {e}")
         return None
     except ValueError as e:
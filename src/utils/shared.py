@@ -1,36 +1,198 @@
 # Shared Functions
 import logging, verboselogs
 import asyncio
+import functools
+import time
 import requests
+
 logger = verboselogs.VerboseLogger(__name__)
-from src.utils.rest import rest_get, rest_delete, rest_post
+from src.utils.rest import (
+    decode_json,
+    rest_request,
+    rest_get,
+    rest_get_stream,
+    rest_delete,
+    rest_post,
+    Rest_Error,
+)
+from src.utils.qbit_client import get_qbit_client
+from src.utils.log_pipeline import log_context
 from src.utils.nest_functions import add_keys_nested_dict, nested_get
+from src.utils.queue_item import QueueItem
 import sys, os, traceback
 
+REFRESH_COMMAND = "RefreshMonitoredDownloads"
+COMMAND_PENDING = {
+    "queued",
+    "started",
+}  # Statuses of *arr commands that are not done yet
+REFRESH_POLL_DELAY = 0.25  # Seconds until the status of the refresh is first checked; doubled after each check
+REFRESH_MAX_POLL_DELAY = 2
+STREAM_PAGE_SIZE = 1000  # Records per request when streaming (see STREAM_RECORDS); bounds how much of a response is read at once
+
+cleaning_failures = 0  # Jobs that failed since the last call of pop_cleaning_failures (see errorDetails)
+
 
-async def get_arr_records(BASE_URL, API_KEY, params={}, end_point=""):
-    # All records from a given endpoint
+async def get_arr_records(
+    BASE_URL,
+    API_KEY,
+    params={},
+    end_point="",
+    record_type=None,
+    keep=None,
+    limit=None,
+    stream=False,
+):
+    # All records from a given endpoint, turned into record_type (e.g. QueueItem) if given
+    # Only records for which keep returns True are returned, and at most limit of them
+    # With stream (see STREAM_RECORDS), the records are read page by page, and decoded, converted and filtered one by one while each page is read
+    if stream:
+        return await get_arr_records_streamed(
+            BASE_URL, API_KEY, params, end_point, record_type, keep, limit
+        )
     record_count = (await rest_get(f"{BASE_URL}/{end_point}", API_KEY, params))[
         "totalRecords"
     ]
     if record_count == 0:
         return []
-    records = await rest_get(
-        f"{BASE_URL}/{end_point}",
-        API_KEY,
-        {"page": "1", "pageSize": record_count} | params,
-    )
-    return records["records"]
+    params = {"page": "1", "pageSize": record_count} | params
+    records = (
+        await rest_get(
+            f"{BASE_URL}/{end_point}",
+            API_KEY,
+            params,
+            convert=page_converter(record_type) if record_type else None,
+        )
+    )["records"]
+    if keep:
+        records = [record for record in records if keep(record)]
+    return records[:limit] if limit else records
+
+
+async def get_arr_records_streamed(
+    BASE_URL, API_KEY, params, end_point, record_type=None, keep=None, limit=None
+):
+    # Requests STREAM_PAGE_SIZE records at a time, so that neither the *arr nor decluttarr has to handle the whole list in one response
+    # Stops once limit records are kept, without requesting the remaining pages
+    # If the list changes between two pages, records can move from one page to the next: those read twice are dropped, and
+    # those that were skipped are picked up in the next run
+    url = f"{BASE_URL}/{end_point}"
+    seen_ids = set()
+    records = []
+    new_records = 0
+
+    def handle_record(record):
+        nonlocal new_records
+        record_id = record.get("id")
+        if record_id is not None:
+            if record_id in seen_ids:
+                return None
+            seen_ids.add(record_id)
+        new_records += 1
+        if record_type:
+            record = record_type(record)
+        return record if keep is None or keep(record) else None
+
+    page_number = 1
+    while True:
+        new_records = 0
+        page, kept = await rest_get_stream(
+            url,
+            API_KEY,
+            params | {"page": str(page_number), "pageSize": STREAM_PAGE_SIZE},
+            handle_record,
+            limit - len(records) if limit else None,
+        )
+        records += kept
+        if (
+            (limit and len(records) >= limit)
+            or not new_records
+            or page_number * STREAM_PAGE_SIZE >= page.get("totalRecords", 0)
+        ):
+            return records
+        page_number += 1
+
+
+@functools.cache
+def page_converter(record_type):
+    # Converts the records of a page into record_type before the page is shared or cached by rest_get (one function per type, so that identical calls still match)
+    def convert(page):
+        return page | {"records": [record_type(record) for record in page["records"]]}
+
+    return convert
+
+
+async def refresh_monitored_downloads(BASE_URL, API_KEY, settingsDict):
+    # Has the *arr update its queue from the download clients, and waits until it is done (up to REFRESH_TIMEOUT), so that the queue read afterwards is up to date
+    # Called once per instance and run. If a refresh is queued or running already (e.g. started by the *arr itself), waits for that one instead of queuing another
+    # Failures are logged; the queue is then read as it is
+    try:
+        commands = await rest_get(BASE_URL + "/command", API_KEY)
+        command = next(
+            (
+                command
+                for command in commands
+                if command.get("name") == REFRESH_COMMAND
+                and command.get("status") in COMMAND_PENDING
+            ),
+            None,
+        )
+        if command is None:
+            if settingsDict["TEST_RUN"]:
+                return
+            response = await rest_request(
+                "POST",
+                BASE_URL + "/command",
+                json={"name": REFRESH_COMMAND},
+                headers={"X-Api-Key": API_KEY},
+            )
+            response.raise_for_status()
+            command = decode_json(response)
+        else:
+            logger.debug(
+                "%s is %s already on %s, waiting for it",
+                REFRESH_COMMAND,
+                command["status"],
+                BASE_URL,
+            )
+        # Polled with increasing delays, as most refreshes are done within a second
+        deadline = time.monotonic() + settingsDict["REFRESH_TIMEOUT"]
+        delay = REFRESH_POLL_DELAY
+        while command.get("status") in COMMAND_PENDING:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.debug(
+                    "%s not done after %ss on %s, reading the queue anyway",
+                    REFRESH_COMMAND,
+                    settingsDict["REFRESH_TIMEOUT"],
+                    BASE_URL,
+                )
+                return
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, REFRESH_MAX_POLL_DELAY)
+            command = await rest_get(f"{BASE_URL}/command/{command['id']}", API_KEY)
+    except (
+        Rest_Error,
+        requests.RequestException,
+        ValueError,
+        KeyError,
+        AttributeError,
+    ) as error:
+        logger.warning(
+            "%s could not be sent to %s: %s", REFRESH_COMMAND, BASE_URL, error
+        )
 
 
 async def get_queue(BASE_URL, API_KEY, settingsDict, params={}):
-    # Refreshes and retrieves the current queue
-    await rest_post(
-        url=BASE_URL + "/command",
-        json={"name": "RefreshMonitoredDownloads"},
-        headers={"X-Api-Key": API_KEY},
+    # Retrieves the current queue (as compact QueueItems). It is refreshed once per run beforehand, see refresh_monitored_downloads
+    queue = await get_arr_records(
+        BASE_URL,
+        API_KEY,
+        params=params,
+        end_point="queue",
+        record_type=QueueItem,
+        stream=settingsDict["STREAM_RECORDS"],
     )
-    queue = await get_arr_records(BASE_URL, API_KEY, params=params, end_point="queue")
     queue = filterOutDelayedQueueItems(queue)
     queue = filterOutIgnoredDownloadClients(queue, settingsDict)
     return queue
@@ -85,17 +247,24 @@ def filterOutIgnoredDownloadClients(queue, settingsDict):
 
 def privateTrackerCheck(settingsDict, affectedItems, failType, privateDowloadIDs):
     # Ignores private tracker items (if setting is turned on)
+    # Removed in one go at the end (list.remove compares the items one by one)
+    removedItems = set()
     for affectedItem in reversed(affectedItems):
         if (
             settingsDict["IGNORE_PRIVATE_TRACKERS"]
             and affectedItem["downloadId"] in privateDowloadIDs
         ):
-            affectedItems.remove(affectedItem)
-    return affectedItems
+            removedItems.add(id(affectedItem))
+    return [
+        affectedItem
+        for affectedItem in affectedItems
+        if id(affectedItem) not in removedItems
+    ]
 
 
 def protectedDownloadCheck(settingsDict, affectedItems, failType, protectedDownloadIDs):
     # Checks if torrent is protected and skips
+    removedItems = set()
     for affectedItem in reversed(affectedItems):
         if affectedItem["downloadId"] in protectedDownloadIDs:
             logger.verbose(
@@ -109,8 +278,12 @@ def protectedDownloadCheck(settingsDict, affectedItems, failType, protectedDownl
                 affectedItem["title"],
                 affectedItem["downloadId"],
             )
-            affectedItems.remove(affectedItem)
-    return affectedItems
+            removedItems.add(id(affectedItem))
+    return [
+        affectedItem
+        for affectedItem in affectedItems
+        if id(affectedItem) not in removedItems
+    ]
 
 
 async def execute_checks(
@@ -133,13 +306,16 @@ async def execute_checks(
     # Goes over the affected items and performs the checks that are parametrized
     try:
         # De-duplicates the affected items (one downloadid may be shared by multiple affected items)
-        downloadIDs = []
+        downloadIDs = set()
+        uniqueItems = []
         for affectedItem in reversed(affectedItems):
             if affectedItem["downloadId"] not in downloadIDs:
-                downloadIDs.append(affectedItem["downloadId"])
-            else:
-                affectedItems.remove(affectedItem)
-        # Skips protected items
+                downloadIDs.add(affectedItem["downloadId"])
+                uniqueItems.append(affectedItem)
+        affectedItems = uniqueItems[::-1]
+        # Skips protected items (looked up for every affected item, thus as sets)
+        privateDowloadIDs = set(privateDowloadIDs)
+        protectedDownloadIDs = set(protectedDownloadIDs)
         if doPrivateTrackerCheck:
             affectedItems = privateTrackerCheck(
                 settingsDict, affectedItems, failType, privateDowloadIDs
@@ -155,6 +331,7 @@ async def execute_checks(
             )
 
         # Deletes all downloads that have not survived the checks
+        removals = []
         for affectedItem in affectedItems:
             # Checks whether when removing the queue item from the *arr app the torrent should be kept
             removeFromClient = True
@@ -166,16 +343,20 @@ async def execute_checks(
                     removeFromClient = False
 
             # Removes the queue item
-            await remove_download(
-                settingsDict,
-                BASE_URL,
-                API_KEY,
-                affectedItem,
-                failType,
-                addToBlocklist,
-                deleted_downloads,
-                removeFromClient,
+            removals.append(
+                remove_download(
+                    settingsDict,
+                    BASE_URL,
+                    API_KEY,
+                    affectedItem,
+                    failType,
+                    addToBlocklist,
+                    deleted_downloads,
+                    removeFromClient,
+                )
             )
+        # Sent concurrently (rest layer limits the requests per host)
+        await asyncio.gather(*removals)
         # Exit Logs
         if settingsDict["LOG_LEVEL"] == "DEBUG":
             queue = await get_queue(BASE_URL, API_KEY, settingsDict)
@@ -205,7 +386,7 @@ def permittedAttemptsCheck(
     )
 
     # 2. Check if those that were previously defective are no longer defective -> those are recovered
-    affectedDownloadIDs = [affectedItem["downloadId"] for affectedItem in affectedItems]
+    affectedDownloadIDs = {affectedItem["downloadId"] for affectedItem in affectedItems}
     try:
         recoveredDownloadIDs = [
             trackedDownloadIDs
@@ -230,6 +411,7 @@ def permittedAttemptsCheck(
     )
 
     # 3. For those that are defective, add attempt + 1 if present before, or make attempt = 1.
+    removedItems = set()
     for affectedItem in reversed(affectedItems):
         try:
             defective_tracker.dict[BASE_URL][failType][affectedItem["downloadId"]][
@@ -260,7 +442,7 @@ def permittedAttemptsCheck(
                 str(settingsDict["PERMITTED_ATTEMPTS"]),
                 affectedItem["title"],
             )
-            affectedItems.remove(affectedItem)
+            removedItems.add(id(affectedItem))
         if attempts_left <= -1:  # Too many attempts
             logger.info(
                 ">>> Detected %s download too many times (%s out of %s permitted times): %s",
@@ -285,7 +467,11 @@ def permittedAttemptsCheck(
         "permittedAttemptsCheck/defective_tracker.dict OUT: %s",
         str(defective_tracker.dict),
     )
-    return affectedItems
+    return [
+        affectedItem
+        for affectedItem in affectedItems
+        if id(affectedItem) not in removedItems
+    ]
 
 
 async def remove_download(
@@ -299,42 +485,60 @@ async def remove_download(
     removeFromClient,
 ):
     # Removes downloads and creates log entry
-    logger.debug(
-        "remove_download/deleted_downloads.dict IN: %s", str(deleted_downloads.dict)
-    )
-    if affectedItem["downloadId"] not in deleted_downloads.dict:
-        # "schizophrenic" removal:
-        # Yes, the failed imports are removed from the -arr apps (so the removal kicks still in)
-        # But in the torrent client they are kept
-        if removeFromClient:
-            logger.info(">>> Removing %s download: %s", failType, affectedItem["title"])
-        else:
-            logger.info(
-                ">>> Removing %s download (without removing from torrent client): %s",
-                failType,
-                affectedItem["title"],
-            )
-
-        # Print out detailed removal messages (if any were added in the jobs)
-        if "removal_messages" in affectedItem:
-            for removal_message in affectedItem["removal_messages"]:
-                logger.info(removal_message)
+    with log_context(failType=failType, downloadId=affectedItem["downloadId"]):
+        logger.debug(
+            "remove_download/deleted_downloads.dict IN: %s", str(deleted_downloads.dict)
+        )
+        if affectedItem["downloadId"] not in deleted_downloads.dict:
+            # "schizophrenic" removal:
+            # Yes, the failed imports are removed from the -arr apps (so the removal kicks still in)
+            # But in the torrent client they are kept
+            if removeFromClient:
+                logger.info(
+                    ">>> Removing %s download: %s", failType, affectedItem["title"]
+                )
+            else:
+                logger.info(
+                    ">>> Removing %s download (without removing from torrent client): %s",
+                    failType,
+                    affectedItem["title"],
+                )
 
-        if not settingsDict["TEST_RUN"]:
-            await rest_delete(
-                f'{BASE_URL}/queue/{affectedItem["id"]}',
-                API_KEY,
-                {"removeFromClient": removeFromClient, "blocklist": addToBlocklist},
-            )
-        deleted_downloads.dict.append(affectedItem["downloadId"])
+            # Print out detailed removal messages (if any were added in the jobs)
+            if "removal_messages" in affectedItem:
+                for removal_message in affectedItem["removal_messages"]:
+                    logger.info(removal_message)
+
+            # Marked before the (awaited) delete, so that concurrent removals never delete the same download twice
+            deleted_downloads.dict.append(affectedItem["downloadId"])
+            if not settingsDict["TEST_RUN"]:
+                await rest_delete(
+                    f'{BASE_URL}/queue/{affectedItem["id"]}',
+                    API_KEY,
+                    {"removeFromClient": removeFromClient, "blocklist": addToBlocklist},
+                )
 
-    logger.debug(
-        "remove_download/deleted_downloads.dict OUT: %s", str(deleted_downloads.dict)
-    )
+        logger.debug(
+            "remove_download/deleted_downloads.dict OUT: %s",
+            str(deleted_downloads.dict),
+        )
     return
 
 
+def pop_cleaning_failures():
+    # Returns how many jobs failed since the last call (i.e. during the run), and resets the count
+    global cleaning_failures
+    failures, cleaning_failures = cleaning_failures, 0
+    return failures
+
+
 def errorDetails(NAME, error):
+    global cleaning_failures
+    cleaning_failures += 1
+    if isinstance(error, Rest_Error):
+        # Failed API calls are expected from time to time (instance down, timeouts) - no need for a stack trace
+        logger.warning(">>> Queue cleaning failed on %s. (%s)", NAME, error)
+        return
     exc_type, exc_obj, exc_tb = sys.exc_info()
     fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
     logger.warning(
@@ -347,33 +551,45 @@ def errorDetails(NAME, error):
     return
 
 
+class Formatted_Queue_Info:
+    # The queue as logged at debug level by every job. Only formatted if the record is actually written
+    __slots__ = ("queue",)
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __str__(self):
+        return str(formatQueueInfo(self.queue))
+
+
 def formattedQueueInfo(queue):
+    return Formatted_Queue_Info(queue)
+
+
+def formatQueueInfo(queue):
     try:
         # Returns queueID, title, and downloadID
         if not queue:
             return "empty"
-        formatted_list = []
+        formatted_entries = {}
         for queue_item in queue:
             download_id = queue_item["downloadId"]
             title = queue_item["title"]
             item_id = queue_item["id"]
             # Check if there is an entry with the same download_id and title
-            existing_entry = next(
-                (item for item in formatted_list if item["downloadId"] == download_id),
-                None,
-            )
+            existing_entry = formatted_entries.get(download_id)
             if existing_entry:
                 existing_entry["IDs"].append(item_id)
             else:
-                new_entry = {
+                formatted_entries[download_id] = {
                     "downloadId": download_id,
                     "downloadTitle": title,
                     "IDs": [item_id],
                 }
-                formatted_list.append(new_entry)
-        return formatted_list
+        return list(formatted_entries.values())
     except Exception as error:
-        errorDetails("formattedQueueInfo", error)
+        # Only used in the debug log, thus not counted as a failed clean-up (see errorDetails)
+        logger.warning("Queue could not be formatted for the log: %r", error)
         logger.debug("formattedQueueInfo/queue for debug: %s", str(queue))
         if isinstance(error, KeyError):
             logger.debug(
@@ -385,12 +601,18 @@ def formattedQueueInfo(queue):
 
 async def qBitOffline(settingsDict, failType, NAME):
     if settingsDict["QBITTORRENT_URL"]:
-        qBitConnectionStatus = (
-            await rest_get(
-                settingsDict["QBITTORRENT_URL"] + "/sync/maindata",
-                cookies=settingsDict["QBIT_COOKIE"],
+        try:
+            qBitConnectionStatus = (
+                await get_qbit_client(settingsDict).get("/sync/maindata")
+            )["server_state"]["connection_status"]
+        except Rest_Error as error:
+            logger.warning(
+                ">>> qBittorrent is not reachable. Skipping %s queue cleaning on %s. (%s)",
+                failType,
+                NAME,
+                error,
             )
-        )["server_state"]["connection_status"]
+            return True
         if qBitConnectionStatus == "disconnected":
             logger.warning(
                 ">>> qBittorrent is disconnected. Skipping %s queue cleaning failed on %s.",
@@ -399,18 +621,3 @@ async def qBitOffline(settingsDict, failType, NAME):
             )
             return True
     return False
-
-async def qBitRefreshCookie(settingsDict):
-    try: 
-        response = await asyncio.get_event_loop().run_in_executor(None, lambda: requests.post(settingsDict['QBITTORRENT_URL']+'/auth/login', data={'username': settingsDict['QBITTORRENT_USERNAME'], 'password': settingsDict['QBITTORRENT_PASSWORD']}, headers={'content-type': 'application/x-www-form-urlencoded'}, verify=settingsDict['SSL_VERIFICATION']))
-        if response.text == 'Fails.':
-            raise ConnectionError('Login failed.')
-        response.raise_for_status()
-        settingsDict['QBIT_COOKIE'] = {'SID': response.cookies['SID']} 
-        logger.debug('qBit cookie refreshed!')
-    except Exception as error:
-        logger.error('!! %s Error: !!', 'qBittorrent')
-        logger.error('> %s', error)
-        logger.error('> Details:')
-        logger.error(response.text)
-        settingsDict['QBIT_COOKIE'] = {}
\ No newline at end of file
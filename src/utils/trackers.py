@@ -1,4 +1,11 @@
 # Set up classes that allow tracking of items from one loop to the next
+import json
+import os
+import logging, verboselogs
+
+logger = verboselogs.VerboseLogger(__name__)
+
+
 class Defective_Tracker:
     # Keeps track of which downloads were already caught as stalled previously
     def __init__(self, dict):
@@ -15,3 +22,45 @@ class Deleted_Downloads:
     # Keeps track of which downloads have already been deleted (to not double-delete)
     def __init__(self, dict):
         self.dict = dict
+
+
+# The trackers can be kept in a file (see TRACKER_STATE_FILE), so that they survive a restart, and so that runs in RUN_ONCE mode continue where the previous one stopped
+def load_tracker_state(path):
+    # Returns the tracker dictionaries saved by save_tracker_state, or empty ones if there is no (readable) file
+    state = {"defective": {}, "download_sizes": {}}
+    if not path:
+        return state
+    try:
+        with open(path, encoding="utf-8") as file:
+            saved = json.load(file)
+        for key in state:
+            if isinstance(saved.get(key), dict):
+                state[key] = saved[key]
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, AttributeError) as error:
+        logger.warning(
+            "Tracker state could not be read from %s, starting without it: %s",
+            path,
+            error,
+        )
+    return state
+
+
+def save_tracker_state(path, defective_tracker, download_sizes_tracker):
+    # Writes the trackers to a file next to the target first, and then replaces the target, so that a crash never leaves a half-written file
+    if not path:
+        return
+    state = {
+        "defective": defective_tracker.dict,
+        "download_sizes": download_sizes_tracker.dict,
+    }
+    try:
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+    except (OSError, TypeError, ValueError) as error:
+        logger.warning("Tracker state could not be written to %s: %s", path, error)
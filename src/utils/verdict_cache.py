@@ -0,0 +1,70 @@
+# Keeps the verdicts of the detectors per queue item from one run to the next
+# On a quiet instance the queue hardly changes between runs; an item is only looked at again if it is new, or if one of the
+# fields that the detectors depend on changed (see QueueItem.fingerprint)
+# Only the detection is skipped: the checks that depend on time (e.g. PERMITTED_ATTEMPTS) still run on the affected items each run
+from src.utils.queue_item import QueueItem
+
+STATUS_FIELDS = (
+    "status",
+    "trackedDownloadStatus",
+    "trackedDownloadState",
+    "errorMessage",
+    "sizeleft",
+)
+
+
+def item_key(queueItem):
+    # Identifies the item from one run to the next, and its fingerprint
+    if type(queueItem) is QueueItem:
+        return (queueItem.id, queueItem.downloadId), queueItem.fingerprint()
+    fingerprint = (
+        *(queueItem.get(field) for field in STATUS_FIELDS),
+        hash(repr(queueItem.get("statusMessages"))),
+    )
+    return (queueItem.get("id"), queueItem.get("downloadId")), fingerprint
+
+
+class Verdict_Cache:
+    def __init__(self):
+        # (BASE_URL, failType) -> (depends_on, {(id, downloadId): (fingerprint, verdict)})
+        self.verdicts = {}
+        self.hits = 0
+        self.items = 0
+
+    def get_verdicts(self, BASE_URL, failType, queue, decide, depends_on=None):
+        # Returns the verdicts for the items of the queue (in the same order); decide(queueItem) is only called for items that are new or changed
+        # depends_on is whatever else the verdicts are based on (e.g. the compiled patterns); if it is another one than last time, all items are decided again
+        cached_on, previous = self.verdicts.get((BASE_URL, failType), (None, {}))
+        if cached_on is not depends_on:
+            previous = {}
+        current = {}
+        verdicts = []
+        hits = 0
+        for queueItem in queue:
+            key, fingerprint = item_key(queueItem)
+            cached = previous.get(key)
+            if cached is not None and cached[0] == fingerprint:
+                verdict = cached[1]
+                hits += 1
+            else:
+                verdict = decide(queueItem)
+            current[key] = (fingerprint, verdict)
+            verdicts.append(verdict)
+        # Items that left the queue are dropped
+        self.verdicts[(BASE_URL, failType)] = (depends_on, current)
+        self.hits += hits
+        self.items += len(verdicts)
+        return verdicts
+
+    def pop_stats(self):
+        # Returns how many verdicts could be reused since the last call (i.e. during the run), and resets the counts
+        stats = {
+            "hits": self.hits,
+            "items": self.items,
+            "hit_rate": self.hits / self.items if self.items else 0,
+        }
+        self.hits = self.items = 0
+        return stats
+
+
+verdict_cache = Verdict_Cache()
@@ -0,0 +1,82 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import json
+import pytest
+from config.definitions import load_settings
+from config.parser import ConfigError, parse_bool
+
+CONFIG = """
+[general]
+TEST_RUN        = TRUE
+SSL_VERIFICATION = off
+REQUEST_LIMITS  = {"SONARR": {"MAX_CONCURRENT": 2}}
+
+[feature_settings]
+PERMITTED_ATTEMPTS  = 5
+IGNORED_DOWNLOAD_CLIENTS = ["emulerr"]
+
+[sonarr]
+SONARR_URL      = http://sonarr:8989/
+SONARR_KEY      = key
+"""
+
+
+def write_config(tmp_path, content):
+    config_file = tmp_path / "config.conf"
+    config_file.write_text(content)
+    return str(config_file)
+
+
+def test_settings_are_typed(tmp_path):
+    settings = load_settings(write_config(tmp_path, CONFIG))
+    assert settings["TEST_RUN"] is True
+    assert settings["SSL_VERIFICATION"] is False
+    assert settings["PERMITTED_ATTEMPTS"] == 5
+    assert settings["REMOVE_TIMER"] == 10.0
+    assert settings["SONARR_URL"] == "http://sonarr:8989/api/v3"
+    assert settings["INSTANCES"] == ("SONARR",)
+    assert settings["IGNORED_DOWNLOAD_CLIENTS"] == ("emulerr",)
+    assert json.loads(json.dumps(settings["REQUEST_LIMITS"])) == {
+        "SONARR": {"MAX_CONCURRENT": 2}
+    }
+
+
+def test_settings_are_read_only(tmp_path):
+    settings = load_settings(write_config(tmp_path, CONFIG))
+    with pytest.raises(TypeError):
+        settings["TEST_RUN"] = False
+    with pytest.raises(TypeError):
+        settings["REQUEST_LIMITS"]["SONARR"]["MAX_CONCURRENT"] = 10
+    changed = settings.replace(TEST_RUN=False)
+    assert changed["TEST_RUN"] is False and settings["TEST_RUN"] is True
+
+
+@pytest.mark.parametrize("value", ["True", "yes", "1", "ON"])
+def test_booleans(value):
+    assert parse_bool(value) is True
+
+
+def test_booleans_are_not_evaluated(tmp_path):
+    with pytest.raises(ValueError):
+        parse_bool("__import__('os').getcwd()")
+    with pytest.raises(ConfigError, match="TEST_RUN"):
+        load_settings(write_config(tmp_path, CONFIG.replace("= TRUE", "= maybe")))
+
+
+def test_missing_mandatory_setting(tmp_path):
+    with pytest.raises(ConfigError, match="SONARR_KEY"):
+        load_settings(
+            write_config(tmp_path, CONFIG.replace("SONARR_KEY      = key", ""))
+        )
+
+
+def test_additional_instances(tmp_path):
+    instances = '{"4K": {"URL": "http://sonarr-4k:8989", "KEY": "key-4k"}, "anime": {"URL": "http://sonarr-anime:8989", "KEY": "key"}, "no key": {"URL": "http://x"}}'
+    settings = load_settings(
+        write_config(tmp_path, CONFIG + f"SONARR_INSTANCES = {instances}\n")
+    )
+    assert settings["INSTANCES"] == ("SONARR", "SONARR_4K", "SONARR_ANIME")
+    assert settings["SONARR_4K_URL"] == "http://sonarr-4k:8989/api/v3"
+    assert settings["SONARR_4K_KEY"] == "key-4k"
+    assert settings["SONARR_4K_TYPE"] == settings["SONARR_TYPE"] == "SONARR"
@@ -0,0 +1,8 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+from config import definitions
+from src.utils.loadScripts import loadSettings
+
+# The settings are read when decluttarr starts (see main.py), and here once for all tests
+definitions.settingsDict = loadSettings()
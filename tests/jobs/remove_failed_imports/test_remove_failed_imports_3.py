@@ -60,3 +60,25 @@ async def test_multiple_statuses_no_pattern(monkeypatch):
         },
     }
     await run_test(settingsDict, expected_removal_messages, mock_data_file, monkeypatch)
+
+
+@pytest.mark.asyncio
+async def test_multiple_statuses_regex_and_glob_patterns(monkeypatch):
+    settingsDict = {
+        "FAILED_IMPORT_MESSAGE_PATTERNS": ["re:hello w.rld$", "glob:Message ? - good*"]
+    }
+    expected_removal_messages = {
+        1: {
+            ">>>>> Tracked Download State: importPending",
+            ">>>>> Status Messages (matching specified patterns):",
+            ">>>>> - Message 1 - hello world",
+            ">>>>> - Message 2 - goodbye all",
+        },
+        2: {
+            ">>>>> Tracked Download State: importFailed",
+            ">>>>> Status Messages (matching specified patterns):",
+            ">>>>> - Message 1 - hello world",
+            ">>>>> - Message 2 - goodbye all",
+        },
+    }
+    await run_test(settingsDict, expected_removal_messages, mock_data_file, monkeypatch)
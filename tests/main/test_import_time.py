@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+# Importing main (everything decluttarr loads before its first run) must stay below this budget
+# Can be raised via the environment on slow machines
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 1000))
+# Only needed by some features, and thus only imported once used
+LAZY_MODULES = ["dateutil", "packaging", "gzip"]
+REPOSITORY_ROOT = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+
+def import_times():
+    # Returns the cumulative import time (in microseconds) per module, as reported by python -X importtime
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=REPOSITORY_ROOT,
+        env=dict(os.environ, IS_IN_PYTEST="true", PYTHONDONTWRITEBYTECODE="1"),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line.split("|")
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_import_time_budget():
+    times = import_times()
+    assert "main" in times
+    assert times["main"] / 1000 < IMPORT_TIME_BUDGET_MS, (
+        f"Importing main took {times['main'] / 1000:.0f} ms (budget: {IMPORT_TIME_BUDGET_MS:.0f} ms). "
+        f"Slowest imports: {sorted(times.items(), key=lambda item: -item[1])[1:6]}"
+    )
+
+
+def test_optional_dependencies_are_imported_lazily():
+    imported = [
+        module for module in import_times() if module.split(".")[0] in LAZY_MODULES
+    ]
+    assert imported == []
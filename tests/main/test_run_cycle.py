@@ -0,0 +1,284 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import json
+import threading
+import time
+import pytest
+import requests
+from config import definitions
+from src.utils import rest
+from src.utils.leases import Lease_Store
+from src.utils.trackers import Defective_Tracker, Download_Sizes_Tracker
+import main
+
+
+class Arr_And_Qbit_Transport:
+    # Answers like empty *arr queues and a qBit without torrents, after `delay` seconds
+    # Keeps the urls called and the highest number of calls that were in progress at the same time
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, method, url, **kwargs):
+        with self.lock:
+            self.calls.append(url)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        response = requests.Response()
+        response.status_code = 200
+        if url.endswith("/auth/login"):
+            response._content = b"Ok."
+            response.cookies = requests.cookies.cookiejar_from_dict({"SID": "session"})
+        elif url.endswith("/torrents/info") or url.endswith("/command"):
+            response._content = b"[]"
+        else:
+            response._content = json.dumps({"totalRecords": 0, "records": []}).encode()
+        return response
+
+
+@pytest.fixture
+def instances(monkeypatch):
+    settingsDict = definitions.settingsDict.replace(
+        INSTANCES=["SONARR", "SONARR_4K", "SONARR_ANIME"],
+        QBITTORRENT_URL="http://qbit:8080/api/v2",
+        QBIT_VERSION="5.1.0",
+        TEST_RUN=True,
+        RESULT_TTL={},
+        HTTP_CACHE_SIZE=0,
+        RUN_PERIODIC_RESCANS={},
+        **{
+            instance + key: value
+            for instance, host in [
+                ("SONARR", "sonarr"),
+                ("SONARR_4K", "sonarr-4k"),
+                ("SONARR_ANIME", "sonarr-anime"),
+            ]
+            for key, value in [
+                ("_URL", f"http://{host}:8989/api/v3"),
+                ("_KEY", "key"),
+                ("_NAME", host),
+                ("_TYPE", "SONARR"),
+            ]
+        },
+    )
+    monkeypatch.setattr(definitions, "settingsDict", settingsDict)
+    monkeypatch.setattr(rest, "result_cache", {})
+    monkeypatch.setattr("src.utils.circuit_breaker.circuit_breakers", {})
+    monkeypatch.setattr("src.utils.qbit_client.qbit_client", None)
+    return settingsDict
+
+
+@pytest.mark.asyncio
+async def test_instances_are_cleaned_concurrently(monkeypatch, instances):
+    transport = Arr_And_Qbit_Transport(delay=0.1)
+    monkeypatch.setattr(rest, "transport", transport)
+    await main.run_cycle(instances, Defective_Tracker({}), Download_Sizes_Tracker({}))
+    # The queues of the three instances are fetched at the same time
+    assert transport.max_active == 3
+    assert {url.split("/")[2] for url in transport.calls if url.endswith("/queue")} == {
+        "sonarr:8989",
+        "sonarr-4k:8989",
+        "sonarr-anime:8989",
+    }
+    # Each queue is refreshed once per run, rather than before each job
+    assert sum(url.endswith("/command") for url in transport.calls) == 3
+    # qBit is logged into, and its torrents fetched, once for all instances
+    assert sum(url.endswith("/auth/login") for url in transport.calls) == 1
+    assert sum(url.endswith("/torrents/info") for url in transport.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_runs_are_reported(monkeypatch, instances):
+    transport = Arr_And_Qbit_Transport(delay=0)
+    monkeypatch.setattr(rest, "transport", transport)
+    assert (
+        await main.run_cycle(
+            instances, Defective_Tracker({}), Download_Sizes_Tracker({})
+        )
+        is True
+    )
+
+    # A job that fails on one of the instances
+    def failing_queue(method, url, **kwargs):
+        if "sonarr-4k" in url and url.endswith("/queue"):
+            raise requests.exceptions.ConnectionError("sonarr-4k is down")
+        return transport(method, url, **kwargs)
+
+    monkeypatch.setattr(rest, "transport", failing_queue)
+    settingsDict = instances.replace(REMOVE_STALLED=True, MAX_RETRIES=0)
+    assert (
+        await main.run_cycle(
+            settingsDict, Defective_Tracker({}), Download_Sizes_Tracker({})
+        )
+        is False
+    )
+    # The count starts over with each run
+    monkeypatch.setattr(rest, "transport", transport)
+    assert (
+        await main.run_cycle(
+            settingsDict, Defective_Tracker({}), Download_Sizes_Tracker({})
+        )
+        is True
+    )
+
+
+class Startup_Transport(Arr_And_Qbit_Transport):
+    # Also answers the startup checks
+    def __call__(self, method, url, **kwargs):
+        response = super().__call__(method, url, **kwargs)
+        if url.endswith("/system/status"):
+            response._content = json.dumps(
+                {"appName": "Sonarr", "version": "4.0.9", "instanceName": "Sonarr"}
+            ).encode()
+        elif url.endswith("/config/ui"):
+            response._content = b'{"uiLanguage": 1}'
+        elif url.endswith("/app/version"):
+            response._content = b"v5.1.0"
+        elif url.endswith("/torrents/tags"):
+            response._content = b'["Don\'t Kill"]'
+        return response
+
+
+@pytest.mark.asyncio
+async def test_run_once(monkeypatch, instances, tmp_path):
+    transport = Startup_Transport(delay=0)
+    monkeypatch.setattr(rest, "transport", transport)
+    state_file = tmp_path / "trackers.json"
+    settingsDict = instances.replace(
+        RUN_ONCE=True, TRACKER_STATE_FILE=str(state_file), LOG_LEVEL="INFO"
+    )
+    # One run across all instances, then the exit status is returned
+    assert await main.main(settingsDict) == 0
+    assert sum(url.endswith("/queue") for url in transport.calls) == 3
+    assert "download_sizes" in json.loads(state_file.read_text())
+
+    # A failed run exits with an error status
+    def qbit_down(method, url, **kwargs):
+        if url.endswith("/torrents/info"):
+            raise requests.exceptions.ConnectionError("qBit is down")
+        return transport(method, url, **kwargs)
+
+    monkeypatch.setattr(rest, "transport", qbit_down)
+    assert await main.main(settingsDict.replace(MAX_RETRIES=0)) == 1
+
+    # So does a protection tag that cannot be created, though the run goes on
+    def tags_down(method, url, **kwargs):
+        if url.endswith("/torrents/tags"):
+            raise requests.exceptions.ConnectionError("qBit is down")
+        return transport(method, url, **kwargs)
+
+    transport.calls.clear()
+    monkeypatch.setattr(rest, "transport", tags_down)
+    assert await main.main(settingsDict.replace(MAX_RETRIES=0)) == 1
+    assert sum(url.endswith("/queue") for url in transport.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_qbit_session_is_kept_across_runs(monkeypatch, instances):
+    transport = Arr_And_Qbit_Transport(delay=0)
+    monkeypatch.setattr(rest, "transport", transport)
+    for _ in range(3):
+        await main.run_cycle(
+            instances, Defective_Tracker({}), Download_Sizes_Tracker({})
+        )
+    assert sum(url.endswith("/auth/login") for url in transport.calls) == 1
+    assert sum(url.endswith("/torrents/info") for url in transport.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_workers_clean_separate_instances(monkeypatch, instances, tmp_path):
+    # Two workers sharing a lease file: once both are known, each cleans its own instances
+    monkeypatch.setattr("src.utils.leases.lease_store", None)
+    workers = [
+        instances.replace(
+            WORKER_LEASE_FILE=str(tmp_path / "leases.db"), WORKER_ID=worker_id
+        )
+        for worker_id in ["a", "b"]
+    ]
+    for settingsDict in workers + workers:
+        await main.claim_instances(settingsDict)
+    a_instances = (await main.claim_instances(workers[0]))["INSTANCES"]
+    b_instances = (await main.claim_instances(workers[1]))["INSTANCES"]
+    assert sorted(a_instances + b_instances) == sorted(instances["INSTANCES"])
+    assert not set(a_instances) & set(b_instances)
+
+
+class Taken_Over_Transport(Arr_And_Qbit_Transport):
+    # Answers with a queue of one download; once the queue was read, another worker takes the instances over (as if the
+    # lease had expired while the run was going on)
+    def __init__(self, take_over):
+        super().__init__(delay=0)
+        self.take_over = take_over
+
+    def __call__(self, method, url, **kwargs):
+        response = super().__call__(method, url, **kwargs)
+        if url.endswith("/queue"):
+            record = {
+                "id": 1,
+                "downloadId": "A",
+                "title": "Show",
+                "status": "downloading",
+                "protocol": "torrent",
+            }
+            response._content = json.dumps(
+                {"totalRecords": 1, "records": [record]}
+            ).encode()
+            if self.take_over:
+                self.take_over()
+                self.take_over = None
+        return response
+
+
+@pytest.mark.asyncio
+async def test_instance_taken_over_during_a_run_is_no_longer_cleaned(
+    monkeypatch, instances, tmp_path
+):
+    monkeypatch.setattr("src.utils.leases.lease_store", None)
+    settingsDict = instances.replace(
+        INSTANCES=["SONARR"],
+        WORKER_LEASE_FILE=str(tmp_path / "leases.db"),
+        WORKER_ID="a",
+        WORKER_LEASE_DURATION=60,
+        QBITTORRENT_URL="",
+        REMOVE_FAILED=True,
+        REMOVE_STALLED=True,
+    )
+    # While the lease is held, each job reads the queue again (two calls each: the number of records, then the records)
+    transport = Taken_Over_Transport(take_over=None)
+    monkeypatch.setattr(rest, "transport", transport)
+    settingsDict = await main.claim_instances(settingsDict)
+    await main.run_cycle(
+        settingsDict, Defective_Tracker({}), Download_Sizes_Tracker({})
+    )
+    assert sum(url.endswith("/queue") for url in transport.calls) == 6
+
+    def take_over():
+        later = Lease_Store(
+            str(tmp_path / "leases.db"),
+            "b",
+            duration=60,
+            clock=lambda: time.time() + 120,
+        )
+        assert later.claim(["SONARR"]) == ["SONARR"]
+
+    transport = Taken_Over_Transport(take_over)
+    monkeypatch.setattr(rest, "transport", transport)
+    await main.run_cycle(
+        settingsDict, Defective_Tracker({}), Download_Sizes_Tracker({})
+    )
+    # No job runs once the other worker holds the instance
+    assert sum(url.endswith("/queue") for url in transport.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_without_lease_file_all_instances_are_cleaned(instances):
+    assert (await main.claim_instances(instances))["INSTANCES"] == instances[
+        "INSTANCES"
+    ]
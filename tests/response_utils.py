@@ -0,0 +1,11 @@
+import requests
+
+
+def make_response(status_code=200, body="", headers=None):
+    # A response as the transport returns it, with the whole body read already
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = body.encode() if isinstance(body, str) else body
+    response.encoding = "utf-8"
+    return response
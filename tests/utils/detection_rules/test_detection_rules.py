@@ -0,0 +1,198 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import random
+import pytest
+from src.utils.detection_rules import FAIL_TYPES, Rule_Table, validate_rule
+from src.utils.queue_item import QueueItem
+
+
+def item(status, errorMessage=None, trackedDownloadState=None, messages=None):
+    record = {
+        "status": status,
+        "trackedDownloadState": trackedDownloadState or "downloading",
+    }
+    if errorMessage is not None:
+        record["errorMessage"] = errorMessage
+    if messages is not None:
+        record["statusMessages"] = [{"title": "title", "messages": messages}]
+    return QueueItem(record)
+
+
+@pytest.mark.parametrize(
+    "queueItem, failType",
+    [
+        (item("failed", "Download failed"), "failed"),
+        (item("failed"), None),
+        (item("warning", "The download is stalled with no connections"), "stalled"),
+        (item("queued", "The download is stalled with no connections"), None),
+        (item("queued", "qBittorrent is downloading metadata"), "missing metadata"),
+        (
+            item("warning", "DownloadClientQbittorrentTorrentStateMissingFiles"),
+            "missing files",
+        ),
+        (item("warning", "The download is missing files"), "missing files"),
+        (item("warning", "qBittorrent is reporting missing files"), "missing files"),
+        (
+            item(
+                "completed",
+                messages=[
+                    "Sample",
+                    "No files found are eligible for import in /downloads/x",
+                ],
+            ),
+            "missing files",
+        ),
+        (item("completed", messages=["No files found"]), None),
+        (
+            item(
+                "downloading",
+                messages=["No files found are eligible for import in /downloads/x"],
+            ),
+            None,
+        ),
+        (item("downloading"), None),
+        ({}, None),
+    ],
+)
+def test_default_rules(queueItem, failType):
+    assert Rule_Table().classify(queueItem) == failType
+
+
+def test_rules_from_config():
+    rules = Rule_Table(
+        [
+            # More specific than the default rule, which thus no longer applies to this state
+            {
+                "failType": "missing files",
+                "status": "failed",
+                "trackedDownloadState": "importBlocked",
+                "errorMessage": "*",
+            },
+            {
+                "failType": "stalled",
+                "status": "warning",
+                "errorMessage": "The download is stalled with no connections (seeding)",
+            },
+            {
+                "failType": "failed",
+                "status": "completed",
+                "messagePrefix": "Unpacking failed",
+            },
+            {
+                "failType": "stalled",
+                "status": "completed",
+                "trackedDownloadState": "importPending",
+                "messagePrefix": "Unpacking",
+            },
+            # More specific than the prefix of the default rule
+            {
+                "failType": "failed",
+                "status": "completed",
+                "messagePrefix": "No files found are eligible for import in /special",
+            },
+        ]
+    )
+    assert (
+        rules.classify(item("failed", "Download failed", "importBlocked"))
+        == "missing files"
+    )
+    assert rules.classify(item("failed", "Download failed")) == "failed"
+    assert (
+        rules.classify(
+            item("warning", "The download is stalled with no connections (seeding)")
+        )
+        == "stalled"
+    )
+    assert (
+        rules.classify(item("completed", messages=["Unpacking failed: bad archive"]))
+        == "failed"
+    )
+    assert (
+        rules.classify(
+            item("completed", None, "importPending", ["Unpacking failed: bad archive"])
+        )
+        == "stalled"
+    )
+    assert (
+        rules.classify(
+            item("completed", messages=["No files found are eligible for import in x"])
+        )
+        == "missing files"
+    )
+    assert (
+        rules.classify(
+            item(
+                "completed",
+                messages=["No files found are eligible for import in /special/x"],
+            )
+        )
+        == "failed"
+    )
+
+
+def test_prefix_index_matches_like_testing_each_prefix():
+    rng = random.Random(0)
+    alphabet = "ab "
+    prefixes = sorted(
+        {"".join(rng.choices(alphabet, k=rng.randint(1, 6))) for _ in range(40)}
+    )
+    fail_types = {prefix: rng.choice(FAIL_TYPES) for prefix in prefixes}
+    rules = Rule_Table(
+        [
+            {"failType": fail_type, "status": "completed", "messagePrefix": prefix}
+            for prefix, fail_type in fail_types.items()
+        ]
+    )
+    for _ in range(2000):
+        message = "".join(rng.choices(alphabet, k=rng.randint(0, 8)))
+        # The longest prefix decides
+        matching = [prefix for prefix in prefixes if message.startswith(prefix)]
+        expected = fail_types[max(matching, key=len)] if matching else None
+        assert (
+            rules.classify(item("completed", messages=[message])) == expected
+        ), message
+
+
+@pytest.mark.parametrize(
+    "rule",
+    [
+        {"failType": "slow", "status": "warning"},
+        {"failType": "stalled"},
+        {
+            "failType": "stalled",
+            "status": "warning",
+            "errorMessage": "x",
+            "messagePrefix": "y",
+        },
+        {"failType": "stalled", "status": "warning", "message": "x"},
+        {"failType": "stalled", "status": "warning", "errorMessage": ""},
+        ["stalled", "warning"],
+    ],
+)
+def test_invalid_rules(rule):
+    with pytest.raises(ValueError):
+        validate_rule(rule)
+
+
+def test_select_is_like_classify():
+    rules = Rule_Table(
+        [{"failType": "stalled", "status": "completed", "messagePrefix": "Unpacking"}]
+    )
+    queue = [
+        item("failed", "Download failed"),
+        item("warning", "The download is stalled with no connections"),
+        item("completed", messages=["No files found are eligible for import in x"]),
+        item("completed", messages=["Unpacking failed"]),
+        item("completed", messages=["Other"]),
+        item("downloading"),
+        {"status": "queued", "errorMessage": "qBittorrent is downloading metadata"},
+    ]
+    # Twice, since the decisions are kept after the first time
+    for _ in range(2):
+        for failType in ("failed", "stalled", "missing metadata", "missing files"):
+            assert rules.select(queue, failType) == [
+                queueItem
+                for queueItem in queue
+                if rules.classify(queueItem) == failType
+            ]
@@ -0,0 +1,261 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import pytest
+from benchmarks.fake_servers import (
+    Fake_Deluge_Server,
+    Fake_Nzbget_Server,
+    Fake_Sabnzbd_Server,
+    Fake_Transmission_Server,
+)
+from config import definitions
+from src.jobs.remove_slow import getDownloadedSize
+from src.utils import download_clients
+from src.utils.download_clients import (
+    Deluge_Client,
+    Download_Client_Error,
+    Nzbget_Client,
+    Sabnzbd_Client,
+    Transmission_Client,
+    get_download_clients,
+    get_download_failures,
+    get_download_progress,
+)
+from src.utils.detection_rules import select_affected
+
+TORRENTS = [("aaaa", 1000, 400), ("bbbb", 2000, 2000)]
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    settingsDict = definitions.settingsDict.replace(
+        MAX_RETRIES=0, TRANSMISSION_URL="", DELUGE_URL="", SABNZBD_URL="", NZBGET_URL=""
+    )
+    monkeypatch.setattr(definitions, "settingsDict", settingsDict)
+    monkeypatch.setattr("src.utils.circuit_breaker.circuit_breakers", {})
+    monkeypatch.setattr(download_clients, "download_clients", {})
+    return settingsDict
+
+
+def rpc_calls(server):
+    return server.counter.snapshot()["calls"]
+
+
+@pytest.mark.asyncio
+async def test_transmission_session_id_is_kept():
+    with Fake_Transmission_Server(TORRENTS) as server:
+        client = Transmission_Client(server.url)
+        assert await client.get_progress() == {"AAAA": 400, "BBBB": 2000}
+        assert rpc_calls(server) == 2  # Handshake for the session id, then the call
+        await client.get_progress()
+        assert rpc_calls(server) == 3
+        # After a restart, Transmission hands out a new session id, which is picked up
+        server.restart()
+        assert await client.get_progress() == {"AAAA": 400, "BBBB": 2000}
+        assert rpc_calls(server) == 5
+        assert client.sessions == 2
+
+
+@pytest.mark.asyncio
+async def test_transmission_credentials():
+    with Fake_Transmission_Server(
+        TORRENTS, username="user", password="secret"
+    ) as server:
+        assert await Transmission_Client(
+            server.url, "user", "secret"
+        ).get_progress() == {"AAAA": 400, "BBBB": 2000}
+        with pytest.raises(Download_Client_Error, match="refused the credentials"):
+            await Transmission_Client(server.url, "user", "wrong").get_progress()
+
+
+@pytest.mark.asyncio
+async def test_deluge_session_cookie_is_kept():
+    with Fake_Deluge_Server(TORRENTS, password="secret") as server:
+        client = Deluge_Client(server.url, "secret")
+        # Logs in, and connects the Web UI to the daemon
+        assert await client.get_progress() == {"AAAA": 400, "BBBB": 2000}
+        assert server.connected
+        calls = rpc_calls(server)
+        await client.get_progress()
+        assert rpc_calls(server) == calls + 1
+        # After a restart, Deluge no longer knows the session; logged in again once
+        server.restart()
+        assert await client.get_progress() == {"AAAA": 400, "BBBB": 2000}
+        assert server.logins == 2
+
+
+@pytest.mark.asyncio
+async def test_deluge_wrong_password():
+    with Fake_Deluge_Server(TORRENTS, password="secret") as server:
+        with pytest.raises(Download_Client_Error, match="DELUGE_PASSWORD"):
+            await Deluge_Client(server.url, "wrong").get_progress()
+
+
+@pytest.mark.asyncio
+async def test_progress_of_all_clients(settings, caplog):
+    with Fake_Transmission_Server(
+        [("aaaa", 1000, 400)]
+    ) as transmission, Fake_Deluge_Server(
+        [("cccc", 3000, 100)], connected=True
+    ) as deluge:
+        settings = settings.replace(
+            TRANSMISSION_URL=transmission.url,
+            DELUGE_URL=deluge.url,
+            DELUGE_PASSWORD="deluge",
+        )
+        assert await get_download_progress(settings) == {"AAAA": 400, "CCCC": 100}
+        # A client that cannot be queried is left out
+        deluge.restart()
+        deluge.password = "changed"
+        assert await get_download_progress(settings) == {"AAAA": 400}
+        assert "Deluge could not be queried" in caplog.text
+
+
+def test_clients_are_kept_until_their_settings_change(settings):
+    settings = settings.replace(TRANSMISSION_URL="http://transmission:9091")
+    (client,) = get_download_clients(settings)
+    assert get_download_clients(settings) == [client]
+    (changed,) = get_download_clients(settings.replace(TRANSMISSION_PASSWORD="other"))
+    assert changed is not client
+    assert get_download_clients(settings.replace(TRANSMISSION_URL="")) == []
+
+
+@pytest.mark.asyncio
+async def test_slow_detection_uses_the_progress_of_the_client(settings):
+    queueItem = {
+        "downloadId": "AAAA",
+        "downloadClient": "Transmission",
+        "size": 1000,
+        "sizeleft": 900,
+    }
+    download_sizes = {"AAAA": 100_000}
+    settings = settings.replace(REMOVE_TIMER=1)
+    # 400 KB downloaded according to Transmission, while the *arr still reports 100 KB
+    downloadedSize, previousSize, increment, speed = await getDownloadedSize(
+        settings,
+        queueItem,
+        download_sizes,
+        "Sonarr",
+        download_progress={"AAAA": 400_000},
+    )
+    assert (downloadedSize, increment, speed) == (400_000, 300_000, 5.0)
+
+
+@pytest.mark.asyncio
+async def test_sabnzbd_failures_and_stuck_repairs():
+    history = [
+        {
+            "nzo_id": "SABnzbd_nzo_failed",
+            "status": "Failed",
+            "fail_message": "Aborted, cannot be completed",
+        },
+        {
+            "nzo_id": "SABnzbd_nzo_repair",
+            "status": "Repairing",
+            "action_line": "Repairing: 10%",
+        },
+        {"nzo_id": "SABnzbd_nzo_done", "status": "Completed"},
+    ]
+    with Fake_Sabnzbd_Server(history, api_key="key") as server:
+        client = Sabnzbd_Client(server.url, "key")
+        assert await client.get_failures() == {"SABNZBD_NZO_FAILED": "missing files"}
+        assert rpc_calls(server) == 1
+        # The repair made no progress since the previous run
+        assert await client.get_failures() == {
+            "SABNZBD_NZO_FAILED": "missing files",
+            "SABNZBD_NZO_REPAIR": "stalled",
+        }
+        server.history[1]["action_line"] = "Repairing: 20%"
+        assert await client.get_failures() == {"SABNZBD_NZO_FAILED": "missing files"}
+        with pytest.raises(Download_Client_Error, match="API Key Incorrect"):
+            await Sabnzbd_Client(server.url, "wrong").get_failures()
+
+
+@pytest.mark.asyncio
+async def test_nzbget_failures_and_stuck_repairs():
+    groups = [
+        # Added by an *arr, which uses the drone parameter as downloadId
+        {
+            "NZBID": 1,
+            "Status": "DOWNLOADING",
+            "Health": 900,
+            "CriticalHealth": 950,
+            "Parameters": [{"Name": "drone", "Value": "abc"}],
+        },
+        {
+            "NZBID": 2,
+            "Status": "DOWNLOADING",
+            "Health": 990,
+            "CriticalHealth": 950,
+            "Parameters": [],
+        },
+        {
+            "NZBID": 3,
+            "Status": "REPAIRING",
+            "Health": 1000,
+            "CriticalHealth": 950,
+            "PostStageProgress": 100,
+        },
+    ]
+    history = [
+        {"NZBID": 4, "Status": "FAILURE/UNPACK", "Parameters": []},
+        {"NZBID": 5, "Status": "DELETED/HEALTH", "Parameters": []},
+        {"NZBID": 6, "Status": "SUCCESS/ALL", "Parameters": []},
+    ]
+    with Fake_Nzbget_Server(
+        groups, history, username="nzbget", password="secret"
+    ) as server:
+        client = Nzbget_Client(server.url, "nzbget", "secret")
+        failed = {"ABC": "missing files", "4": "missing files", "5": "missing files"}
+        assert await client.get_failures() == failed
+        assert rpc_calls(server) == 2  # The queue and the history
+        assert await client.get_failures() == {**failed, "3": "stalled"}
+        with pytest.raises(Download_Client_Error, match="refused the credentials"):
+            await Nzbget_Client(server.url, "nzbget", "wrong").get_failures()
+
+
+@pytest.mark.asyncio
+async def test_usenet_failures_are_affected(settings):
+    history = [
+        {
+            "nzo_id": "SABnzbd_nzo_failed",
+            "status": "Failed",
+            "fail_message": "Unpacking failed",
+        }
+    ]
+    with Fake_Sabnzbd_Server(history) as server:
+        settings = settings.replace(SABNZBD_URL=server.url, SABNZBD_KEY="sabnzbd")
+        download_failures = await get_download_failures(settings)
+    queue = [
+        {
+            "id": 1,
+            "downloadId": "SABnzbd_nzo_failed",
+            "status": "downloading",
+            "trackedDownloadState": "downloading",
+        },
+        {
+            "id": 2,
+            "downloadId": "SABnzbd_nzo_other",
+            "status": "downloading",
+            "trackedDownloadState": "downloading",
+        },
+    ]
+    # Affected before the *arr reports the failure
+    affected = select_affected(
+        settings,
+        "http://sonarr",
+        queue,
+        "missing files",
+        download_failures=download_failures,
+    )
+    assert [queueItem["id"] for queueItem in affected] == [1]
+    assert (
+        select_affected(
+            settings,
+            "http://sonarr",
+            queue,
+            "stalled",
+            download_failures=download_failures,
+        )
+        == []
+    )
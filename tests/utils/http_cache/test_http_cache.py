@@ -0,0 +1,38 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+from src.utils.http_cache import Response_Cache
+from response_utils import make_response
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = Response_Cache(max_bytes=25)
+    cache.store("a", make_response(200, b"x" * 10, {"ETag": '"a"'}), "A")
+    cache.store("b", make_response(200, b"x" * 10, {"ETag": '"b"'}), "B")
+    assert cache.get("a").result == "A"  # "b" is now the least recently used
+    cache.store(
+        "c", make_response(200, b"x" * 10, {"Last-Modified": "Mon, 01 Jan 2024"}), "C"
+    )
+    assert cache.get("b") is None
+    assert [cache.get(key).result for key in "ac"] == ["A", "C"]
+    assert cache.size == 20
+
+
+def test_only_responses_with_validators_are_kept():
+    cache = Response_Cache(max_bytes=100)
+    cache.store("a", make_response(200, b"[]", {"ETag": '"a"'}), [])
+    cache.store("a", make_response(200, b"[1]", {}), [1])
+    cache.store("big", make_response(200, b"x" * 101, {"ETag": '"big"'}), "big")
+    assert cache.get("a") is None and cache.get("big") is None
+    assert cache.size == 0
+
+
+def test_conditional_headers():
+    cache = Response_Cache(max_bytes=100)
+    cache.store(
+        "a", make_response(200, b"[]", {"ETag": '"a"', "Last-Modified": "then"}), []
+    )
+    assert cache.get("a").conditional_headers() == {
+        "If-None-Match": '"a"',
+        "If-Modified-Since": "then",
+    }
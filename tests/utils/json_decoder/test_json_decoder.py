@@ -0,0 +1,70 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import pytest
+from config import definitions
+from src.utils import json_decoder
+from src.utils.json_decoder import available_backends, get_decoder
+from src.utils import rest
+from src.utils.loadScripts import getArrStatus
+from src.utils.rest import decode_json, decode_response
+from response_utils import make_response
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_backends_decode_alike(backend):
+    name, decode, _ = get_decoder(backend)
+    assert name == backend
+    assert decode(b'{"records": [{"id": 1, "title": "\\u00e9"}]}') == {
+        "records": [{"id": 1, "title": "é"}]
+    }
+
+
+def test_falls_back_to_standard_library(monkeypatch):
+    monkeypatch.setattr(json_decoder, "orjson", None)
+    monkeypatch.setattr(json_decoder, "msgspec", None)
+    assert available_backends() == ["json"]
+    assert get_decoder("auto")[0] == "json"
+    assert get_decoder("orjson")[0] == "json"
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_decode_response(monkeypatch, backend):
+    monkeypatch.setattr(
+        definitions,
+        "settingsDict",
+        definitions.settingsDict.replace(JSON_DECODER=backend),
+    )
+    assert decode_response(make_response(200, b"v4.6.7")) == "v4.6.7"
+    assert decode_response(make_response(200, b"")) == ""
+    assert decode_response(make_response(200, b"[1, 2]"), convert=len) == 2
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_invalid_json_raises_value_error(monkeypatch, backend):
+    monkeypatch.setattr(
+        definitions,
+        "settingsDict",
+        definitions.settingsDict.replace(JSON_DECODER=backend),
+    )
+    with pytest.raises(ValueError):
+        decode_json(make_response(200, b"<html>"))
+
+
+@pytest.mark.asyncio
+async def test_responses_outside_rest_get_use_the_decoder(monkeypatch):
+    decoded = []
+
+    def decode(content):
+        decoded.append(content)
+        return {"appName": "Sonarr"}
+
+    monkeypatch.setattr(rest, "get_decoder", lambda name: ("spy", decode, ValueError))
+    monkeypatch.setattr(
+        rest, "transport", lambda method, url, **kwargs: make_response(200, b"{}")
+    )
+    settingsDict = definitions.settingsDict.replace(
+        SONARR_URL="http://sonarr:8989/api/v3", SONARR_KEY="key"
+    )
+    assert await getArrStatus(settingsDict, "SONARR") == {"appName": "Sonarr"}
+    assert decoded == [b"{}"]
@@ -0,0 +1,132 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import json
+import pytest
+import requests
+from config import definitions
+from src.utils import rest
+from src.utils.json_stream import Json_Stream
+from src.utils.queue_item import QueueItem
+from src.utils.shared import get_arr_records
+
+PAGE = {
+    "page": 1,
+    "pageSize": 3,
+    "sortKey": "timeleft",
+    "totalRecords": 3,
+    "records": [
+        {"id": 1, "title": 'Café \\ "quoted"', "size": 1.5e9, "statusMessages": []},
+        {"id": 22, "title": "[x]{y}", "status": None, "done": True},
+        {"id": 333, "title": "Last", "sizeleft": 0},
+    ],
+}
+
+
+def chunked(data, size):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 100000])
+def test_records_are_decoded_across_chunks(chunk_size):
+    content = json.dumps(PAGE, indent=1, ensure_ascii=False).encode()
+    page = {}
+    records = list(Json_Stream(chunked(content, chunk_size)).records(page))
+    assert records == PAGE["records"]
+    assert page == {key: value for key, value in PAGE.items() if key != "records"}
+
+
+def test_incomplete_response_raises():
+    content = json.dumps(PAGE).encode()[:-20]
+    with pytest.raises(ValueError):
+        list(Json_Stream(chunked(content, 16)).records({}))
+
+
+class Paged_Transport:
+    # Serves PAGE["records"] in pages, as the *arr does
+    def __init__(self, records):
+        self.records = records
+        self.pages = []
+
+    def __call__(self, method, url, params=None, **kwargs):
+        page, page_size = int(params["page"]), int(params["pageSize"])
+        self.pages.append(page)
+        response = requests.Response()
+        response.status_code = 200
+        body = {
+            "page": page,
+            "pageSize": page_size,
+            "totalRecords": len(self.records),
+            "records": self.records[(page - 1) * page_size : page * page_size],
+        }
+        response._content = json.dumps(body).encode()
+        response._content_consumed = True
+        return response
+
+
+@pytest.fixture
+def paged(monkeypatch):
+    monkeypatch.setattr(
+        definitions, "settingsDict", definitions.settingsDict.replace(RESULT_TTL={})
+    )
+    monkeypatch.setattr("src.utils.shared.STREAM_PAGE_SIZE", 2)
+
+    def paged(records):
+        transport = Paged_Transport(records)
+        monkeypatch.setattr(rest, "transport", transport)
+        return transport
+
+    return paged
+
+
+@pytest.mark.asyncio
+async def test_get_arr_records_streamed(paged):
+    transport = paged(PAGE["records"])
+    records = await get_arr_records(
+        "http://sonarr:8989/api/v3",
+        "key",
+        end_point="queue",
+        record_type=QueueItem,
+        keep=lambda record: record["id"] > 1,
+        stream=True,
+    )
+    assert [record["id"] for record in records] == [22, 333]
+    assert isinstance(records[0], QueueItem)
+    # Read in pages of STREAM_PAGE_SIZE records, without asking for the number of records first
+    assert transport.pages == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_streamed_pages_stop_at_the_limit(paged):
+    transport = paged([{"id": record_id} for record_id in range(1, 11)])
+    records = await get_arr_records(
+        "http://sonarr:8989/api/v3",
+        "key",
+        end_point="wanted/missing",
+        limit=3,
+        stream=True,
+    )
+    assert [record["id"] for record in records] == [1, 2, 3]
+    assert transport.pages == [1, 2]
+
+
+class Shifting_Transport(Paged_Transport):
+    # A record is added at the front once the first page was read
+    def __call__(self, method, url, params=None, **kwargs):
+        response = super().__call__(method, url, params=params, **kwargs)
+        if params["page"] == "1":
+            self.records = [{"id": 0}] + self.records
+        return response
+
+
+@pytest.mark.asyncio
+async def test_records_moving_between_pages_are_read_once(paged, monkeypatch):
+    monkeypatch.setattr(
+        rest,
+        "transport",
+        Shifting_Transport([{"id": record_id} for record_id in range(1, 6)]),
+    )
+    records = await get_arr_records(
+        "http://sonarr:8989/api/v3", "key", end_point="queue", stream=True
+    )
+    assert [record["id"] for record in records] == [1, 2, 3, 4, 5]
@@ -0,0 +1,125 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import multiprocessing
+import pytest
+from src.utils.leases import Lease_Store
+
+INSTANCES = ["SONARR", "SONARR_4K", "RADARR", "RADARR_4K", "LIDARR"]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def store(tmp_path, worker_id, clock):
+    return Lease_Store(str(tmp_path / "leases.db"), worker_id, duration=60, clock=clock)
+
+
+def test_single_worker_takes_all(tmp_path, clock):
+    assert store(tmp_path, "a", clock).claim(INSTANCES) == INSTANCES
+
+
+def test_joining_worker_gets_a_share(tmp_path, clock):
+    a = store(tmp_path, "a", clock)
+    b = store(tmp_path, "b", clock)
+    assert a.claim(INSTANCES) == INSTANCES
+    # Nothing is free until a gives up what is more than its share
+    assert b.claim(INSTANCES) == []
+    clock.now += 10
+    assert a.claim(INSTANCES) == ["SONARR", "SONARR_4K", "RADARR"]
+    assert b.claim(INSTANCES) == ["RADARR_4K", "LIDARR"]
+    # Stable afterwards
+    clock.now += 10
+    assert a.claim(INSTANCES) == ["SONARR", "SONARR_4K", "RADARR"]
+    assert b.claim(INSTANCES) == ["RADARR_4K", "LIDARR"]
+
+
+def test_instances_of_stopped_worker_are_taken_over(tmp_path, clock):
+    a = store(tmp_path, "a", clock)
+    b = store(tmp_path, "b", clock)
+    b.claim(INSTANCES)
+    a.claim(INSTANCES)
+    b.claim(INSTANCES)
+    a_instances = a.claim(INSTANCES)
+    assert a_instances
+
+    # b stops renewing; its leases are kept until they expire
+    clock.now += 30
+    assert a.claim(INSTANCES) == a_instances
+    clock.now += 31
+    assert a.claim(INSTANCES) == INSTANCES
+
+
+def test_released_instances_are_taken_over_right_away(tmp_path, clock):
+    a = store(tmp_path, "a", clock)
+    b = store(tmp_path, "b", clock)
+    a.claim(INSTANCES)
+    b.claim(INSTANCES)
+    a.release()
+    assert b.claim(INSTANCES) == INSTANCES
+
+
+def test_renewed_lease_is_kept(tmp_path, clock):
+    a = store(tmp_path, "a", clock)
+    b = store(tmp_path, "b", clock)
+    a.claim(INSTANCES)
+    # a's run takes longer than the lease, but a renews it before each job
+    clock.now += 50
+    assert a.renew("SONARR")
+    clock.now += 50
+    # The leases that a did not renew expired, and are taken over
+    assert b.claim(INSTANCES) == ["SONARR_4K", "RADARR", "RADARR_4K"]
+    assert a.renew("SONARR")
+    assert a.renew("SONARR_4K") is False
+
+
+def test_lease_expiring_during_a_run_is_lost_once_taken_over(tmp_path, clock):
+    a = store(tmp_path, "a", clock)
+    b = store(tmp_path, "b", clock)
+    assert a.claim(INSTANCES) == INSTANCES
+    clock.now += 61
+    # Not taken over yet: a can go on
+    assert a.renew("SONARR")
+    clock.now += 61
+    assert b.claim(INSTANCES) == INSTANCES
+    assert a.renew("SONARR") is False
+    assert a.renew("RADARR") is False
+
+
+def claim_in_process(path, worker_id, queue):
+    queue.put((worker_id, Lease_Store(path, worker_id, duration=60).claim(INSTANCES)))
+
+
+def test_workers_never_hold_the_same_instance(tmp_path):
+    # Workers claiming at the same time (as separate processes) never get the same instance
+    path = str(tmp_path / "leases.db")
+    queue = multiprocessing.Queue()
+    for run in range(3):
+        processes = [
+            multiprocessing.Process(
+                target=claim_in_process, args=(path, worker_id, queue)
+            )
+            for worker_id in "abcd"
+        ]
+        for process in processes:
+            process.start()
+        claimed = dict(queue.get(timeout=30) for _ in processes)
+        for process in processes:
+            process.join()
+        instances = [
+            instance for instances in claimed.values() for instance in instances
+        ]
+        assert len(instances) == len(set(instances))
+    # Once all workers are known, the instances are split between them
+    assert sorted(instances) == sorted(INSTANCES)
+    assert max(len(instances) for instances in claimed.values()) == 2
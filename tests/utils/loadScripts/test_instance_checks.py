@@ -0,0 +1,103 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import json
+import time
+import pytest
+import requests
+from config import definitions
+from src.utils import rest
+from src.utils.loadScripts import getArrInstanceName, getArrStatuses, instanceChecks
+
+STATUS = {
+    "SONARR": {
+        "appName": "Sonarr",
+        "instanceName": "Sonarr 4K",
+        "version": "4.0.9.2332",
+    },
+    "RADARR": {"appName": "Radarr", "instanceName": "Radarr", "version": "5.10.3.9171"},
+}
+
+
+class Slow_Arr_Transport:
+    # Answers every call after `delay` seconds, and counts the calls per path
+    def __init__(self, delay, status=STATUS):
+        self.delay = delay
+        self.status = status
+        self.calls = []
+
+    def __call__(self, method, url, **kwargs):
+        self.calls.append(url)
+        time.sleep(self.delay)
+        response = requests.Response()
+        response.status_code = 200
+        if url.endswith("/system/status"):
+            body = self.status[url.split("//")[1].split(":")[0].upper()]
+        else:
+            body = {"uiLanguage": 1}
+        response._content = json.dumps(body).encode()
+        return response
+
+
+@pytest.fixture(autouse=True)
+def instances(monkeypatch):
+    monkeypatch.setattr(
+        definitions,
+        "settingsDict",
+        definitions.settingsDict.replace(
+            INSTANCES=["SONARR", "RADARR"],
+            SONARR_URL="http://sonarr:8989/api/v3",
+            RADARR_URL="http://radarr:7878/api/v3",
+            SONARR_KEY="key",
+            RADARR_KEY="key",
+            QBITTORRENT_URL="",
+            RESULT_TTL={},
+            HTTP_CACHE_SIZE=0,
+        ),
+    )
+    monkeypatch.setattr("src.utils.circuit_breaker.circuit_breakers", {})
+
+
+@pytest.mark.asyncio
+async def test_instances_are_checked_concurrently(monkeypatch):
+    transport = Slow_Arr_Transport(delay=0.2)
+    monkeypatch.setattr(rest, "transport", transport)
+    start = time.monotonic()
+    settingsDict = definitions.settingsDict
+    arr_statuses = await getArrStatuses(settingsDict)
+    for instance in settingsDict["INSTANCES"]:
+        settingsDict = await getArrInstanceName(
+            settingsDict, instance, arr_statuses[instance]
+        )
+    await instanceChecks(settingsDict, arr_statuses)
+    # Two rounds (status, then UI settings) of 0.2s each, rather than four
+    assert time.monotonic() - start < 0.6
+    assert settingsDict["SONARR_NAME"] == "Sonarr 4K"
+    assert sum(url.endswith("/system/status") for url in transport.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_fails_fast(monkeypatch):
+    status = STATUS | {"RADARR": {"appName": "Sonarr", "version": "4.0.9.2332"}}
+    monkeypatch.setattr(rest, "transport", Slow_Arr_Transport(delay=0, status=status))
+    monkeypatch.setattr(
+        definitions,
+        "settingsDict",
+        definitions.settingsDict.replace(STARTUP_EXIT_DELAY=0),
+    )
+    start = time.monotonic()
+    with pytest.raises(SystemExit):
+        await instanceChecks(definitions.settingsDict)
+    assert time.monotonic() - start < 1
+
+
+@pytest.mark.asyncio
+async def test_startup_timeout(monkeypatch):
+    monkeypatch.setattr(rest, "transport", Slow_Arr_Transport(delay=0.5))
+    monkeypatch.setattr(
+        definitions,
+        "settingsDict",
+        definitions.settingsDict.replace(STARTUP_TIMEOUT=0.1),
+    )
+    arr_statuses = await getArrStatuses(definitions.settingsDict)
+    assert all(isinstance(status, TimeoutError) for status in arr_statuses.values())
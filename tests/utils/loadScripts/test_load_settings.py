@@ -0,0 +1,50 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import subprocess
+import sys
+from src.utils.loadScripts import loadSettings
+
+CONFIG = """
+[feature_settings]
+FAILED_IMPORT_MESSAGE_PATTERNS = ["Not an upgrade", "re:(unclosed", "glob:*.mkv", ""]
+DETECTION_RULES = [{"failType": "stalled", "status": "warning", "errorMessage": "Stuck"}, {"failType": "unknown", "status": "warning"}]
+
+[sonarr]
+SONARR_URL      = http://sonarr:8989
+SONARR_KEY      = key
+"""
+REPOSITORY_ROOT = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+
+def test_invalid_patterns_and_rules_are_removed(tmp_path):
+    config_file = tmp_path / "config.conf"
+    config_file.write_text(CONFIG)
+    settings = loadSettings(str(config_file))
+    assert settings["FAILED_IMPORT_MESSAGE_PATTERNS"] == (
+        "Not an upgrade",
+        "glob:*.mkv",
+    )
+    assert settings["DETECTION_RULES"] == (
+        {"failType": "stalled", "status": "warning", "errorMessage": "Stuck"},
+    )
+
+
+def test_config_is_read_only_when_loaded():
+    # Importing the settings module neither reads the settings nor imports decluttarr's own code
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; from config import definitions; "
+            "print(definitions.settingsDict, any(module.split('.')[0] == 'src' for module in sys.modules))",
+        ],
+        cwd=REPOSITORY_ROOT,
+        env=dict(os.environ, IS_IN_PYTEST="true"),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split() == ["None", "False"]
@@ -0,0 +1,121 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import json
+import pytest
+import requests
+from config import definitions
+from src.utils import rest
+from src.utils.loadScripts import reloadSettings
+
+CONFIG = """
+[feature_settings]
+PERMITTED_ATTEMPTS  = 3
+
+[sonarr]
+SONARR_URL      = http://sonarr:8989
+SONARR_KEY      = key
+"""
+
+STATUS = {
+    "sonarr": {
+        "appName": "Sonarr",
+        "instanceName": "Sonarr 4K",
+        "version": "4.0.9.2332",
+    },
+    "radarr": {
+        "appName": "Radarr",
+        "instanceName": "Radarr 4K",
+        "version": "5.10.3.9171",
+    },
+    "lidarr": {
+        "appName": "Sonarr",
+        "instanceName": "Not Lidarr",
+        "version": "4.0.9.2332",
+    },
+}
+
+
+class Arr_Transport:
+    # Answers like the arr instances in STATUS, and keeps the urls called
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, method, url, **kwargs):
+        self.calls.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        if url.endswith("/system/status"):
+            body = STATUS[url.split("//")[1].split(":")[0]]
+        else:
+            body = {"uiLanguage": 1}
+        response._content = json.dumps(body).encode()
+        return response
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    config_file = tmp_path / "config.conf"
+    config_file.write_text(CONFIG)
+    monkeypatch.setattr(rest, "transport", Arr_Transport())
+    monkeypatch.setattr(rest, "result_cache", {})
+    monkeypatch.setattr("src.utils.circuit_breaker.circuit_breakers", {})
+    monkeypatch.setattr(definitions, "settingsDict", definitions.settingsDict)
+    return config_file
+
+
+def change(config_file, content):
+    config_file.write_text(content)
+    stat = os.stat(config_file)
+    os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def load(config_file):
+    return definitions.load_settings(str(config_file)).replace(SONARR_NAME="Sonarr 4K")
+
+
+@pytest.mark.asyncio
+async def test_unchanged_config_is_not_reloaded(config_file):
+    settings = load(config_file)
+    assert await reloadSettings(settings) is settings
+    assert rest.transport.calls == []
+
+
+@pytest.mark.asyncio
+async def test_reload_picks_up_thresholds_and_instances(config_file):
+    settings = load(config_file)
+    change(
+        config_file,
+        CONFIG.replace("= 3", "= 5")
+        + "[radarr]\nRADARR_URL = http://radarr:7878\nRADARR_KEY = key\n",
+    )
+    reloaded = await reloadSettings(settings)
+    assert reloaded["PERMITTED_ATTEMPTS"] == 5
+    assert reloaded["INSTANCES"] == ("RADARR", "SONARR")
+    assert reloaded["RADARR_NAME"] == "Radarr 4K"
+    # The unchanged instance is not checked again
+    assert reloaded["SONARR_NAME"] == "Sonarr 4K"
+    assert not any("sonarr" in url for url in rest.transport.calls)
+    assert definitions.settingsDict is reloaded
+    assert await reloadSettings(reloaded) is reloaded
+
+
+@pytest.mark.asyncio
+async def test_instances_failing_the_check_are_skipped(config_file):
+    settings = load(config_file)
+    change(
+        config_file,
+        CONFIG + "[lidarr]\nLIDARR_URL = http://lidarr:8686\nLIDARR_KEY = key\n",
+    )
+    reloaded = await reloadSettings(settings)
+    assert reloaded["INSTANCES"] == ("SONARR",)
+
+
+@pytest.mark.asyncio
+async def test_invalid_config_keeps_the_settings(config_file):
+    settings = load(config_file)
+    change(config_file, CONFIG.replace("= 3", "= three"))
+    reloaded = await reloadSettings(settings)
+    assert reloaded["PERMITTED_ATTEMPTS"] == 3
+    # Not retried until the file is changed again
+    assert await reloadSettings(reloaded) is reloaded
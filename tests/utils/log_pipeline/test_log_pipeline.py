@@ -0,0 +1,127 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import asyncio
+import io
+import json
+import logging
+import threading
+import pytest
+from src.utils import log_pipeline
+from src.utils.log_pipeline import (
+    Json_Formatter,
+    log_context,
+    log_instance,
+    log_job,
+    start_logging,
+    stop_logging,
+)
+
+
+class Thread_Recording_Stream(io.StringIO):
+    # Keeps the threads that wrote to it
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def write(self, text):
+        self.threads.add(threading.current_thread())
+        return super().write(text)
+
+
+@pytest.fixture
+def pipeline():
+    # A logger of its own, since pytest has set up the root logger already
+    logger = logging.getLogger("test_log_pipeline")
+    logger.propagate = False
+    stream = Thread_Recording_Stream()
+    start_logging(Json_Formatter(), logging.DEBUG, stream, logger)
+    yield logger, stream
+    stop_logging()
+    logger.propagate = True
+
+
+def entries(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_written_by_another_thread(pipeline):
+    logger, stream = pipeline
+    logger.info("Queue is clean %s", "on Sonarr")
+    stop_logging()  # Writes out what is still queued
+    assert [entry["message"] for entry in entries(stream)] == [
+        "Queue is clean on Sonarr"
+    ]
+    assert threading.current_thread() not in stream.threads
+
+
+@pytest.mark.asyncio
+async def test_records_carry_their_context(pipeline):
+    logger, stream = pipeline
+
+    @log_job
+    async def remove_stalled(settingsDict, NAME):
+        await asyncio.sleep(0)
+        with log_context(failType="stalled", downloadId="ABC" + NAME):
+            logger.info("Removing")
+        logger.info("Done")
+
+    @log_instance
+    async def cleaner(settingsDict, instance):
+        await remove_stalled(settingsDict, instance)
+
+    # The instances are cleaned at the same time, yet each record carries its own instance
+    await asyncio.gather(cleaner({}, "SONARR"), cleaner({}, "RADARR"))
+    logger.info("Cycle complete")
+    stop_logging()
+
+    fields = [
+        {key: entry.get(key) for key in log_pipeline.CONTEXT_FIELDS}
+        for entry in entries(stream)
+    ]
+    assert sorted(fields[:4], key=str) == sorted(
+        [
+            {
+                "instance": "SONARR",
+                "job": "remove_stalled",
+                "failType": "stalled",
+                "downloadId": "ABCSONARR",
+            },
+            {
+                "instance": "RADARR",
+                "job": "remove_stalled",
+                "failType": "stalled",
+                "downloadId": "ABCRADARR",
+            },
+            {
+                "instance": "SONARR",
+                "job": "remove_stalled",
+                "failType": None,
+                "downloadId": None,
+            },
+            {
+                "instance": "RADARR",
+                "job": "remove_stalled",
+                "failType": None,
+                "downloadId": None,
+            },
+        ],
+        key=str,
+    )
+    assert entries(stream)[4] == {
+        "time": entries(stream)[4]["time"],
+        "level": "INFO",
+        "logger": "test_log_pipeline",
+        "message": "Cycle complete",
+    }
+
+
+def test_keeps_output_set_up_by_others():
+    logger = logging.getLogger("test_log_pipeline_configured")
+    handler = logging.NullHandler()
+    logger.addHandler(handler)
+    start_logging(Json_Formatter(), logging.WARNING, logger=logger)
+    assert logger.handlers == [handler]
+    assert logger.level == logging.WARNING
+    assert log_pipeline.listener is None
+    logger.removeHandler(handler)
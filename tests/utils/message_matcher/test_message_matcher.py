@@ -0,0 +1,82 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import re
+import pytest
+from src.utils import message_matcher
+from src.utils.message_matcher import Message_Matcher, trie_regex
+
+MESSAGES = [
+    "Not an upgrade for existing episode file(s)",
+    "Not a Custom Format upgrade for existing episode file(s)",
+    "Found matching series via grab history, but release was matched to series by ID",
+    "No files found are eligible for import",
+    "Episode file already imported at 2024-01-01",
+    "",
+]
+
+
+@pytest.fixture(params=["regex", "aho-corasick"])
+def backend(request, monkeypatch):
+    # Many plain patterns are matched by pyahocorasick (if installed), else by a regex
+    if request.param == "aho-corasick":
+        pytest.importorskip("ahocorasick")
+        monkeypatch.setattr(message_matcher, "AHO_CORASICK_MIN_PATTERNS", 1)
+    else:
+        monkeypatch.setattr(message_matcher, "load_aho_corasick", lambda: None)
+    return request.param
+
+
+@pytest.mark.parametrize(
+    "patterns",
+    [
+        ["Not an upgrade for existing"],
+        ["Not an upgrade", "Not a Custom Format upgrade", "Not a"],
+        ["eligible", "grab history", "episode", "xyz"],
+        ["re:^Episode file already imported at \\d{4}-", "No files"],
+        ["glob:Not a* upgrade for existing *", "glob:Found*"],
+        ["glob:*.mkv", "re:(?i)NOT AN UPGRADE", "import"],
+    ],
+)
+def test_matches_like_testing_each_pattern(backend, patterns):
+    matcher = Message_Matcher(patterns)
+
+    def matches_pattern(pattern, message):
+        if pattern.startswith("re:"):
+            return re.search(pattern[3:], message) is not None
+        if pattern.startswith("glob:"):
+            return message_matcher.fnmatch.fnmatchcase(message, pattern[5:])
+        return pattern in message
+
+    for message in MESSAGES:
+        assert matcher.matches(message) == any(
+            matches_pattern(pattern, message) for pattern in patterns
+        ), message
+
+
+def test_regexes_with_groups_keep_their_own():
+    # The same group name in two patterns
+    matcher = Message_Matcher(
+        ["re:(?P<code>4\\d\\d)", "re:(?P<code>5\\d\\d)", "import"]
+    )
+    assert matcher.matches("Error 404")
+    assert matcher.matches("Error 503")
+    assert not matcher.matches("Error 200")
+    # A backreference refers to the group of its own pattern
+    matcher = Message_Matcher(["re:(x)", "re:(a)\\1"])
+    assert matcher.matches("aa")
+    assert not matcher.matches("ab")
+
+
+def test_common_prefixes_are_merged():
+    assert (
+        trie_regex(["Not an upgrade", "Not a Custom"])
+        == "Not\\ a(?:\\ Custom|n\\ upgrade)"
+    )
+    # A pattern that is the start of another one still matches on its own
+    assert re.fullmatch(trie_regex(["Not a", "Not an"]), "Not a")
+
+
+def test_invalid_regex():
+    with pytest.raises(re.error):
+        Message_Matcher(["re:(unclosed"])
@@ -0,0 +1,141 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import asyncio
+import json
+import threading
+import time
+import pytest
+import requests
+from config import definitions
+from src.utils import rest
+from src.utils.qbit_client import Qbit_Client, Qbit_Login_Error
+from src.utils.rest import Rest_Error
+
+QBIT_URL = "http://qbit:8080/api/v2"
+
+
+class Fake_Qbit:
+    # Hands out a new session cookie per login, and only accepts the latest one (sessions can be expired with expire())
+    def __init__(self, password="secret", delay=0):
+        self.password = password
+        self.delay = delay
+        self.sessions = 0
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def expire(self):
+        with self.lock:
+            self.sessions += 1
+
+    def __call__(self, method, url, **kwargs):
+        time.sleep(self.delay)
+        path = url[len(QBIT_URL) :]
+        response = requests.Response()
+        response.status_code = 200
+        with self.lock:
+            self.calls.append((method, path))
+            if path == "/auth/login":
+                if kwargs["data"]["password"] != self.password:
+                    response._content = b"Fails."
+                    return response
+                self.sessions += 1
+                response._content = b"Ok."
+                response.cookies = requests.cookies.cookiejar_from_dict(
+                    {"SID": f"session-{self.sessions}"}
+                )
+            elif (kwargs.get("cookies") or {}).get("SID") != f"session-{self.sessions}":
+                response.status_code = 403
+                response._content = b"Forbidden"
+            else:
+                response._content = json.dumps([{"hash": "abc", "path": path}]).encode()
+        return response
+
+    def logins(self):
+        return self.calls.count(("POST", "/auth/login"))
+
+
+@pytest.fixture(autouse=True)
+def rest_settings(monkeypatch):
+    monkeypatch.setattr(
+        definitions,
+        "settingsDict",
+        definitions.settingsDict.replace(TEST_RUN=False, RESULT_TTL={}, MAX_RETRIES=0),
+    )
+    monkeypatch.setattr("src.utils.circuit_breaker.circuit_breakers", {})
+    monkeypatch.setattr(rest, "result_cache", {})
+    monkeypatch.setattr(rest, "response_cache", None)
+
+
+@pytest.mark.asyncio
+async def test_logs_in_once_for_concurrent_calls(monkeypatch):
+    qbit = Fake_Qbit(delay=0.05)
+    monkeypatch.setattr(rest, "transport", qbit)
+    client = Qbit_Client(QBIT_URL, "admin", "secret")
+    await asyncio.gather(
+        *[client.get("/torrents/info", params={"n": n}) for n in range(5)]
+    )
+    await client.get("/torrents/tags")
+    assert qbit.logins() == 1
+    assert qbit.calls[0] == ("POST", "/auth/login")
+
+
+@pytest.mark.asyncio
+async def test_logs_in_again_when_session_expired(monkeypatch):
+    qbit = Fake_Qbit()
+    monkeypatch.setattr(rest, "transport", qbit)
+    client = Qbit_Client(QBIT_URL, "admin", "secret")
+    await client.get("/torrents/info")
+    qbit.expire()
+    assert await client.get("/torrents/tags") == [
+        {"hash": "abc", "path": "/torrents/tags"}
+    ]
+    assert qbit.logins() == 2
+    assert qbit.calls[-3:] == [
+        ("GET", "/torrents/tags"),
+        ("POST", "/auth/login"),
+        ("GET", "/torrents/tags"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_retries_only_once(monkeypatch):
+    # qBit keeps refusing the cookie (e.g. since it expires sessions right away): the error is raised after one retry
+    qbit = Fake_Qbit()
+    monkeypatch.setattr(rest, "transport", qbit)
+    client = Qbit_Client(QBIT_URL, "admin", "secret")
+    original_login = client._login
+
+    async def login_with_stale_cookie():
+        await original_login()
+        client.cookie = {"SID": "stale"}
+        return client.cookie
+
+    client._login = login_with_stale_cookie
+    with pytest.raises(Rest_Error):
+        await client.get("/torrents/info")
+    assert qbit.calls.count(("GET", "/torrents/info")) == 2
+    assert qbit.logins() == 2
+
+
+@pytest.mark.asyncio
+async def test_wrong_password(monkeypatch):
+    qbit = Fake_Qbit()
+    monkeypatch.setattr(rest, "transport", qbit)
+    client = Qbit_Client(QBIT_URL, "admin", "wrong")
+    with pytest.raises(Qbit_Login_Error):
+        await client.get("/torrents/info")
+    assert qbit.calls == [("POST", "/auth/login")]
+
+
+@pytest.mark.asyncio
+async def test_post_is_skipped_on_test_runs(monkeypatch):
+    qbit = Fake_Qbit()
+    monkeypatch.setattr(rest, "transport", qbit)
+    monkeypatch.setattr(
+        definitions, "settingsDict", definitions.settingsDict.replace(TEST_RUN=True)
+    )
+    await Qbit_Client(QBIT_URL, "admin", "secret").post(
+        "/torrents/createTags", data={"tags": "tag"}
+    )
+    assert qbit.calls == []
@@ -0,0 +1,127 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import pytest
+from config import definitions
+from src.utils.detection_rules import select_affected
+from src.utils.qbit_states import qbit_fail_types
+from src.utils.queue_item import QueueItem
+
+NOW = 1_000_000
+
+
+def torrent(state, num_seeds=0, last_activity=NOW - 3600):
+    return {"state": state, "num_seeds": num_seeds, "last_activity": last_activity}
+
+
+def queue_item(downloadId, status="downloading", errorMessage=None):
+    record = {
+        "downloadId": downloadId,
+        "status": status,
+        "trackedDownloadState": "downloading",
+    }
+    if errorMessage is not None:
+        record["errorMessage"] = errorMessage
+    return QueueItem(record)
+
+
+@pytest.fixture
+def settings():
+    return definitions.settingsDict.replace(REMOVE_TIMER=10, QBIT_STATE_DETECTION=True)
+
+
+@pytest.mark.parametrize(
+    "qbit_torrent, failType",
+    [
+        (torrent("stalledDL"), "stalled"),
+        (
+            torrent("stalledDL", num_seeds=1),
+            None,
+        ),  # Connected to a seed, which may send again
+        (
+            torrent("stalledDL", last_activity=NOW - 60),
+            None,
+        ),  # Received something since the previous run
+        (torrent("metaDL"), "missing metadata"),
+        (torrent("forcedMetaDL"), "missing metadata"),
+        (torrent("missingFiles"), "missing files"),
+        (torrent("downloading"), None),
+        (torrent("stalledUP"), None),
+        ({}, None),
+    ],
+)
+def test_qbit_fail_types(settings, qbit_torrent, failType):
+    assert (
+        qbit_fail_types(settings, {"HASH": qbit_torrent}, now=NOW).get("HASH")
+        == failType
+    )
+
+
+def test_verdicts_are_worked_out_once_per_snapshot(settings):
+    snapshot = {"A": torrent("metaDL")}
+    assert qbit_fail_types(settings, snapshot) == {"A": "missing metadata"}
+    snapshot["B"] = torrent("metaDL")  # Not looked at again
+    assert qbit_fail_types(settings, snapshot) == {"A": "missing metadata"}
+    assert qbit_fail_types(settings, dict(snapshot)) == {
+        "A": "missing metadata",
+        "B": "missing metadata",
+    }
+
+
+def test_select_affected_uses_qbit_for_its_torrents(settings):
+    snapshot = {
+        "STALLED": torrent("stalledDL", last_activity=0),
+        "DOWNLOADING": torrent("downloading"),
+        "METADATA": torrent("metaDL"),
+    }
+    queue = [
+        queue_item("STALLED"),  # Not yet refreshed by the *arr
+        queue_item("DOWNLOADING"),
+        queue_item("METADATA"),
+        # Not in qBit
+        queue_item("OTHER", "warning", "The download is stalled with no connections"),
+    ]
+    assert [
+        item["downloadId"]
+        for item in select_affected(settings, "bench", queue, "stalled", snapshot)
+    ] == ["STALLED", "OTHER"]
+    assert [
+        item["downloadId"]
+        for item in select_affected(
+            settings, "bench", queue, "missing metadata", snapshot
+        )
+    ] == ["METADATA"]
+
+
+def test_select_affected_still_applies_the_rules_to_qbit_torrents(settings):
+    # The torrent is fine in qBit, but the *arr cannot import it
+    snapshot = {"NO_FILES": torrent("stalledUP"), "MISSING": torrent("missingFiles")}
+    record = {
+        "downloadId": "NO_FILES",
+        "status": "completed",
+        "trackedDownloadState": "importPending",
+        "statusMessages": [
+            {"messages": ["No files found are eligible for import in /downloads/Show"]}
+        ],
+    }
+    queue = [QueueItem(record), queue_item("MISSING")]
+    affected = select_affected(settings, "bench", queue, "missing files", snapshot)
+    assert sorted(item["downloadId"] for item in affected) == ["MISSING", "NO_FILES"]
+
+
+def test_select_affected_without_qbit_state_detection(settings):
+    snapshot = {
+        "STALLED": torrent("stalledDL", last_activity=0),
+        "RECOVERED": torrent("downloading"),
+    }
+    queue = [
+        queue_item("STALLED"),
+        queue_item(
+            "RECOVERED", "warning", "The download is stalled with no connections"
+        ),
+    ]
+    settings = settings.replace(QBIT_STATE_DETECTION=False)
+    assert [
+        item["downloadId"]
+        for item in select_affected(settings, "bench", queue, "stalled", snapshot)
+    ] == ["RECOVERED"]
@@ -0,0 +1,63 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import pytest
+from src.utils.queue_item import QueueItem, queue_page
+
+RECORD = {
+    "id": 1,
+    "downloadId": "A",
+    "title": "Show.S01E01",
+    "status": "completed",
+    "trackedDownloadStatus": "warning",
+    "trackedDownloadState": "importPending",
+    "protocol": "torrent",
+    "downloadClient": "qBittorrent",
+    "size": 100,
+    "sizeleft": 0,
+    "seriesId": 7,
+    "episodeId": 70,
+    "quality": {"quality": {"id": 1, "name": "HDTV-720p"}},
+    "customFormats": [{"id": 3, "name": "x265"}],
+    "statusMessages": [
+        {
+            "title": "Show.S01E01",
+            "messages": ["Not an upgrade for existing episode file(s)"],
+        }
+    ],
+}
+
+
+def test_only_used_fields_are_kept():
+    item = QueueItem(RECORD)
+    assert item["downloadId"] == "A"
+    assert item.get("indexer", "No indexer") == "No indexer"
+    assert "quality" not in item and "movieId" not in item
+    with pytest.raises(KeyError):
+        item["customFormats"]
+    assert set(item) == {
+        key for key in RECORD if key not in ("quality", "customFormats")
+    }
+
+
+def test_status_messages():
+    item = QueueItem(RECORD)
+    assert "statusMessages" in item
+    assert item["statusMessages"] == RECORD["statusMessages"]
+    assert "statusMessages" not in QueueItem({"id": 2})
+
+
+def test_behaves_like_a_read_only_dict():
+    item = QueueItem(RECORD)
+    assert {**item, "removal_messages": []}["title"] == "Show.S01E01"
+    assert item == {key: value for key, value in RECORD.items() if key in item}
+    with pytest.raises(TypeError):
+        item["status"] = "failed"
+    with pytest.raises(AttributeError):
+        item.status = "failed"
+
+
+def test_queue_page():
+    page = queue_page({"totalRecords": 1, "records": [RECORD]})
+    assert page["totalRecords"] == 1
+    assert isinstance(page["records"][0], QueueItem)
@@ -0,0 +1,78 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import asyncio
+import time
+import pytest
+from src.utils import rate_limiter
+from src.utils.rate_limiter import Token_Bucket, get_host_limiter, pop_wait_stats
+
+
+@pytest.fixture(autouse=True)
+def reset_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "host_limiters", {})
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped_per_host():
+    in_flight = {"now": 0, "max": 0}
+
+    async def call(host):
+        async with get_host_limiter(host, 3, 0):
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+
+    await asyncio.gather(*(call("sonarr:8989") for _ in range(10)))
+    assert in_flight["max"] == 3
+
+    # Other hosts have their own limit
+    await asyncio.gather(call("sonarr:8989"), call("radarr:7878"))
+    stats = pop_wait_stats()
+    assert stats["sonarr:8989"]["requests"] == 11
+    assert stats["sonarr:8989"]["waited"] > 0
+    assert stats["radarr:7878"]["requests"] == 1
+    assert pop_wait_stats() == {}
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_requests():
+    bucket = Token_Bucket(rate=50, burst=1)
+    start = time.monotonic()
+    for _ in range(6):
+        await bucket.acquire()
+    # The first request passes right away, the other five wait for a token each
+    assert time.monotonic() - start >= 5 / 50 * 0.9
+
+
+@pytest.mark.asyncio
+async def test_cancelled_wait_for_the_rate_limit_frees_the_slot():
+    limiter = get_host_limiter("radarr:7878", 1, 1)
+    async with limiter:
+        pass  # Takes the only token for the next second
+
+    async def call():
+        async with limiter:
+            pass
+
+    # Cancelled while waiting for the next token, holding the only concurrency slot
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(call(), 0.05)
+    assert not limiter.semaphore.locked()
+
+
+@pytest.mark.asyncio
+async def test_limiter_is_replaced_when_limits_change():
+    limiter = get_host_limiter("qbit:8080", 2, 0)
+    assert get_host_limiter("qbit:8080", 2, 0) is limiter
+    assert get_host_limiter("qbit:8080", 4, 0) is not limiter
+
+
+@pytest.mark.asyncio
+async def test_no_limits():
+    limiter = get_host_limiter("lidarr:8686", 0, 0)
+    assert limiter.semaphore is None and limiter.bucket is None
+    async with limiter:
+        pass
+    assert pop_wait_stats()["lidarr:8686"]["requests"] == 1
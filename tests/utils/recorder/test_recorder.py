@@ -0,0 +1,101 @@
+import gzip
+import json
+from src.utils.recorder import Traffic_Recorder, load_trace, trace_key
+from response_utils import make_response
+
+
+def test_record_and_load(tmp_path):
+    trace_file = str(tmp_path / "trace.jsonl.gz")
+    recorder = Traffic_Recorder(trace_file)
+    recorder.record(
+        "get",
+        "http://sonarr:8989/api/v3/queue",
+        {"params": {"page": "1"}, "headers": {"X-Api-Key": "secret"}},
+        make_response(200, '{"records": []}', {"Content-Type": "application/json"}),
+    )
+    entries = load_trace(trace_file)
+    assert len(entries) == 1
+    assert entries[0]["method"] == "GET"
+    assert entries[0]["params"] == {"page": "1"}
+    assert entries[0]["status"] == 200
+    assert entries[0]["body"] == '{"records": []}'
+    assert entries[0]["headers"] == {"content-type": "application/json"}
+
+
+def test_secrets_are_redacted(tmp_path):
+    trace_file = str(tmp_path / "trace.jsonl.gz")
+    recorder = Traffic_Recorder(trace_file)
+    recorder.record(
+        "POST",
+        "http://qbit:8080/api/v2/auth/login",
+        {
+            "data": {"username": "admin", "password": "hunter2"},
+            "cookies": {"SID": "abc"},
+        },
+        make_response(200, "Ok.", {"Set-Cookie": "SID=abc; path=/"}),
+    )
+    recorder.record(
+        "GET",
+        "http://sonarr:8989/api/v3/system/status",
+        {"params": {"apikey": "secret"}},
+        make_response(200, "{}", {}),
+    )
+    with open(trace_file, "rb") as file:
+        raw = file.read()
+    entries = load_trace(trace_file)
+    content = str(entries)
+    for secret in ("admin", "hunter2", "abc", "secret"):
+        assert secret not in content
+    assert entries[0]["data"] == {"username": "REDACTED", "password": "REDACTED"}
+    assert entries[0]["headers"]["set-cookie"] == "SID=REDACTED; path=/"
+    assert entries[1]["params"] == {"apikey": "REDACTED"}
+    assert raw[:2] == b"\x1f\x8b"  # gzip compressed
+
+
+def test_trace_cut_off_while_writing_is_read_up_to_the_cut(tmp_path):
+    # As if decluttarr was killed while writing the fourth entry
+    trace_file = str(tmp_path / "trace.jsonl.gz")
+    recorder = Traffic_Recorder(trace_file)
+    for page in range(3):
+        recorder.record(
+            "GET",
+            "http://sonarr:8989/api/v3/queue",
+            {"params": {"page": str(page)}},
+            make_response(200, '{"records": []}', {}),
+        )
+    entry = gzip.compress(json.dumps({"method": "GET"}).encode() + b"\n")
+    with open(trace_file, "ab") as file:
+        file.write(entry[: len(entry) // 2])
+    entries = load_trace(trace_file)
+    assert [entry["params"] for entry in entries] == [
+        {"page": "0"},
+        {"page": "1"},
+        {"page": "2"},
+    ]
+
+
+def test_json_rpc_login_params_are_redacted(tmp_path):
+    trace_file = str(tmp_path / "trace.jsonl.gz")
+    recorder = Traffic_Recorder(trace_file)
+    recorder.record(
+        "POST",
+        "http://deluge:8112/json",
+        {"json": {"method": "auth.login", "params": ["hunter2"], "id": 1}},
+        make_response(200, '{"result": true, "error": null, "id": 1}', {}),
+    )
+    recorder.record(
+        "POST",
+        "http://deluge:8112/json",
+        {"json": {"method": "web.update_ui", "params": [["name"], {}], "id": 2}},
+        make_response(200, '{"result": {}, "error": null, "id": 2}', {}),
+    )
+    entries = load_trace(trace_file)
+    assert "hunter2" not in str(entries)
+    assert entries[0]["json"] == {"method": "auth.login", "params": "REDACTED", "id": 1}
+    assert entries[1]["json"]["params"] == [["name"], {}]
+
+
+def test_trace_key_ignores_host_and_param_order():
+    assert trace_key("get", "http://a:1/api/v3/queue", {"b": 1, "a": 2}) == trace_key(
+        "GET", "http://b:2/api/v3/queue", {"a": 2, "b": 1}
+    )
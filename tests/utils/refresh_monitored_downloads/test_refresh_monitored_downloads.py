@@ -0,0 +1,119 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import json
+import time
+import pytest
+import requests
+from config import definitions
+from src.utils import rest
+from src.utils.shared import refresh_monitored_downloads
+
+BASE_URL = "http://sonarr:8989/api/v3"
+
+
+class Arr_Commands_Transport:
+    # Answers like the command endpoints of an *arr; the refresh is reported as started until it was polled `polls` times
+    def __init__(self, commands=(), polls=2):
+        self.commands = {command["id"]: command for command in commands}
+        self.polls = polls
+        self.calls = []
+
+    def __call__(self, method, url, **kwargs):
+        path = url[len(BASE_URL) :]
+        self.calls.append((method, path))
+        response = requests.Response()
+        response.status_code = 200
+        if method == "POST":
+            command = {
+                "id": len(self.commands) + 1,
+                "name": kwargs["json"]["name"],
+                "status": "queued",
+            }
+            self.commands[command["id"]] = command
+            response.status_code = 201
+            body = command
+        elif path == "/command":
+            body = list(self.commands.values())
+        else:
+            command = self.commands[int(path.split("/")[-1])]
+            self.polls -= 1
+            if self.polls <= 0:
+                command["status"] = "completed"
+            elif command["status"] == "queued":
+                command["status"] = "started"
+            body = command
+        response._content = json.dumps(body).encode()
+        return response
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settingsDict = definitions.settingsDict.replace(
+        TEST_RUN=False, REFRESH_TIMEOUT=5, RESULT_TTL={}, HTTP_CACHE_SIZE=0
+    )
+    monkeypatch.setattr(definitions, "settingsDict", settingsDict)
+    monkeypatch.setattr(rest, "result_cache", {})
+    monkeypatch.setattr("src.utils.circuit_breaker.circuit_breakers", {})
+    monkeypatch.setattr("src.utils.shared.REFRESH_POLL_DELAY", 0.01)
+    return settingsDict
+
+
+@pytest.mark.asyncio
+async def test_refresh_is_awaited(monkeypatch, settings):
+    transport = Arr_Commands_Transport(polls=3)
+    monkeypatch.setattr(rest, "transport", transport)
+    await refresh_monitored_downloads(BASE_URL, "key", settings)
+    assert (
+        transport.calls
+        == [("GET", "/command"), ("POST", "/command")] + [("GET", "/command/1")] * 3
+    )
+    assert transport.commands[1]["status"] == "completed"
+
+
+@pytest.mark.asyncio
+async def test_pending_refresh_is_awaited_instead_of_queuing_another(
+    monkeypatch, settings
+):
+    transport = Arr_Commands_Transport(
+        [
+            {"id": 1, "name": "RefreshMonitoredDownloads", "status": "completed"},
+            {"id": 2, "name": "RssSync", "status": "started"},
+            {"id": 3, "name": "RefreshMonitoredDownloads", "status": "started"},
+        ],
+        polls=1,
+    )
+    monkeypatch.setattr(rest, "transport", transport)
+    await refresh_monitored_downloads(BASE_URL, "key", settings)
+    assert transport.calls == [("GET", "/command"), ("GET", "/command/3")]
+
+
+@pytest.mark.asyncio
+async def test_waiting_is_limited_by_refresh_timeout(monkeypatch, settings):
+    transport = Arr_Commands_Transport(polls=1000)
+    monkeypatch.setattr(rest, "transport", transport)
+    start = time.monotonic()
+    await refresh_monitored_downloads(
+        BASE_URL, "key", settings.replace(REFRESH_TIMEOUT=0.2)
+    )
+    assert time.monotonic() - start < 1
+    assert transport.commands[1]["status"] == "started"
+
+
+@pytest.mark.asyncio
+async def test_no_refresh_is_queued_on_test_runs(monkeypatch, settings):
+    transport = Arr_Commands_Transport()
+    monkeypatch.setattr(rest, "transport", transport)
+    await refresh_monitored_downloads(BASE_URL, "key", settings.replace(TEST_RUN=True))
+    assert transport.calls == [("GET", "/command")]
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_is_logged(monkeypatch, settings, caplog):
+    def transport(method, url, **kwargs):
+        raise requests.exceptions.ConnectionError("refused")
+
+    monkeypatch.setattr(rest, "transport", transport)
+    monkeypatch.setattr("src.utils.rest.backoff_delay", lambda attempt: 0)
+    await refresh_monitored_downloads(BASE_URL, "key", settings)
+    assert "RefreshMonitoredDownloads could not be sent" in caplog.text
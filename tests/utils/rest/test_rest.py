@@ -0,0 +1,333 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import asyncio
+import json
+import threading
+import time
+import pytest
+import requests
+from config import definitions
+from src.utils import rest
+from src.utils.circuit_breaker import Circuit_Breaker
+from src.utils.rest import Circuit_Open_Error, Rest_Error, rest_get, rest_post
+from response_utils import make_response
+
+
+class Fake_Transport:
+    # Returns (or raises) the given outcomes one after the other
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+        self.delay = 0
+
+    def __call__(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if self.delay:
+            time.sleep(self.delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def rest_settings(monkeypatch):
+    monkeypatch.setattr(
+        definitions,
+        "settingsDict",
+        definitions.settingsDict.replace(
+            TEST_RUN=False,
+            MAX_RETRIES=2,
+            CIRCUIT_BREAKER_THRESHOLD=3,
+            CIRCUIT_BREAKER_COOLDOWN=300,
+        ),
+    )
+    monkeypatch.setattr("src.utils.rest.backoff_delay", lambda attempt: 0)
+    monkeypatch.setattr("src.utils.circuit_breaker.circuit_breakers", {})
+    monkeypatch.setattr(rest, "result_cache", {})
+    monkeypatch.setattr(rest, "response_cache", None)
+    monkeypatch.setattr(
+        definitions, "settingsDict", definitions.settingsDict.replace(RESULT_TTL={})
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_is_retried_after_connection_error(monkeypatch):
+    transport = Fake_Transport(
+        requests.exceptions.ConnectionError("refused"), make_response(200, '{"a": 1}')
+    )
+    monkeypatch.setattr(rest, "transport", transport)
+    assert await rest_get("http://retry:1/api/v3/queue") == {"a": 1}
+    assert len(transport.calls) == 2
+    assert transport.calls[0][2]["timeout"] == (
+        definitions.settingsDict["CONNECT_TIMEOUT"],
+        definitions.settingsDict["READ_TIMEOUT"],
+    )
+
+
+@pytest.mark.asyncio
+async def test_post_is_not_retried(monkeypatch):
+    transport = Fake_Transport(requests.exceptions.ConnectionError("refused"))
+    monkeypatch.setattr(rest, "transport", transport)
+    assert await rest_post("http://post:1/api/v3/command", json={}) is None
+    assert len(transport.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_raises_rest_error_on_http_error(monkeypatch):
+    monkeypatch.setattr(rest, "transport", Fake_Transport(make_response(404)))
+    with pytest.raises(Rest_Error):
+        await rest_get("http://notfound:1/api/v3/queue")
+
+
+@pytest.mark.asyncio
+async def test_get_returns_text_for_plain_text_endpoints(monkeypatch):
+    monkeypatch.setattr(rest, "transport", Fake_Transport(make_response(200, "v4.6.7")))
+    assert await rest_get("http://qbit:1/api/v2/app/version") == "v4.6.7"
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_skips_host(monkeypatch):
+    transport = Fake_Transport(requests.exceptions.ConnectTimeout("timeout"))
+    monkeypatch.setattr(rest, "transport", transport)
+    with pytest.raises(Rest_Error):
+        await rest_get("http://down:1/api/v3/queue")  # 3 attempts -> threshold reached
+    assert len(transport.calls) == 3
+    with pytest.raises(Circuit_Open_Error):
+        await rest_get("http://down:1/api/v3/queue")
+    assert len(transport.calls) == 3
+
+    # Other hosts are not affected
+    monkeypatch.setattr(rest, "transport", Fake_Transport(make_response(200, "[]")))
+    assert await rest_get("http://up:1/api/v3/queue") == []
+
+
+def test_circuit_breaker_half_open():
+    now = [0]
+    breaker = Circuit_Breaker("host", threshold=2, cooldown=60, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.acquire() is None
+    breaker.record_failure()
+    assert breaker.acquire() == 60
+    now[0] = 61
+    assert breaker.acquire() is None  # trial request
+    assert breaker.acquire() == 0  # only one trial at a time
+    breaker.record_failure()
+    assert breaker.acquire() == 60
+    now[0] = 122
+    assert breaker.acquire() is None
+    breaker.record_success()
+    assert not breaker.is_open
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_request_frees_the_trial(monkeypatch):
+    now = [0]
+    # Threshold and cooldown as in the settings (CIRCUIT_BREAKER_THRESHOLD and CIRCUIT_BREAKER_COOLDOWN)
+    breaker = Circuit_Breaker(
+        "trial:1", threshold=3, cooldown=300, clock=lambda: now[0]
+    )
+    monkeypatch.setattr(
+        "src.utils.circuit_breaker.circuit_breakers", {"trial:1": breaker}
+    )
+    for _ in range(3):
+        breaker.record_failure()
+    now[0] = 301
+    transport = Fake_Transport(make_response(200, "[]"))
+    transport.delay = 0.2
+    monkeypatch.setattr(rest, "transport", transport)
+    # The trial request is cancelled (e.g. by a timeout) while it is sent
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(
+            rest.rest_request("GET", "http://trial:1/api/v3/queue"), 0.05
+        )
+    assert breaker.acquire() is None  # The next request may be the trial
+    breaker.release_trial()
+
+    # An unexpected error during the trial counts as a failed trial
+    monkeypatch.setattr(rest, "transport", Fake_Transport(ValueError("broken")))
+    with pytest.raises(ValueError):
+        await rest.rest_request("GET", "http://trial:1/api/v3/queue")
+    assert breaker.acquire() == 300
+    now[0] = 602
+    monkeypatch.setattr(rest, "transport", Fake_Transport(make_response(200, "[]")))
+    assert (
+        await rest.rest_request("GET", "http://trial:1/api/v3/queue")
+    ).status_code == 200
+    assert not breaker.is_open
+
+
+@pytest.mark.asyncio
+async def test_identical_gets_share_one_request(monkeypatch):
+    transport = Fake_Transport(make_response(200, '{"records": []}'))
+    transport.delay = 0.05
+    monkeypatch.setattr(rest, "transport", transport)
+    url = "http://sonarr:8989/api/v3/queue"
+    results = await asyncio.gather(
+        rest_get(url, "key", {"page": 1}),
+        rest_get(url, "key", {"page": 1}),
+        rest_get(url, "other key", {"page": 1}),
+    )
+    assert results == [{"records": []}] * 3
+    assert results[0] is results[1]
+    assert len(transport.calls) == 2
+
+    # Once done, the next call goes out again (no TTL configured)
+    await rest_get(url, "key", {"page": 1})
+    assert len(transport.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_cancelling_the_first_caller_does_not_cancel_the_others(monkeypatch):
+    transport = Fake_Transport(make_response(200, '{"records": []}'))
+    transport.delay = 0.1
+    monkeypatch.setattr(rest, "transport", transport)
+    url = "http://sonarr:8989/api/v3/queue"
+    first = asyncio.ensure_future(rest_get(url, "key"))
+    await asyncio.sleep(0.01)
+    second = asyncio.ensure_future(rest_get(url, "key"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == {"records": []}
+    assert first.cancelled()
+    assert len(transport.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared(monkeypatch):
+    transport = Fake_Transport(make_response(404))
+    transport.delay = 0.05
+    monkeypatch.setattr(rest, "transport", transport)
+    url = "http://sonarr:8989/api/v3/queue"
+    results = await asyncio.gather(
+        rest_get(url, "key"), rest_get(url, "key"), return_exceptions=True
+    )
+    assert all(isinstance(result, Rest_Error) for result in results)
+    assert len(transport.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_result_ttl_per_endpoint_class(monkeypatch):
+    monkeypatch.setattr(
+        definitions,
+        "settingsDict",
+        definitions.settingsDict.replace(RESULT_TTL={"episode/{id}": 60}),
+    )
+    transport = Fake_Transport(make_response(200, '{"monitored": true}'))
+    monkeypatch.setattr(rest, "transport", transport)
+    episode = await rest_get("http://sonarr:8989/api/v3/episode/1", "key")
+    episode["monitored"] = False  # Changes nothing in the cache
+    assert await rest_get("http://sonarr:8989/api/v3/episode/1", "key") == {
+        "monitored": True
+    }
+    await rest_get("http://sonarr:8989/api/v3/episode/2", "key")
+    await rest_get("http://sonarr:8989/api/v3/queue", "key")
+    await rest_get("http://sonarr:8989/api/v3/queue", "key")
+    assert [call[1].rsplit("/", 1)[1] for call in transport.calls] == [
+        "1",
+        "2",
+        "queue",
+        "queue",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_expired_results_are_dropped(monkeypatch):
+    monkeypatch.setattr(
+        definitions,
+        "settingsDict",
+        definitions.settingsDict.replace(RESULT_TTL={"command/{id}": 10}),
+    )
+    monkeypatch.setattr(rest, "transport", Fake_Transport(make_response(200, "{}")))
+    now = [1000.0]
+    monkeypatch.setattr("src.utils.rest.time.monotonic", lambda: now[0])
+    for command_id in range(1, 4):
+        await rest_get(f"http://sonarr:8989/api/v3/command/{command_id}", "key")
+        now[0] += 6
+    # Not asked for again, yet only the results that did not expire yet are kept
+    assert [key[0].rsplit("/", 1)[1] for key in rest.result_cache] == ["2", "3"]
+
+
+def test_endpoint_class():
+    assert (
+        rest.endpoint_class("http://sonarr:8989/api/v3/episode/123") == "episode/{id}"
+    )
+    assert (
+        rest.endpoint_class("http://host/qbit/api/v2/sync/maindata") == "sync/maindata"
+    )
+
+
+@pytest.mark.asyncio
+async def test_unchanged_responses_are_served_from_cache(monkeypatch):
+    transport = Fake_Transport(
+        make_response(200, '[{"id": 1}]', {"ETag": '"v1"'}),
+        make_response(304),
+    )
+    monkeypatch.setattr(rest, "transport", transport)
+    url = "http://sonarr:8989/api/v3/series"
+    series = await rest_get(url, "key")
+    assert series == [{"id": 1}]
+    series[0]["id"] = 2  # Changes nothing in the cache
+    assert await rest_get(url, "key") == [{"id": 1}]
+    assert "If-None-Match" not in transport.calls[0][2]["headers"]
+    assert transport.calls[1][2]["headers"]["If-None-Match"] == '"v1"'
+    assert rest.response_cache.pop_stats()["series"] == {
+        "requests": 2,
+        "hits": 1,
+        "bytes_saved": 11,
+        "hit_rate": 0.5,
+    }
+
+
+@pytest.mark.asyncio
+async def test_cache_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(
+        definitions, "settingsDict", definitions.settingsDict.replace(HTTP_CACHE_SIZE=0)
+    )
+    transport = Fake_Transport(make_response(200, "[]", {"ETag": '"v1"'}))
+    monkeypatch.setattr(rest, "transport", transport)
+    await rest_get("http://sonarr:8989/api/v3/series", "key")
+    await rest_get("http://sonarr:8989/api/v3/series", "key")
+    assert transport.calls[1][2]["headers"] == {"X-Api-Key": "key"}
+    assert rest.response_cache is None
+
+
+@pytest.mark.asyncio
+async def test_traffic_is_recorded_off_the_event_loop(monkeypatch, tmp_path):
+    from src.utils.recorder import Traffic_Recorder, load_trace
+
+    trace_file = str(tmp_path / "trace.jsonl.gz")
+    monkeypatch.setattr(rest, "recorder", None)
+    monkeypatch.setattr(
+        definitions,
+        "settingsDict",
+        definitions.settingsDict.replace(RECORD_TRAFFIC=trace_file),
+    )
+    threads = []
+    record = Traffic_Recorder.record
+
+    def recording_thread(self, *args):
+        threads.append(threading.current_thread())
+        return record(self, *args)
+
+    monkeypatch.setattr(Traffic_Recorder, "record", recording_thread)
+    page = '{"page": 1, "totalRecords": 2, "records": [{"id": 1}, {"id": 2}]}'
+    monkeypatch.setattr(rest, "transport", Fake_Transport(make_response(200, page)))
+    assert await rest_get("http://sonarr:8989/api/v3/queue", "key") == json.loads(page)
+    # Streamed responses are recorded as a whole, and still read record by record
+    _, records = await rest.rest_get_stream("http://sonarr:8989/api/v3/queue", "key")
+    assert records == [{"id": 1}, {"id": 2}]
+    assert threads and threading.main_thread() not in threads
+    assert [entry["body"] for entry in load_trace(trace_file)] == [page, page]
+
+
+@pytest.mark.asyncio
+async def test_streamed_response_is_closed_on_http_error(monkeypatch):
+    response = make_response(500, "error")
+    closed = []
+    response.close = lambda: closed.append(True)
+    monkeypatch.setattr(rest, "transport", Fake_Transport(response))
+    with pytest.raises(Rest_Error):
+        await rest.rest_get_stream("http://sonarr:8989/api/v3/queue", "key")
+    assert closed == [True]
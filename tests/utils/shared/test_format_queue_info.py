@@ -0,0 +1,22 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+from src.utils.shared import formatQueueInfo, pop_cleaning_failures
+
+
+def test_queue_info_groups_by_download():
+    queue = [
+        {"id": 1, "downloadId": "A", "title": "Show S01"},
+        {"id": 2, "downloadId": "A", "title": "Show S01"},
+        {"id": 3, "downloadId": "B", "title": "Movie"},
+    ]
+    assert formatQueueInfo(queue) == [
+        {"downloadId": "A", "downloadTitle": "Show S01", "IDs": [1, 2]},
+        {"downloadId": "B", "downloadTitle": "Movie", "IDs": [3]},
+    ]
+
+
+def test_formatting_error_does_not_fail_the_run():
+    pop_cleaning_failures()
+    assert formatQueueInfo([{"id": 1}]) == "error"
+    assert pop_cleaning_failures() == 0
@@ -0,0 +1,49 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import json
+from src.utils.trackers import (
+    Defective_Tracker,
+    Download_Sizes_Tracker,
+    load_tracker_state,
+    save_tracker_state,
+)
+
+
+def test_tracker_state_survives_a_restart(tmp_path):
+    path = str(tmp_path / "trackers.json")
+    defective = {
+        "http://sonarr:8989/api/v3": {
+            "stalled": {"HASH": {"title": "Title", "Attempts": 2}}
+        }
+    }
+    download_sizes = {"http://sonarr:8989/api/v3": {"HASH": 1000}}
+    save_tracker_state(
+        path, Defective_Tracker(defective), Download_Sizes_Tracker(download_sizes)
+    )
+    assert load_tracker_state(path) == {
+        "defective": defective,
+        "download_sizes": download_sizes,
+    }
+    # Nothing is left behind next to the file
+    assert os.listdir(tmp_path) == ["trackers.json"]
+
+
+def test_without_tracker_state(tmp_path):
+    empty = {"defective": {}, "download_sizes": {}}
+    assert load_tracker_state("") == empty
+    assert load_tracker_state(str(tmp_path / "missing.json")) == empty
+    save_tracker_state("", Defective_Tracker({"a": 1}), Download_Sizes_Tracker({}))
+    assert os.listdir(tmp_path) == []
+
+
+def test_unreadable_tracker_state_is_ignored(tmp_path, caplog):
+    path = tmp_path / "trackers.json"
+    path.write_text("{not json")
+    assert load_tracker_state(str(path)) == {"defective": {}, "download_sizes": {}}
+    assert "could not be read" in caplog.text
+    path.write_text(json.dumps({"defective": [], "download_sizes": {"a": {"HASH": 1}}}))
+    assert load_tracker_state(str(path)) == {
+        "defective": {},
+        "download_sizes": {"a": {"HASH": 1}},
+    }
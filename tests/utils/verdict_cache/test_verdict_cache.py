@@ -0,0 +1,132 @@
+import os
+
+os.environ["IS_IN_PYTEST"] = "true"
+import pytest
+from src.utils.queue_item import QueueItem
+from src.utils.shared import permittedAttemptsCheck
+from src.utils.trackers import Defective_Tracker
+from src.utils.verdict_cache import Verdict_Cache
+from src.utils.detection_rules import select_affected
+from config import definitions
+
+
+def queue_item(id, status="completed", sizeleft=0, messages=("Sample",)):
+    return QueueItem(
+        {
+            "id": id,
+            "downloadId": f"HASH{id}",
+            "title": f"title {id}",
+            "status": status,
+            "trackedDownloadStatus": "warning",
+            "trackedDownloadState": "importPending",
+            "sizeleft": sizeleft,
+            "statusMessages": [{"title": "title", "messages": list(messages)}],
+        }
+    )
+
+
+class Counting_Decide:
+    def __init__(self):
+        self.decided = []
+
+    def __call__(self, queueItem):
+        self.decided.append(queueItem["id"])
+        return queueItem["status"] == "completed"
+
+
+def test_only_new_or_changed_items_are_decided_again():
+    cache = Verdict_Cache()
+    decide = Counting_Decide()
+    assert cache.get_verdicts(
+        "url", "failed", [queue_item(1), queue_item(2)], decide
+    ) == [True, True]
+    assert cache.pop_stats() == {"hits": 0, "items": 2, "hit_rate": 0}
+
+    queue = [
+        queue_item(1),
+        queue_item(2, messages=("Other",)),  # Changed
+        queue_item(3, status="downloading"),  # New
+    ]
+    assert cache.get_verdicts("url", "failed", queue, decide) == [True, True, False]
+    assert decide.decided == [1, 2, 2, 3]
+    assert cache.pop_stats() == {"hits": 1, "items": 3, "hit_rate": 1 / 3}
+
+
+@pytest.mark.parametrize(
+    "changed",
+    [
+        {"status": "warning"},
+        {"sizeleft": 100},
+        {"messages": ("Sample", "Another one")},
+    ],
+)
+def test_fingerprint_changes(changed):
+    assert queue_item(1).fingerprint() == queue_item(1).fingerprint()
+    assert queue_item(1).fingerprint() != queue_item(1, **changed).fingerprint()
+
+
+def test_verdicts_are_kept_per_instance_and_fail_type():
+    cache = Verdict_Cache()
+    decide = Counting_Decide()
+    for BASE_URL, failType in [
+        ("url", "failed"),
+        ("url", "stalled"),
+        ("other url", "failed"),
+    ]:
+        cache.get_verdicts(BASE_URL, failType, [queue_item(1)], decide)
+    assert decide.decided == [1, 1, 1]
+
+
+def test_items_are_decided_again_when_what_they_depend_on_changes():
+    cache = Verdict_Cache()
+    decide = Counting_Decide()
+    patterns, other_patterns = object(), object()
+    cache.get_verdicts("url", "failed", [queue_item(1)], decide, depends_on=patterns)
+    cache.get_verdicts("url", "failed", [queue_item(1)], decide, depends_on=patterns)
+    cache.get_verdicts(
+        "url", "failed", [queue_item(1)], decide, depends_on=other_patterns
+    )
+    assert decide.decided == [1, 1]
+
+
+def test_items_that_left_the_queue_are_dropped():
+    cache = Verdict_Cache()
+    decide = Counting_Decide()
+    cache.get_verdicts("url", "failed", [queue_item(1)], decide)
+    cache.get_verdicts("url", "failed", [], decide)
+    cache.get_verdicts("url", "failed", [queue_item(1)], decide)
+    assert decide.decided == [1, 1]
+
+
+def test_attempts_still_advance_for_unchanged_items():
+    # The queue is the same in each run: the detection is skipped, but the attempts are counted as before
+    settings = definitions.settingsDict.replace(
+        PERMITTED_ATTEMPTS=2, QBIT_STATE_DETECTION=False
+    )
+    queue = [
+        queue_item(
+            1, messages=("No files found are eligible for import in /downloads/x",)
+        )
+    ]
+    defective_tracker = Defective_Tracker({})
+    removed = []
+    for _ in range(3):
+        affectedItems = select_affected(
+            settings, "attempts url", queue, "missing files"
+        )
+        removed.append(
+            len(
+                permittedAttemptsCheck(
+                    settings,
+                    affectedItems,
+                    "missing files",
+                    "attempts url",
+                    defective_tracker,
+                )
+            )
+        )
+    assert removed == [0, 0, 1]
+    assert (
+        defective_tracker.dict["attempts url"]["missing files"]["HASH1"]["Attempts"]
+        == 3
+    )